@@ -1,24 +1,19 @@
 from autogen_core.models import SystemMessage, UserMessage
-from autogen_ext.models.openai import OpenAIChatCompletionClient
 # import pandas as pd
-from ..config.settings import settings
+from ..clients.agent_model_client import create_agent_model_client
 import json
+import re
+from typing import Dict, Iterable, List, Optional
+
+# All agent model calls go through the shared LLM scheduler and the agent endpoint's adaptive limiter
+qwen3 = create_agent_model_client()
 
-qwen3 = OpenAIChatCompletionClient(
-            model="Qwen",
-            api_key=settings.llm_api_key,
-            base_url=settings.llm_api_url_agent,
-            model_info={
-                "vision": False,
-                "function_calling": True,
-                "json_output": False,
-                "structured_output": False,
-                "family": "deepseek"
-            },
-            seed = 101,
-            temperature=0.2,
-            max_tokens=8000
-        )
+
+def _strip_code_fence(content: str) -> str:
+    """Remove a surrounding ```json ... ``` fence that models sometimes add around JSON output."""
+    content = content.strip()
+    match = re.fullmatch(r"```(?:json)?\s*(.*?)\s*```", content, re.DOTALL)
+    return match.group(1) if match else content
 
 class DataAnnotationAgent:
     def __init__(self, model = qwen3):
@@ -68,6 +63,80 @@ class DataAnnotationAgent:
             print(f"Error in map_table: {e}")
             return {"source_table": "Nothing Compatible", "confidence": 0.0}
         
+    async def score_tables(self, target_tables_desc: List[Dict[str, str]], source_data_description: str, top_k: int = 3):
+        """Score several target tables against all source tables in a single call.
+
+        Args:
+            target_tables_desc: List of {"name", "description"} dicts for the target tables.
+            source_data_description: Descriptions of all source tables, sent once for all targets.
+            top_k: Number of candidate source tables to score per target table.
+
+        Returns:
+            Confidence matrix as a dict of target table name -> {source table name: confidence}.
+            Target tables missing from the result, or whose entries were all malformed, should be mapped with map_table.
+        """
+
+        system_prompt = f"""You are an expert in mapping TABLES across different sources.
+        Your task is to score, for EACH of several target tables, how well each source table matches it based on their descriptions.
+
+        Your response must follow these rules:
+        - Compare each **target table's description** with the **descriptions of the source tables**.
+        - For each target table, return its {top_k} best matching source tables (fewer if there are fewer source tables), in a JSON object of the form:
+          {{
+            "scores": [
+              {{"target": "<target_table_name>", "source_table": "<source_table_name>", "confidence": <float between 0 and 1>}}
+            ]
+          }}
+        - Only use source table names that appear in the source table descriptions.
+        - Confidence must reflect the likelihood that the mapping is correct.
+        - Only output valid JSON, nothing else.
+        """
+
+        target_tables = "\n".join(table["description"] for table in target_tables_desc)
+        user_prompt = f"""The target tables and their descriptions are as follows:
+        {target_tables}
+
+        Here are the source tables with their descriptions:
+        {source_data_description}
+
+        Your output must be JSON with a "scores" list containing up to {top_k} entries per target table."""
+
+        try:
+            messages = [
+                SystemMessage(content=system_prompt),
+                UserMessage(content=user_prompt, source="user")
+            ]
+            result = await self.model.create(messages)
+            response = json.loads(_strip_code_fence(str(result.content)))
+        except Exception as e:
+            print(f"Error in score_tables: {e}")
+            return {}
+
+        entries = response.get("scores") if isinstance(response, dict) else response
+        if not isinstance(entries, list):
+            print("Error in score_tables: response has no scores list")
+            return {}
+
+        requested = {table["name"] for table in target_tables_desc}
+        matrix: Dict[str, Dict[str, float]] = {}
+        for entry in entries:
+            # Skip malformed entries; targets left without any score fall back to map_table
+            if not isinstance(entry, dict):
+                continue
+            target = entry.get("target")
+            source_table = entry.get("source_table")
+            confidence = entry.get("confidence")
+            if (
+                target not in requested
+                or not isinstance(source_table, str)
+                or isinstance(confidence, bool)
+                or not isinstance(confidence, (int, float))
+            ):
+                continue
+            row = matrix.setdefault(target, {})
+            row[source_table] = max(float(confidence), row.get(source_table, 0.0))
+        return matrix
+
     async def map_field(self, target_field_name: str, target_field_desc: str, source_data_description: str):
         """Map a source field to a target field based on descriptions."""
 
@@ -112,7 +181,95 @@ class DataAnnotationAgent:
         except Exception as e:
             print(f"Error in map_field: {e}")
             return {"source_field": "Nothing Compatible", "confidence": 0.0}
-    
+
+    async def map_fields(
+        self,
+        target_fields: List[Dict[str, str]],
+        source_data_description: str,
+        source_field_names: Optional[Iterable[str]] = None,
+    ):
+        """Map several target fields against one source table in a single call.
+
+        Args:
+            target_fields: List of {"name", "description"} dicts for the target fields.
+            source_data_description: Description of the source table, sent once for all fields.
+            source_field_names: Names of the source fields described in the prompt. When given, entries
+                whose source_field is not one of them (nor "Nothing Compatible") are dropped.
+
+        Returns:
+            Dict of target field name -> {"source_field", "confidence"} for every entry that parsed.
+            Fields missing from the result, or whose entry was malformed or named an unknown source
+            field, should be mapped with map_field.
+        """
+
+        system_prompt = """You are an expert in mapping FIELDS across different tables.
+        Your task is to determine, for EACH of several target fields, the best match from the source table based on their descriptions.
+
+        Your response must follow these rules:
+        - Compare each **target field's description** with the **descriptions of all source fields**.
+        - Return one entry per target field, in a JSON object of the form:
+          {
+            "mappings": [
+              {"target": "<target_field_name>", "source_field": "<best_match_field_name>", "confidence": <float between 0 and 1>}
+            ]
+          }
+        - If no source field is a good match for a target field, use "Nothing Compatible" as its source_field and 0.0 as its confidence.
+        - Confidence must reflect the likelihood that each mapping is correct.
+        - Only output valid JSON, nothing else.
+        """
+
+        target_lines = "\n".join(
+            f"        - {field['name']}: {field.get('description') or 'No description provided'}"
+            for field in target_fields
+        )
+        user_prompt = f"""The target fields and their descriptions are as follows:
+{target_lines}
+
+        Here are the source fields with their descriptions:
+        {source_data_description}
+
+        Your output must be JSON with a "mappings" list containing exactly one entry per target field."""
+
+        try:
+            messages = [
+                SystemMessage(content=system_prompt),
+                UserMessage(content=user_prompt, source="user")
+            ]
+            result = await self.model.create(messages)
+            response = json.loads(_strip_code_fence(str(result.content)))
+        except Exception as e:
+            print(f"Error in map_fields: {e}")
+            return {}
+
+        entries = response.get("mappings") if isinstance(response, dict) else response
+        if not isinstance(entries, list):
+            print("Error in map_fields: response has no mappings list")
+            return {}
+
+        requested = {field['name'] for field in target_fields}
+        valid_sources = set(source_field_names) | {"Nothing Compatible"} if source_field_names is not None else None
+        mappings = {}
+        for entry in entries:
+            # Skip malformed entries and hallucinated source fields; the caller falls back to map_field for them
+            if not isinstance(entry, dict):
+                continue
+            target = entry.get("target")
+            source_field = entry.get("source_field")
+            confidence = entry.get("confidence")
+            if (
+                target not in requested
+                or not isinstance(source_field, str)
+                or (valid_sources is not None and source_field not in valid_sources)
+                or isinstance(confidence, bool)
+                or not isinstance(confidence, (int, float))
+            ):
+                continue
+            if confidence < 0.7:
+                mappings[target] = {"source_field": "Nothing Compatible", "confidence": confidence}
+            else:
+                mappings[target] = {"source_field": source_field, "confidence": confidence}
+        return mappings
+
     # async def describe_table(self, df_head: pd.DataFrame):
     #     """Generate a JSON description of each field in a table."""
     #     system_prompt = """You are a data analysis expert. When given a pandas DataFrame's head output,
@@ -10,25 +10,11 @@ from ..tools.file_tool import read_file
 from ..tools.upload_json_tool import run_playwright_test
 
 
-from autogen_ext.models.openai import OpenAIChatCompletionClient
 # import pandas as pd
-from ..config.settings import settings
-
-qwen3 = OpenAIChatCompletionClient(
-            model="Qwen",
-            api_key=settings.llm_api_key,
-            base_url=settings.llm_api_url_agent,
-            model_info={
-                "vision": False,
-                "function_calling": True,
-                "json_output": False,
-                "structured_output": False,
-                "family": "deepseek"
-            },
-            seed = 101,
-            temperature=0.2,
-            max_tokens=8000
-        )
+from ..clients.agent_model_client import create_agent_model_client
+
+# All agent model calls go through the shared LLM scheduler and the agent endpoint's adaptive limiter
+qwen3 = create_agent_model_client()
 
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
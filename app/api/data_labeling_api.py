@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
 from typing import Dict, List, Optional, Any
 import json
 import os
 from ..services.data_labeling_service import map_data_schemas
+from ..services.mapping_memo import schema_mapping_memo
 from ..schemas import (
     SchemaMappingRequest, SchemaMappingResponse
 )
@@ -31,4 +33,18 @@ async def map_schemas_endpoint(request: SchemaMappingRequest):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error mapping data schemas: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error mapping data schemas: {str(e)}")
+
+@router.delete("/memo/{version_id}")
+async def invalidate_mapping_memo(version_id: str):
+    """
+    删除指定标签版本的所有已保存映射结果，之后的请求将重新映射该版本的表和字段
+
+    Args:
+        version_id: 标签版本ID (labelVersion.versionId)
+
+    Returns:
+        删除的映射结果数量
+    """
+    deleted = await run_in_threadpool(schema_mapping_memo.invalidate, version_id)
+    return {"versionId": version_id, "deleted": deleted}
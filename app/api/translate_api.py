@@ -1,10 +1,33 @@
 # app/api/endpoints.py
-from fastapi import APIRouter, Request, HTTPException
-from ..schemas import TranslationRequest, TranslationResponse
-from ..services.llm_service import translate_list_to_map, translation_cache
+import json
+import logging
+import os
+from urllib.parse import quote
+from fastapi import APIRouter, Request, HTTPException, Query, File, Form, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from ..schemas import (
+    TranslationRequest, TranslationResponse, MultiTranslationRequest, MultiTranslationResponse,
+    DocumentTranslationRequest, DocumentTranslationResponse,
+    TranslationJobStatus, TranslationJobResultsPage,
+)
+from ..services.llm_service import (
+    iter_translation_events, translate_list_multi, translate_list_partial, translate_list_to_map,
+    translation_cache,
+)
+from ..services.translation_jobs import translation_job_manager
+from ..services.document_translation import SelectorError, translate_document
+from ..services.model_router import model_router
+from ..services.tabular_translation import TabularFormatError, detect_format, translate_table_columns
 from ..monitoring.llm_monitoring import get_llm_stats
+from ..monitoring.translation_metrics import get_translation_metrics
+from ..clients.llm_scheduler import llm_scheduler
+from ..clients.retry_policy import get_circuit_breaker_states
+from ..clients.request_hedger import llm_hedger
 from fastapi.responses import JSONResponse, FileResponse
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/translate")
 
 @router.get("/dashboard", include_in_schema=False)
@@ -22,12 +45,23 @@ async def get_status():
     stats = get_llm_stats()
     # 添加缓存大小到统计数据中
     stats['cache_size'] = len(translation_cache)
+    stats['cache_disk_size'] = await run_in_threadpool(translation_cache.disk_size)
+    # 添加翻译流水线的计数器 (本地快速通道命中率等)
+    stats['translation_metrics'] = get_translation_metrics()
+    # 添加自适应并发限制器的当前上限和排队深度
+    stats['llm_scheduler'] = llm_scheduler.snapshot()
+    stats['circuit_breakers'] = get_circuit_breaker_states()
+    stats['llm_hedging'] = llm_hedger.snapshot()
+    stats['model_tiers'] = model_router.snapshot()
     return JSONResponse(content=stats)
 
-@router.post("/translate", response_model=TranslationResponse)
+@router.post("/translate", response_model=TranslationResponse, response_model_exclude_none=True)
 async def create_translation(payload: TranslationRequest, request: Request):
     """
     接收一个待翻译字符串的列表，将其翻译成一个map并返回。
+
+    设置 `allow_partial` 时，部分条目失败不会导致整个请求失败，
+    响应中会附带每个条目的处理状态和失败条目列表。
     """
     if not payload.items:
         # 对于已知的业务逻辑错误，我们仍然可以主动抛出HTTPException
@@ -35,11 +69,179 @@ async def create_translation(payload: TranslationRequest, request: Request):
 
     # 从应用状态(request.app.state)中获取共享的http_client并传递给服务层
     client = request.app.state.http_client
+    if payload.allow_partial:
+        result = await translate_list_partial(payload.source_lang, payload.target_lang, payload.items, client)
+        return TranslationResponse(**result)
+
     translated_map = await translate_list_to_map(
         payload.source_lang, payload.target_lang, payload.items, client
     )
     return TranslationResponse(translated_map=translated_map)
 
+@router.post(
+    "/translate/multi", response_model=MultiTranslationResponse, response_model_exclude_none=True
+)
+async def create_multi_translation(payload: MultiTranslationRequest, request: Request):
+    """
+    将一个待翻译字符串的列表同时翻译成多个目标语言。
+
+    与对每个目标语言分别调用 `/translate` 的结果相同，但规范化、去重、缓存查询和分片规划只执行一轮，
+    所有目标语言的分片一起调度。
+    """
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="输入的列表不能为空")
+
+    client = request.app.state.http_client
+    results = await translate_list_multi(
+        payload.source_lang, payload.target_langs, payload.items, client,
+        allow_partial=payload.allow_partial,
+    )
+    return MultiTranslationResponse(
+        translations={target_lang: TranslationResponse(**result) for target_lang, result in results.items()}
+    )
+
+@router.post("/translate/document", response_model=DocumentTranslationResponse)
+async def create_document_translation(payload: DocumentTranslationRequest, request: Request):
+    """
+    翻译一个任意结构的JSON文档 (如ETL配置中的 `relativeFieldAlias`)。
+
+    按 `selector` 提取匹配的字符串叶子节点，去重后翻译，再将译文写回文档返回。
+    """
+    client = request.app.state.http_client
+    try:
+        document, stats = await translate_document(
+            payload.source_lang, payload.target_lang, payload.document, payload.selector, client
+        )
+    except SelectorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return DocumentTranslationResponse(document=document, **stats)
+
+@router.post("/translate/file")
+async def create_file_translation(
+    request: Request,
+    file: UploadFile = File(..., description="CSV 或 XLSX 文件，第一行为表头"),
+    source_lang: str = Form(..., alias="from", description="源语言代码 (例如 'ZH')"),
+    target_lang: str = Form(..., alias="to", description="目标语言代码 (例如 'EN')"),
+    columns: str = Form(..., description="要翻译的列名，多个列用逗号分隔"),
+    delimiter: str = Form(",", description="CSV文件的分隔符"),
+):
+    """
+    翻译CSV/XLSX文件中指定列的值，返回重写后的文件。
+
+    只收集并翻译指定列中的不同值，然后逐行替换后流式返回，适合行数很多但取值有限的分类列。
+    XLSX文件只处理第一个工作表。
+    """
+    if len(delimiter) != 1:
+        raise HTTPException(status_code=400, detail="CSV文件的分隔符必须是单个字符")
+    column_names = [name.strip() for name in columns.split(",") if name.strip()]
+    client = request.app.state.http_client
+    try:
+        file_format = detect_format(file.filename)
+        chunks, stats = await translate_table_columns(
+            source_lang, target_lang, file.file, file_format, column_names, client, delimiter=delimiter
+        )
+    except TabularFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type = (
+        "text/csv; charset=utf-8" if file_format == "csv"
+        else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+    name, extension = os.path.splitext(file.filename)
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(f'{name}_{target_lang}{extension}')}",
+            "X-Rows": str(stats["rows"]),
+            "X-Distinct-Values": str(stats["distinct_values"]),
+        },
+    )
+
+@router.post("/translate/stream")
+async def create_translation_stream(payload: TranslationRequest, request: Request):
+    """
+    流式翻译接口，以NDJSON格式 (每行一个JSON对象) 逐批返回结果。
+
+    缓存命中等本地结果会立即返回，随后每完成一个分片就返回该分片的结果，
+    最后返回一条 `summary` 记录。处理失败时返回一条 `error` 记录后结束；
+    设置 `allow_partial` 时失败的条目改为在 `summary` 记录中报告。
+    """
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="输入的列表不能为空")
+
+    client = request.app.state.http_client
+
+    async def event_lines():
+        try:
+            async for event in iter_translation_events(
+                payload.source_lang, payload.target_lang, payload.items, client,
+                allow_partial=payload.allow_partial,
+            ):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Exception as e:
+            # 响应头已经发出，无法再返回错误状态码，改为输出一条错误记录
+            logger.error(f"流式翻译过程中发生错误: {e}", exc_info=e)
+            yield json.dumps({"type": "error", "message": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
+@router.post("/jobs", response_model=TranslationJobStatus, status_code=202)
+async def create_translation_job(payload: TranslationRequest):
+    """
+    提交一个批量翻译任务，立即返回任务ID，翻译在后台进行。
+
+    适用于同步接口会超时的大型列表。已完成的分片会持久化保存，服务重启后任务从中断处继续。
+    """
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="输入的列表不能为空")
+
+    job_id = await translation_job_manager.submit(payload.source_lang, payload.target_lang, payload.items)
+    return await run_in_threadpool(translation_job_manager.store.get, job_id)
+
+@router.get("/jobs/{job_id}", response_model=TranslationJobStatus)
+async def get_translation_job(job_id: str):
+    """
+    查询批量翻译任务的状态和进度。
+    """
+    job = await run_in_threadpool(translation_job_manager.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+    return job
+
+@router.get("/jobs/{job_id}/results", response_model=TranslationJobResultsPage)
+async def get_translation_job_results(
+    job_id: str,
+    offset: int = Query(0, ge=0, description="起始位置"),
+    limit: int = Query(1000, ge=1, le=10000, description="每页条目数"),
+):
+    """
+    按提交时的顺序分页获取批量翻译任务的结果。任务未完成时也可以获取已完成的部分。
+    """
+    job = await run_in_threadpool(translation_job_manager.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+
+    items = await run_in_threadpool(translation_job_manager.store.results, job_id, offset, limit)
+    next_offset = offset + len(items)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "total_items": job["total_items"],
+        "items": items,
+        "next_offset": next_offset if next_offset < job["total_items"] else None,
+    }
+
+@router.post("/jobs/{job_id}/cancel", response_model=TranslationJobStatus)
+async def cancel_translation_job(job_id: str):
+    """
+    取消一个排队中或运行中的批量翻译任务。已完成的结果仍然可以查询。
+    """
+    job = await translation_job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+    return job
+
 @router.get("/")
 async def root():
     """
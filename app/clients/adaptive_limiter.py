@@ -0,0 +1,178 @@
+# app/clients/adaptive_limiter.py
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List
+
+from ..config.settings import settings
+
+# 获取一个日志记录器实例
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+    """
+    基于AIMD (加性增、乘性减) 的自适应并发限制器。
+
+    - 调用成功且延迟在目标范围内时，并发上限缓慢增加 (每完成约 `limit` 次成功调用增加1)；
+    - 遇到 429/5xx、超时，或最近窗口内的错误率超过目标时，并发上限按比例减小；
+    - 两次减小之间至少间隔 `decrease_cooldown` 秒，避免一次突发错误把上限压到最低。
+
+    超过当前上限的调用会按先到先得的顺序排队等待。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        latency_target: float,
+        error_rate_target: float,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 5.0,
+        window_size: int = 50,
+    ):
+        self.name = name
+        self._limit = float(initial_limit)
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._latency_target = latency_target
+        self._error_rate_target = error_rate_target
+        self._decrease_factor = decrease_factor
+        self._decrease_cooldown = decrease_cooldown
+        # 最近若干次调用的结果，True 表示失败，用于计算错误率
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        # 并发上限增加时的回调，如调度器立即派发排队中的调用
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def limit(self) -> int:
+        """当前允许的最大并发数。"""
+        return max(self._min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        """正在执行的调用数。"""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """正在排队等待的调用数。"""
+        return len(self._waiters)
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """注册一个在并发上限增加时调用的回调。"""
+        self._listeners.append(callback)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[None]:
+        """(异步) 获取一个并发名额，离开上下文时释放。"""
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self) -> None:
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已经分配给了这个等待者，但它被取消了，需要归还
+                self._release()
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            raise
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        """在名额允许的范围内按顺序唤醒等待者。"""
+        while self._waiters and self._in_flight < self.limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self._in_flight += 1
+                future.set_result(None)
+
+    def record_success(self, latency: float) -> None:
+        """记录一次成功的调用。延迟在目标范围内时增加并发上限。"""
+        self._outcomes.append(False)
+        if latency > self._latency_target:
+            self._decrease(f"延迟 {latency:.2f}s 超过目标 {self._latency_target:.2f}s")
+            return
+        if self._error_rate() <= self._error_rate_target:
+            previous = self.limit
+            self._limit = min(self._max_limit, self._limit + 1 / max(self._limit, 1))
+            if self.limit > previous:
+                self._wake_waiters()
+                for callback in self._listeners:
+                    callback()
+
+    def record_overload(self, reason: str) -> None:
+        """记录一次过载信号 (429/5xx/超时)，减小并发上限。"""
+        self._outcomes.append(True)
+        self._decrease(reason)
+
+    def record_failure(self) -> None:
+        """记录一次与上游负载无关的失败 (如网络错误)，计入错误率，错误率超过目标时减小并发上限。"""
+        self._outcomes.append(True)
+        if self._error_rate() > self._error_rate_target:
+            self._decrease(f"错误率 {self._error_rate():.0%} 超过目标")
+
+    def _error_rate(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self._decrease_cooldown:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self._limit = max(self._min_limit, self._limit * self._decrease_factor)
+        if self.limit != previous:
+            logger.warning(f"并发限制器 {self.name}: {reason}，并发上限 {previous} -> {self.limit}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回限制器的当前状态，用于监控。"""
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "error_rate": round(self._error_rate(), 4),
+        }
+
+
+# 创建一个全局共享的限制器，所有发往翻译端点的调用都向它反馈延迟和错误，
+# 其当前上限作为 llm_scheduler 中翻译端点的并发上限
+llm_limiter = AdaptiveLimiter(
+    name="llm",
+    initial_limit=settings.llm_concurrency_initial,
+    min_limit=settings.llm_concurrency_min,
+    max_limit=settings.llm_concurrency_max,
+    latency_target=settings.llm_latency_target,
+    error_rate_target=settings.llm_error_rate_target,
+)
+
+# 智能体端点的限制器。智能体调用的输出很长 (max_tokens=8000)，延迟远高于翻译调用，
+# 如果向 llm_limiter 反馈，会被误判为过载而压低翻译的并发上限
+agent_limiter = AdaptiveLimiter(
+    name="agent",
+    initial_limit=settings.agent_concurrency_initial,
+    min_limit=settings.llm_concurrency_min,
+    max_limit=settings.agent_concurrency_max,
+    latency_target=settings.agent_latency_target,
+    error_rate_target=settings.llm_error_rate_target,
+)
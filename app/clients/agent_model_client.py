@@ -0,0 +1,73 @@
+# app/clients/agent_model_client.py
+import time
+from typing import Any, AsyncGenerator
+
+from autogen_core.models import CreateResult
+from autogen_ext.models.openai import OpenAIChatCompletionClient
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+from ..config.settings import settings
+from .adaptive_limiter import agent_limiter
+from .llm_scheduler import llm_scheduler
+
+
+def _record_error(exc: Exception) -> None:
+    """将智能体调用的异常转换为并发限制器的过载/失败信号。"""
+    if isinstance(exc, APITimeoutError):
+        agent_limiter.record_overload("智能体请求超时")
+    elif isinstance(exc, APIStatusError) and (exc.status_code == 429 or exc.status_code >= 500):
+        agent_limiter.record_overload(f"智能体请求返回 HTTP {exc.status_code}")
+    elif isinstance(exc, APIConnectionError):
+        agent_limiter.record_failure()
+
+
+class LimitedOpenAIChatCompletionClient(OpenAIChatCompletionClient):
+    """
+    经过全局大模型调用调度器的智能体模型客户端。
+
+    与翻译服务的 LLMClient 共用同一个 `llm_scheduler`，因此 ETL 生成和数据标注中的智能体调用也会参与优先级和公平调度；
+    但调用计入智能体端点自己的 `agent_limiter` 的并发上限，延迟和错误也反馈给它，
+    长输出的智能体调用既不占用翻译的并发名额，也不会压低翻译的并发上限。
+    调用所属的流水线和调用方由 `llm_call_context` 声明。
+    """
+
+    async def create(self, *args: Any, **kwargs: Any) -> CreateResult:
+        async with llm_scheduler.slot(endpoint=agent_limiter.name):
+            start_time = time.time()
+            try:
+                result = await super().create(*args, **kwargs)
+            except Exception as e:
+                _record_error(e)
+                raise
+        agent_limiter.record_success(time.time() - start_time)
+        return result
+
+    async def create_stream(self, *args: Any, **kwargs: Any) -> AsyncGenerator[Any, None]:
+        async with llm_scheduler.slot(endpoint=agent_limiter.name):
+            start_time = time.time()
+            try:
+                async for chunk in super().create_stream(*args, **kwargs):
+                    yield chunk
+            except Exception as e:
+                _record_error(e)
+                raise
+        agent_limiter.record_success(time.time() - start_time)
+
+
+def create_agent_model_client() -> LimitedOpenAIChatCompletionClient:
+    """创建智能体使用的 Qwen 模型客户端。"""
+    return LimitedOpenAIChatCompletionClient(
+        model="Qwen",
+        api_key=settings.llm_api_key,
+        base_url=settings.llm_api_url_agent,
+        model_info={
+            "vision": False,
+            "function_calling": True,
+            "json_output": False,
+            "structured_output": False,
+            "family": "deepseek"
+        },
+        seed=101,
+        temperature=0.2,
+        max_tokens=8000
+    )
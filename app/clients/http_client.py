@@ -1,8 +1,13 @@
 # app/clients/http_client.py
+import asyncio
 import logging
 import httpx
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+from ..config.settings import settings
+from ..services.translation_cache import purge_expired_periodically, translation_cache
+from ..services.translation_jobs import translation_job_manager
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +20,19 @@ async def lifespan(app: FastAPI):
     async with httpx.AsyncClient() as client:
         app.state.http_client = client  # type: ignore
         logger.info("HTTPX 客户端已启动并注入到应用状态")
-        yield
+        # 恢复服务重启前未完成的批量翻译任务
+        await translation_job_manager.start(client)
+        # 定期清理翻译缓存中的过期条目
+        purge_task = asyncio.create_task(
+            purge_expired_periodically(translation_cache, settings.translation_cache_purge_interval)
+        )
+        try:
+            yield
+        finally:
+            purge_task.cancel()
+            # 停止正在执行的任务，它们会在下次启动时从检查点继续
+            await translation_job_manager.shutdown()
+            # 等待缓存的后台写入完成
+            await run_in_threadpool(translation_cache.close)
     # 在应用关闭时，客户端会被自动关闭
     logger.info("HTTPX 客户端已关闭")
\ No newline at end of file
@@ -0,0 +1,146 @@
+# app/clients/json_stream_parser.py
+import json
+from typing import Any, List, Tuple
+
+
+class MalformedStreamError(ValueError):
+    """流式输出明显不是一个扁平的JSON对象时抛出的异常。"""
+
+
+class IncrementalJsonObjectParser:
+    """
+    扁平JSON对象 (`{"原文": "译文", ...}`) 的增量解析器。
+
+    每次 `feed` 一段模型输出的文本，返回其中已经完整的键值对，无需等待整个响应结束。
+    `{` 之前的少量前导文本 (如 ```json 代码块标记) 会被跳过；值只允许是字符串或数字、布尔、null 等标量，
+    出现嵌套对象、数组或其他非法字符时抛出 MalformedStreamError，调用方可以据此立即中止流式响应。
+    """
+
+    # 解析状态
+    _PREAMBLE = "preamble"
+    _KEY_OR_END = "key_or_end"
+    _KEY = "key"
+    _COLON = "colon"
+    _VALUE = "value"
+    _STRING_VALUE = "string_value"
+    _SCALAR_VALUE = "scalar_value"
+    _COMMA_OR_END = "comma_or_end"
+    _DONE = "done"
+
+    def __init__(self, max_preamble_chars: int = 200):
+        self._max_preamble_chars = max_preamble_chars
+        self._state = self._PREAMBLE
+        self._preamble_chars = 0
+        # 当前正在读取的字符串或标量的原始文本
+        self._token: List[str] = []
+        self._escaped = False
+        self._key: str = ""
+        # 上一个值之后是否已经读到逗号 (逗号之后不允许直接结束对象)
+        self._after_comma = False
+
+    @property
+    def done(self) -> bool:
+        """是否已经读到对象的结束括号。"""
+        return self._state == self._DONE
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        输入一段新的文本，返回其中新完成的 (键, 值) 列表。
+
+        Raises:
+            MalformedStreamError: 输出不是一个扁平的JSON对象。
+        """
+        pairs: List[Tuple[str, Any]] = []
+        for char in text:
+            state = self._state
+            if state == self._DONE:
+                # 对象之后的内容 (如代码块结束标记) 直接忽略
+                break
+            if state in (self._KEY, self._STRING_VALUE):
+                self._token.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    value = self._finish_string()
+                    if state == self._KEY:
+                        self._key = value
+                        self._state = self._COLON
+                    else:
+                        pairs.append((self._key, value))
+                        self._state = self._COMMA_OR_END
+                continue
+            if state == self._SCALAR_VALUE:
+                if char in ",}" or char.isspace():
+                    pairs.append((self._key, self._finish_scalar()))
+                    self._state = self._COMMA_OR_END
+                    # 结束标量的字符本身还需要按新状态处理
+                    self._after_value(char)
+                else:
+                    self._token.append(char)
+                continue
+            if char.isspace():
+                continue
+
+            if state == self._PREAMBLE:
+                if char == "{":
+                    self._state = self._KEY_OR_END
+                else:
+                    self._preamble_chars += 1
+                    if self._preamble_chars > self._max_preamble_chars:
+                        raise MalformedStreamError("模型输出的开头没有找到JSON对象")
+            elif state == self._KEY_OR_END:
+                if char == '"':
+                    self._token = ['"']
+                    self._state = self._KEY
+                elif char == "}" and not self._after_comma:
+                    self._state = self._DONE
+                else:
+                    raise MalformedStreamError(f"期望一个字符串键，但读到了 {char!r}")
+            elif state == self._COLON:
+                if char != ":":
+                    raise MalformedStreamError(f"期望 ':'，但读到了 {char!r}")
+                self._state = self._VALUE
+            elif state == self._VALUE:
+                if char == '"':
+                    self._token = ['"']
+                    self._state = self._STRING_VALUE
+                elif char in "{[":
+                    raise MalformedStreamError("值不能是嵌套的对象或数组")
+                elif char in "-0123456789tfn":
+                    self._token = [char]
+                    self._state = self._SCALAR_VALUE
+                else:
+                    raise MalformedStreamError(f"期望一个值，但读到了 {char!r}")
+            elif state == self._COMMA_OR_END:
+                self._after_value(char)
+        return pairs
+
+    def _after_value(self, char: str) -> None:
+        if char.isspace():
+            return
+        if char == ",":
+            self._after_comma = True
+            self._state = self._KEY_OR_END
+        elif char == "}":
+            self._state = self._DONE
+        else:
+            raise MalformedStreamError(f"期望 ',' 或 '}}'，但读到了 {char!r}")
+
+    def _finish_string(self) -> str:
+        raw = "".join(self._token)
+        self._token = []
+        self._after_comma = False
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise MalformedStreamError(f"无效的JSON字符串: {e}") from e
+
+    def _finish_scalar(self) -> Any:
+        raw = "".join(self._token)
+        self._token = []
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise MalformedStreamError(f"无效的JSON值: {raw!r}") from e
@@ -4,20 +4,37 @@ import logging
 import re
 import asyncio
 import time
-from typing import List, Dict
+import uuid
+from typing import Any, Callable, List, Dict, Optional, Tuple
 
 import httpx
 
 from ..config.settings import settings
 from ..schemas import TranslationItem
+from ..services.identifier_rules import is_valid_translation
+from .adaptive_limiter import llm_limiter
+from .json_stream_parser import IncrementalJsonObjectParser, MalformedStreamError
+from .model_tiers import ModelTier, default_model_tier
+from .llm_scheduler import llm_scheduler
+from .request_hedger import llm_hedger
+from .retry_policy import CircuitOpenError, RetryPolicy, get_circuit_breaker, llm_retry_policy, parse_retry_after
+from ..monitoring.translation_metrics import increment
 
 # 获取一个日志记录器实例
 logger = logging.getLogger(__name__)
 
 
 class LLMAPIError(Exception):
-    """自定义异常，用于表示与大模型API相关的特定错误。"""
-    pass
+    """
+    自定义异常，用于表示与大模型API相关的特定错误。
+
+    `translated_map` 保存出错之前已经通过校验的译文，调用方 (如部分成功模式) 可以保留这些结果，
+    只把真正缺失的条目视为失败。
+    """
+
+    def __init__(self, message: str = "", translated_map: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.translated_map: Dict[str, str] = dict(translated_map or {})
 
 
 class LLMClient:
@@ -28,19 +45,54 @@ class LLMClient:
     使得上层服务可以更简单地调用大模型的能力，而无需关心底层的HTTP实现细节。
     """
 
-    def __init__(self, client: httpx.AsyncClient):
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        pipeline: str = "translate",
+        caller: Optional[str] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        hedging: Optional[bool] = None,
+        stream: Optional[bool] = None,
+    ):
         """
         初始化LLM客户端。
 
         Args:
             client: 一个httpx.AsyncClient实例，用于发送HTTP请求。
+            pipeline: 调用所属的流水线，决定调度器中的并发预算和优先级。
+            caller: 调用方ID，调度器在同一流水线的调用方之间公平排队。
+                未指定时每个客户端实例视为一个独立的调用方。
+            retry_policy: 重试策略，默认使用按配置创建的 `llm_retry_policy`。
+            hedging: 是否对慢请求发送对冲请求，默认使用配置 `llm_hedging_enabled`。
+            stream: 是否流式接收模型输出，默认使用配置 `llm_stream_enabled`。
+                流式模式下不发送对冲请求。
         """
         self._client = client
+        self._pipeline = pipeline
+        self._caller = caller or uuid.uuid4().hex[:12]
+        self._retry_policy = retry_policy or llm_retry_policy
+        self._hedging = settings.llm_hedging_enabled if hedging is None else hedging
+        self._stream = settings.llm_stream_enabled if stream is None else stream
+
+    @property
+    def pipeline(self) -> str:
+        """调用所属的调度流水线。"""
+        return self._pipeline
+
+    @property
+    def streaming(self) -> bool:
+        """是否流式接收模型输出。"""
+        return self._stream
 
     async def translate(
         self,
         chunk: List[TranslationItem],
-        chunk_id: int
+        chunk_id: int,
+        usage: Optional[Dict[str, int]] = None,
+        examples: Optional[Dict[str, str]] = None,
+        on_result: Optional[Callable[[Dict[str, str]], None]] = None,
+        tier: Optional[ModelTier] = None,
+        max_attempts: Optional[int] = None,
     ) -> Dict[str, str]:
         """
         (异步) 调用大模型API翻译单个分片。
@@ -48,19 +100,321 @@ class LLMClient:
         Args:
             chunk: 需要翻译的TranslationItem对象列表。
             chunk_id: 当前分片的ID，主要用于日志记录。
+            usage: 可选的字典，用于接收本次调用实际消耗的token数
+                (`prompt_tokens` / `completion_tokens`，多次尝试时累加)。
+            examples: 可选的参考译文 (`原文 -> 译文`)，作为少样本示例附加到系统提示词中，
+                帮助模型保持术语和措辞一致。
+            on_result: 可选的回调，每当有译文通过校验时立即以 `原文 -> 译文` 调用。
+                流式模式下每收到一个有效的键值对就调用一次，便于尽早写入缓存和返回给调用方。
+            tier: 使用的模型层级 (模型、端点和温度)，默认为 `llm_model_name`。
+            max_attempts: 覆盖重试策略中的最大尝试次数，如路由层只让小模型尝试一次，失败后交给更大的模型。
 
         Returns:
             一个包含翻译结果的字典。
 
         Raises:
-            LLMAPIError: 如果在多次重试后仍然无法获取有效响应。
+            LLMAPIError: 如果在多次重试后仍然无法获取有效响应、上游返回不可重试的错误，
+                或端点的熔断器处于打开状态。
         """
         if not chunk:
             return {}
 
-        source_lang = chunk[0].source_lang
-        target_lang = chunk[0].target_lang
-        input_text = "\n".join([f"- {item.content}" for item in chunk])
+        # 尚未得到有效译文的条目。每次重试只重新请求这些条目，已通过校验的结果会被保留。
+        pending = list({item.content: item for item in chunk}.values())
+        translated: Dict[str, str] = {}
+
+        policy = self._retry_policy
+        tier = tier or default_model_tier()
+        attempts = max_attempts or policy.max_attempts
+        for attempt in range(attempts):
+            payload = self._build_payload(pending, examples, tier)
+            is_last_attempt = attempt == attempts - 1
+            # 上游通过 Retry-After 指定的最短等待时间
+            retry_after: Optional[float] = None
+            try:
+                logger.debug("发送给大模型的Payload (分片 %d, 第 %d 次尝试): \n%s",
+                             chunk_id, attempt + 1, json.dumps(payload, indent=2, ensure_ascii=False))
+
+                if self._stream:
+                    translated_map, start_time, end_time, abort_reason = await self._send_stream(
+                        payload, tier, pending, translated, on_result, usage
+                    )
+                    logger.info(f"分片 {chunk_id}: 模型流式请求耗时: {end_time - start_time:.2f} 秒 ({len(pending)} 项)")
+                else:
+                    translated_map, start_time, end_time = await self._send_buffered(payload, tier, chunk_id, usage)
+                    logger.info(f"分片 {chunk_id}: 模型请求耗时: {end_time - start_time:.2f} 秒 ({len(pending)} 项)")
+                    abort_reason = None
+
+                # 逐项核对：保留有效的译文，只把缺失或未通过校验的条目留给下一次尝试
+                accepted = {
+                    content: value for content, value in self._reconcile(pending, translated_map).items()
+                    if content not in translated
+                }
+                translated.update(accepted)
+                if accepted and on_result is not None:
+                    on_result(accepted)
+                pending = [item for item in pending if item.content not in translated]
+                if not pending:
+                    return translated
+
+                if abort_reason is not None:
+                    logger.warning(
+                        "分片 %d - 第 %d 次尝试: 流式输出已中止 (%s)，%d 项未得到译文，仅重新请求这些条目...",
+                        chunk_id, attempt + 1, abort_reason, len(pending)
+                    )
+                    reason = "stream_aborted"
+                else:
+                    logger.warning(
+                        "分片 %d - 第 %d 次尝试: %d 项缺失或未通过校验，仅重新请求这些条目...",
+                        chunk_id, attempt + 1, len(pending)
+                    )
+                    reason = "incomplete"
+
+            except CircuitOpenError as e:
+                # 上游正处于故障中，快速失败，不再重试
+                logger.error("分片 %d - %s", chunk_id, e)
+                raise LLMAPIError(f"分片 {chunk_id}: {e}", translated_map=translated) from e
+            except httpx.HTTPStatusError as e:
+                status_code = e.response.status_code
+                logger.error("分片 %d - 大模型API返回 HTTP %d (第 %d 次尝试)", chunk_id, status_code, attempt + 1)
+                if not policy.is_retryable_status(status_code):
+                    # 参数错误、鉴权失败等，重试也不会成功
+                    raise LLMAPIError(f"分片 {chunk_id}: 大模型服务返回 HTTP {status_code}", translated_map=translated) from e
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                if is_last_attempt or (retry_after is not None and retry_after > policy.max_delay):
+                    raise LLMAPIError(
+                        f"分片 {chunk_id}: 大模型服务返回 HTTP {status_code}，重试后仍未成功", translated_map=translated
+                    ) from e
+                reason = f"http_{status_code}"
+            except httpx.RequestError as e:
+                logger.error("分片 %d - 调用大模型API时发生网络错误 (第 %d 次尝试): %s", chunk_id, attempt + 1, e)
+                if is_last_attempt:
+                    raise LLMAPIError(f"分片 {chunk_id}: 无法连接到大模型服务: {e}", translated_map=translated) from e
+                reason = "timeout" if isinstance(e, httpx.TimeoutException) else "network"
+            except (KeyError, IndexError, json.JSONDecodeError, ValueError) as e:
+                logger.error("分片 %d - 解析大模型响应时出错 (第 %d 次尝试): %s", chunk_id, attempt + 1, e)
+                if is_last_attempt:
+                    raise LLMAPIError(f"分片 {chunk_id}: 无法解析模型的响应: {e}", translated_map=translated) from e
+                reason = "parse"
+            
+            if not is_last_attempt:
+                # 指数退避 + 随机抖动，避免大量分片同时重试
+                delay = policy.backoff(attempt, retry_after)
+                increment("llm.retries")
+                increment(f"llm.retries.{reason}")
+                logger.info(f"分片 {chunk_id}: {delay:.2f} 秒后进行第 {attempt + 2} 次尝试 ({reason})")
+                await asyncio.sleep(delay)
+
+        raise LLMAPIError(
+            f"分片 {chunk_id}: 重试 {attempts} 次后，仍有 {len(pending)} 项缺失或未通过校验。", translated_map=translated
+        )
+
+    async def _send_buffered(self, payload: Dict, tier: ModelTier, chunk_id: int, usage: Optional[Dict[str, int]]):
+        """
+        (异步) 以非流式方式发送请求，等待完整的响应后解析出模型返回的map。
+
+        Returns:
+            (模型返回的map, 开始时间, 结束时间)
+        """
+        response, start_time, end_time = await self._send(payload, tier)
+        response.raise_for_status()
+
+        response_data = response.json()
+        logger.debug("收到大模型的原始响应 (分片 %d): \n%s", chunk_id, json.dumps(response_data, indent=2, ensure_ascii=False))
+        self._add_usage(usage, response_data.get('usage'))
+
+        content_str = response_data['choices'][0]['message']['content']
+
+        # 使用正则表达式从模型返回的文本中提取JSON部分
+        match = re.search(r"{.*}", content_str, re.DOTALL)
+        if not match:
+            raise ValueError("在模型响应中未找到有效的JSON对象")
+
+        clean_json_str = match.group(0)
+        translated_map = json.loads(clean_json_str)
+
+        if not isinstance(translated_map, dict):
+            raise ValueError("模型返回的不是一个有效的map/dict")
+        return translated_map, start_time, end_time
+
+    async def _send_stream(
+        self,
+        payload: Dict,
+        tier: ModelTier,
+        pending: List[TranslationItem],
+        translated: Dict[str, str],
+        on_result: Optional[Callable[[Dict[str, str]], None]],
+        usage: Optional[Dict[str, int]],
+    ) -> Tuple[Dict[str, Any], float, float, Optional[str]]:
+        """
+        (异步) 以 `stream=True` 发送请求，边接收边增量解析模型输出的JSON对象。
+
+        每个通过校验的键值对立即写入 `translated` 并回调 `on_result`。
+        以下情况会立即关闭连接，不再为无用的输出付费：
+        - 输出明显不是一个扁平的JSON对象 (`malformed`)；
+        - 返回的键值对数量超过了请求的条目数 (`overrun`)。
+        流正常结束但JSON对象不完整时记为 `truncated`。
+
+        Returns:
+            (本次收到的所有键值对, 开始时间, 结束时间, 中止原因或None)
+        """
+        payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        parser = IncrementalJsonObjectParser()
+        received: Dict[str, Any] = {}
+        abort_reason: Optional[str] = None
+        remaining = {item.content for item in pending}
+
+        breaker = get_circuit_breaker(tier.api_url)
+        breaker.before_call()
+        async with llm_scheduler.slot(self._pipeline, self._caller):
+            start_time = time.time()
+            try:
+                async with self._client.stream(
+                    "POST", tier.api_url, headers=self._headers(tier), json=payload, timeout=60
+                ) as response:
+                    if not response.is_success:
+                        await response.aread()
+                        self._record_response(breaker, response.status_code, start_time, time.time())
+                        response.raise_for_status()
+
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            event = json.loads(data)
+                        except json.JSONDecodeError:
+                            logger.warning(f"无法解析上游的流式事件，中止接收: {data[:200]}")
+                            abort_reason = "malformed"
+                            break
+                        self._add_usage(usage, event.get("usage"))
+                        choices = event.get("choices") or []
+                        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                        if not delta:
+                            continue
+
+                        try:
+                            pairs = parser.feed(delta)
+                        except MalformedStreamError as e:
+                            logger.warning(f"模型的流式输出格式错误，中止接收: {e}")
+                            abort_reason = "malformed"
+                            break
+                        for key, value in pairs:
+                            received[key] = value
+                            accepted = {
+                                content: translation
+                                for content, translation in self._reconcile(pending, {key: value}).items()
+                                if content not in translated
+                            }
+                            if accepted:
+                                translated.update(accepted)
+                                remaining.difference_update(accepted)
+                                if on_result is not None:
+                                    on_result(accepted)
+                        if len(received) > len(pending):
+                            logger.warning(f"模型返回了 {len(received)} 个条目，超过了请求的 {len(pending)} 项，中止接收。")
+                            abort_reason = "overrun"
+                            break
+            except httpx.TimeoutException:
+                llm_limiter.record_overload("请求超时")
+                breaker.record_failure()
+                raise
+            except httpx.RequestError:
+                llm_limiter.record_failure()
+                breaker.record_failure()
+                raise
+            end_time = time.time()
+
+        self._record_response(breaker, response.status_code, start_time, end_time)
+        if abort_reason is not None:
+            increment(f"llm.stream.aborted.{abort_reason}")
+        elif not parser.done and remaining:
+            # 流已经结束，但JSON对象不完整
+            abort_reason = "truncated"
+            increment("llm.stream.aborted.truncated")
+        return received, start_time, end_time, abort_reason
+
+    @staticmethod
+    def _add_usage(usage: Optional[Dict[str, int]], reported: Optional[Dict[str, Any]]) -> None:
+        """累加接口返回的token用量。"""
+        if usage is None:
+            return
+        for key, value in (reported or {}).items():
+            if key in ("prompt_tokens", "completion_tokens") and isinstance(value, int):
+                usage[key] = usage.get(key, 0) + value
+
+    async def _send(self, payload: Dict, tier: ModelTier):
+        """
+        (异步) 经全局调度器获得调用名额后发送一次请求。启用对冲时，慢请求会由对冲器补发一个相同的请求。
+
+        对冲只作用于名额内的上游HTTP请求：对冲器记录的延迟和对冲时机不包含在调度器中排队的时间，
+        调度器饱和时排队变长不会触发对冲、进一步增加上游负载。
+
+        Returns:
+            (响应, 开始时间, 结束时间)
+
+        Raises:
+            CircuitOpenError: 端点的熔断器处于打开状态时，不排队、不发送请求。
+        """
+        breaker = get_circuit_breaker(tier.api_url)
+        breaker.before_call()
+        async with llm_scheduler.slot(self._pipeline, self._caller):
+            if not self._hedging:
+                return await self._post(payload, tier, breaker)
+            return await llm_hedger.run(
+                lambda: self._post(payload, tier, breaker), accept=lambda result: result[0].is_success
+            )
+
+    async def _post(self, payload: Dict, tier: ModelTier, breaker):
+        """
+        (异步) 向上游发送请求，并把延迟和过载信号反馈给自适应限制器和熔断器。调用方需已持有调度器的名额。
+
+        Returns:
+            (响应, 开始时间, 结束时间)
+        """
+        start_time = time.time()
+        try:
+            response = await self._client.post(tier.api_url, headers=self._headers(tier), json=payload, timeout=60)
+        except httpx.TimeoutException:
+            llm_limiter.record_overload("请求超时")
+            breaker.record_failure()
+            raise
+        except httpx.RequestError:
+            llm_limiter.record_failure()
+            breaker.record_failure()
+            raise
+        end_time = time.time()
+
+        self._record_response(breaker, response.status_code, start_time, end_time)
+        return response, start_time, end_time
+
+    def _record_response(self, breaker, status_code: int, start_time: float, end_time: float) -> None:
+        """把一次响应的延迟和过载信号反馈给自适应限制器和熔断器。"""
+        if status_code == 429 or status_code >= 500:
+            llm_limiter.record_overload(f"上游返回 HTTP {status_code}")
+        elif 200 <= status_code < 300:
+            llm_limiter.record_success(end_time - start_time)
+        if self._retry_policy.is_retryable_status(status_code):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _headers(self, tier: ModelTier) -> Dict[str, str]:
+        """构建请求头。层级配置了自己的API密钥时使用该密钥，否则使用 `llm_api_key`。"""
+        return {
+            "Authorization": f"Bearer {tier.api_key or settings.llm_api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def _build_payload(
+        self, items: List[TranslationItem], examples: Optional[Dict[str, str]], tier: ModelTier
+    ) -> Dict:
+        """根据配置中的提示词模板，为一组条目构建发送给指定模型层级的请求体。"""
+        source_lang = items[0].source_lang
+        target_lang = items[0].target_lang
+        input_text = "\n".join([f"- {item.content}" for item in items])
 
         # 从配置中加载并格式化提示词
         prompt = settings.translation_user_prompt.format(
@@ -72,69 +426,36 @@ class LLMClient:
             source_lang=source_lang,
             target_lang=target_lang
         )
+        if examples:
+            system_prompt += (
+                "\n\n以下是已审核的历史译文，请在术语和措辞上与其保持一致：\n"
+                + json.dumps(examples, ensure_ascii=False, indent=2)
+            )
 
-        headers = {
-            "Authorization": f"Bearer {settings.llm_api_key}",
-            "Content-Type": "application/json",
-        }
-
-        payload = {
-            "model": settings.llm_model_name,
+        return {
+            "model": tier.model,
             "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt}
             ],
             "response_format": {"type": "json_object"},
-            "temperature": 0.7,
+            "temperature": tier.temperature,
         }
 
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                logger.debug("发送给大模型的Payload (分片 %d, 第 %d 次尝试): \n%s",
-                             chunk_id, attempt + 1, json.dumps(payload, indent=2, ensure_ascii=False))
-
-                start_time = time.time()
-                response = await self._client.post(settings.llm_api_url, headers=headers, json=payload, timeout=60)
-                end_time = time.time()
-                logger.info(f"分片 {chunk_id}: 模型请求耗时: {end_time - start_time:.2f} 秒")
-
-                response.raise_for_status()
-
-                response_data = response.json()
-                logger.debug("收到大模型的原始响应 (分片 %d): \n%s", chunk_id, json.dumps(response_data, indent=2, ensure_ascii=False))
-
-                content_str = response_data['choices'][0]['message']['content']
-                
-                # 使用正则表达式从模型返回的文本中提取JSON部分
-                match = re.search(r"{.*}", content_str, re.DOTALL)
-                if not match:
-                    raise ValueError("在模型响应中未找到有效的JSON对象")
-
-                clean_json_str = match.group(0)
-                translated_map = json.loads(clean_json_str)
-
-                if not isinstance(translated_map, dict):
-                    raise ValueError("模型返回的不是一个有效的map/dict")
-
-                if len(translated_map) == len(chunk):
-                    return translated_map
-                else:
-                    logger.warning(
-                        "分片 %d - 第 %d 次尝试失败: 输入 %d 项, 输出 %d 项, 数量不匹配。正在重试...",
-                        chunk_id, attempt + 1, len(chunk), len(translated_map)
-                    )
-
-            except httpx.RequestError as e:
-                logger.error("分片 %d - 调用大模型API时发生网络错误 (第 %d 次尝试): %s", chunk_id, attempt + 1, e)
-                if attempt == max_retries - 1:
-                    raise LLMAPIError(f"分片 {chunk_id}: 无法连接到大模型服务: {e}") from e
-            except (KeyError, IndexError, json.JSONDecodeError, ValueError) as e:
-                logger.error("分片 %d - 解析大模型响应时出错 (第 %d 次尝试): %s", chunk_id, attempt + 1, e)
-                if attempt == max_retries - 1:
-                    raise LLMAPIError(f"分片 {chunk_id}: 无法解析模型的响应: {e}") from e
-            
-            if attempt < max_retries - 1:
-                await asyncio.sleep(1)  # 在重试前稍作等待
+    @staticmethod
+    def _reconcile(items: List[TranslationItem], translated_map: Dict) -> Dict[str, str]:
+        """
+        将模型返回的map与请求的条目逐项对齐，只返回通过本地校验的译文。
 
-        raise LLMAPIError(f"分片 {chunk_id}: 重试 {max_retries} 次后，翻译结果的数量仍与输入不匹配。")
+        模型偶尔会改动键的首尾空白，因此在精确匹配失败时再按去除首尾空白后的键匹配一次。
+        """
+        stripped_map = {str(key).strip(): value for key, value in translated_map.items()}
+        accepted: Dict[str, str] = {}
+        for item in items:
+            if item.content in translated_map:
+                value = translated_map[item.content]
+            else:
+                value = stripped_map.get(item.content.strip())
+            if value is not None and is_valid_translation(item.content, value):
+                accepted[item.content] = value
+        return accepted
@@ -0,0 +1,231 @@
+# app/clients/llm_scheduler.py
+import asyncio
+import time
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from ..config.settings import settings
+from .adaptive_limiter import AdaptiveLimiter, agent_limiter, llm_limiter
+
+# 当前协程所属的 (流水线, 调用方)，供无法显式传参的调用点 (如智能体模型客户端) 使用
+_llm_call_context: ContextVar[Optional[Tuple[str, str]]] = ContextVar("llm_call_context", default=None)
+
+
+@contextmanager
+def llm_call_context(pipeline: str, caller: Optional[str] = None) -> Iterator[str]:
+    """
+    声明当前协程 (及其创建的子任务) 中的大模型调用属于哪个流水线和调用方。
+
+    Yields:
+        调用方ID，未指定时自动生成。
+    """
+    caller = caller or uuid.uuid4().hex[:12]
+    token = _llm_call_context.set((pipeline, caller))
+    try:
+        yield caller
+    finally:
+        _llm_call_context.reset(token)
+
+
+def current_call_context() -> Tuple[str, str]:
+    """返回当前的 (流水线, 调用方)，未声明时归入 `default` 流水线。"""
+    return _llm_call_context.get() or ("default", "anonymous")
+
+
+@dataclass
+class _Waiter:
+    """一个等待调度的调用。"""
+    pipeline: str
+    caller: str
+    # 调用发往的端点，对应一个自适应限制器
+    endpoint: str
+    # 加权公平队列中的虚拟完成时间，越小越先被调度
+    finish_tag: float
+    enqueued_at: float
+    future: asyncio.Future = field(repr=False)
+
+
+class LLMScheduler:
+    """
+    进程级的大模型调用调度器，所有大模型调用都经过它。
+
+    - 端点并发上限：每个端点 (翻译接口、智能体接口) 各有一个自适应限制器 (AIMD)，
+      发往该端点的调用数不超过其当前上限，两个端点的预算互不占用。上限增加时立即派发排队中的调用；
+    - 流水线并发上限：每个流水线 (translate、data_labeling、etl ...) 各自的并发预算；
+    - 优先级：数值越小越优先，交互式翻译优先于长时间运行的ETL生成。
+      等待时间每超过 `aging_seconds` 优先级提升一级，避免低优先级调用被永久饿死；
+    - 同一优先级内按调用方做加权公平排队 (WFQ)：每个调用方的请求按虚拟完成时间排序，
+      一个包含大量分片的请求不会挤占其他请求的机会。
+    """
+
+    def __init__(
+        self,
+        limiters: List[AdaptiveLimiter],
+        pipeline_limits: Dict[str, int],
+        pipeline_priorities: Dict[str, int],
+        aging_seconds: float,
+    ):
+        # 端点名称 (限制器名称) -> 限制器，第一个为默认端点
+        self._limiters = {limiter.name: limiter for limiter in limiters}
+        self._default_endpoint = limiters[0].name
+        self._endpoint_in_flight: Dict[str, int] = defaultdict(int)
+        for limiter in limiters:
+            limiter.add_listener(self._dispatch)
+        self._pipeline_limits = pipeline_limits
+        self._pipeline_priorities = pipeline_priorities
+        self._default_priority = max(pipeline_priorities.values(), default=0) + 1
+        self._aging_seconds = aging_seconds
+        self._waiters: List[_Waiter] = []
+        self._in_flight = 0
+        self._pipeline_in_flight: Dict[str, int] = defaultdict(int)
+        # 加权公平队列的全局虚拟时间，以及每个调用方最近一次请求的虚拟完成时间
+        self._virtual_time = 0.0
+        self._caller_finish: Dict[str, float] = {}
+        # 每个调用方排队中和执行中的调用数，降为0时清理其虚拟时间
+        self._caller_active: Dict[str, int] = defaultdict(int)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        pipeline: Optional[str] = None,
+        caller: Optional[str] = None,
+        weight: float = 1.0,
+        endpoint: Optional[str] = None,
+    ) -> AsyncIterator[None]:
+        """
+        (异步) 等待调度并占用一个调用名额，离开上下文时释放。
+
+        Args:
+            pipeline: 流水线名称，未指定时使用当前上下文中的流水线。
+            caller: 调用方ID (通常是一个请求)，未指定时使用当前上下文中的调用方。
+            weight: 调用方权重，权重越大在公平排队中获得的份额越多。
+            endpoint: 调用发往的端点 (限制器名称)，未指定时为翻译接口的 `llm` 端点。
+        """
+        context_pipeline, context_caller = current_call_context()
+        waiter = self._enqueue(
+            pipeline or context_pipeline, caller or context_caller, weight, endpoint or self._default_endpoint
+        )
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 名额已经分配，但调用方被取消了，需要归还
+                self._release(waiter)
+            else:
+                self._discard(waiter)
+            raise
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    def _enqueue(self, pipeline: str, caller: str, weight: float, endpoint: str) -> _Waiter:
+        finish_tag = max(self._virtual_time, self._caller_finish.get(caller, 0.0)) + 1.0 / max(weight, 1e-6)
+        self._caller_finish[caller] = finish_tag
+        self._caller_active[caller] += 1
+        waiter = _Waiter(
+            pipeline=pipeline,
+            caller=caller,
+            endpoint=endpoint,
+            finish_tag=finish_tag,
+            enqueued_at=time.monotonic(),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._waiters.append(waiter)
+        return waiter
+
+    def _pipeline_limit(self, pipeline: str) -> Optional[int]:
+        """流水线的并发上限，未配置时为None，只受端点上限约束。"""
+        return self._pipeline_limits.get(pipeline)
+
+    def _pipeline_has_room(self, pipeline: str) -> bool:
+        limit = self._pipeline_limit(pipeline)
+        return limit is None or self._pipeline_in_flight[pipeline] < limit
+
+    def _effective_priority(self, waiter: _Waiter, now: float) -> int:
+        base = self._pipeline_priorities.get(waiter.pipeline, self._default_priority)
+        aged = int((now - waiter.enqueued_at) / self._aging_seconds) if self._aging_seconds > 0 else 0
+        return max(0, base - aged)
+
+    def _dispatch(self) -> None:
+        """在端点和流水线上限允许的范围内，依次调度优先级最高、虚拟完成时间最早的调用。"""
+        while self._waiters:
+            now = time.monotonic()
+            candidates = [
+                waiter for waiter in self._waiters
+                if self._endpoint_in_flight[waiter.endpoint] < self._limiters[waiter.endpoint].limit
+                and self._pipeline_has_room(waiter.pipeline)
+            ]
+            if not candidates:
+                return
+            chosen = min(candidates, key=lambda waiter: (self._effective_priority(waiter, now), waiter.finish_tag))
+            self._waiters.remove(chosen)
+            if chosen.future.done():
+                # 已被取消的等待者
+                self._forget_caller(chosen.caller)
+                continue
+            self._in_flight += 1
+            self._endpoint_in_flight[chosen.endpoint] += 1
+            self._pipeline_in_flight[chosen.pipeline] += 1
+            self._virtual_time = max(self._virtual_time, chosen.finish_tag)
+            chosen.future.set_result(None)
+
+    def _release(self, waiter: _Waiter) -> None:
+        self._in_flight -= 1
+        self._endpoint_in_flight[waiter.endpoint] -= 1
+        self._pipeline_in_flight[waiter.pipeline] -= 1
+        self._forget_caller(waiter.caller)
+        self._dispatch()
+
+    def _discard(self, waiter: _Waiter) -> None:
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            self._forget_caller(waiter.caller)
+
+    def _forget_caller(self, caller: str) -> None:
+        self._caller_active[caller] -= 1
+        if self._caller_active[caller] <= 0:
+            del self._caller_active[caller]
+            self._caller_finish.pop(caller, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回调度器的当前状态，用于监控。"""
+        queued: Dict[str, int] = defaultdict(int)
+        for waiter in self._waiters:
+            queued[waiter.pipeline] += 1
+        pipelines = set(self._pipeline_limits) | set(queued) | {
+            name for name, count in self._pipeline_in_flight.items() if count
+        }
+        return {
+            **self._limiters[self._default_endpoint].snapshot(),
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "active_callers": len(self._caller_active),
+            "endpoints": {
+                name: {**limiter.snapshot(), "in_flight": self._endpoint_in_flight.get(name, 0)}
+                for name, limiter in self._limiters.items()
+            },
+            "pipelines": {
+                name: {
+                    "limit": self._pipeline_limit(name),
+                    "priority": self._pipeline_priorities.get(name, self._default_priority),
+                    "in_flight": self._pipeline_in_flight.get(name, 0),
+                    "queued": queued.get(name, 0),
+                }
+                for name in sorted(pipelines)
+            },
+        }
+
+
+# 创建一个全局共享的调度器，翻译接口和智能体接口的并发上限分别由各自的自适应限制器动态调整
+llm_scheduler = LLMScheduler(
+    limiters=[llm_limiter, agent_limiter],
+    pipeline_limits={"translate": settings.max_concurrency, **settings.llm_pipeline_limits},
+    pipeline_priorities=settings.llm_pipeline_priorities,
+    aging_seconds=settings.llm_priority_aging_seconds,
+)
@@ -0,0 +1,61 @@
+# app/clients/model_tiers.py
+import math
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from ..config.settings import settings
+
+# 默认层级的名称，对应 `llm_model_name`
+DEFAULT_TIER_NAME = "default"
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """一个模型路由层级：使用哪个模型和端点，以及它能处理的最大难度。"""
+    name: str
+    model: str
+    api_url: str
+    # 难度不超过该值的分片可以发送到这个层级
+    max_difficulty: float
+    temperature: float = 0.7
+    # 每1000个token的费用，仅用于统计
+    cost_per_1k_tokens: float = 0.0
+    # 该层级端点的API密钥，为空时使用 `llm_api_key`。不出现在日志中
+    api_key: Optional[str] = field(default=None, repr=False)
+
+
+def default_model_tier() -> ModelTier:
+    """返回由 `llm_model_name` 和 `llm_api_url` 构成的默认层级，它可以处理任意难度。"""
+    return ModelTier(
+        name=DEFAULT_TIER_NAME,
+        model=settings.llm_model_name,
+        api_url=settings.llm_api_url,
+        max_difficulty=math.inf,
+        cost_per_1k_tokens=settings.llm_cost_per_1k_tokens,
+    )
+
+
+def load_model_tiers() -> List[ModelTier]:
+    """
+    从配置 `llm_model_tiers` 加载模型层级，按 `max_difficulty` 从小到大排列，默认层级总在最后。
+
+    Raises:
+        ValueError: 层级配置缺少必要的字段。
+    """
+    tiers = []
+    for config in settings.llm_model_tiers:
+        missing = [key for key in ("name", "model", "max_difficulty") if key not in config]
+        if missing:
+            raise ValueError(f"模型层级配置缺少字段 {missing}: {config}")
+        tiers.append(ModelTier(
+            name=str(config["name"]),
+            model=str(config["model"]),
+            api_url=str(config.get("api_url") or settings.llm_api_url),
+            max_difficulty=float(config["max_difficulty"]),
+            temperature=float(config.get("temperature", 0.7)),
+            cost_per_1k_tokens=float(config.get("cost_per_1k_tokens", 0.0)),
+            api_key=config.get("api_key") or None,
+        ))
+    tiers.sort(key=lambda tier: tier.max_difficulty)
+    tiers.append(default_model_tier())
+    return tiers
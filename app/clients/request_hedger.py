@@ -0,0 +1,127 @@
+# app/clients/request_hedger.py
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, TypeVar
+
+from ..config.settings import settings
+from ..monitoring.translation_metrics import increment
+
+# 获取一个日志记录器实例
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RequestHedger:
+    """
+    对冲请求 (hedged requests)，用于降低长尾延迟。
+
+    请求在最近延迟的第 `percentile` 分位数 (如p90) 内仍未返回时，再发送一个相同的请求，
+    采用先成功返回的结果并取消另一个。
+
+    额外请求的数量受预算限制：每个原始请求积累 `budget_ratio` 个令牌，每次对冲消耗1个，
+    因此长期来看对冲请求不超过原始请求的 `budget_ratio` (如5%)。
+    """
+
+    def __init__(
+        self,
+        percentile: float,
+        budget_ratio: float,
+        window_size: int = 200,
+        min_samples: int = 20,
+        min_delay: float = 0.5,
+        max_tokens: float = 5.0,
+    ):
+        self._percentile = percentile
+        self._budget_ratio = budget_ratio
+        self._min_samples = min_samples
+        self._min_delay = min_delay
+        self._max_tokens = max_tokens
+        self._latencies: Deque[float] = deque(maxlen=window_size)
+        self._tokens = 0.0
+
+    def hedge_delay(self) -> Optional[float]:
+        """返回发送对冲请求前的等待时间，样本不足时返回None (不对冲)。"""
+        if len(self._latencies) < self._min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, math.ceil(self._percentile * len(ordered)) - 1)
+        return max(self._min_delay, ordered[index])
+
+    def _take_budget(self) -> bool:
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def run(
+        self,
+        send: Callable[[], Awaitable[T]],
+        accept: Callable[[T], bool] = lambda result: True,
+    ) -> T:
+        """
+        (异步) 执行一次可能被对冲的调用。
+
+        Args:
+            send: 发送一次请求的协程工厂，对冲时会被调用两次。
+            accept: 判断一个结果是否可以采用 (如HTTP状态为成功)。
+                不被采用的结果不会结束等待，另一个请求仍有机会胜出。
+
+        Returns:
+            先被采用的结果。两个请求都未能产生可采用的结果时，返回 (或抛出) 原始请求的结果。
+        """
+        self._tokens = min(self._max_tokens, self._tokens + self._budget_ratio)
+        delay = self.hedge_delay()
+        started_at = {}
+
+        def start() -> asyncio.Task:
+            task = asyncio.ensure_future(send())
+            started_at[task] = time.monotonic()
+            return task
+
+        primary = start()
+        tasks: Set[asyncio.Task] = {primary}
+        try:
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+                if not primary.done():
+                    if self._take_budget():
+                        logger.info(f"请求 {delay:.2f} 秒内未返回，发送对冲请求。")
+                        increment("llm.hedge.sent")
+                        tasks.add(start())
+                    else:
+                        increment("llm.hedge.budget_exhausted")
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and accept(task.result()):
+                        self._latencies.append(time.monotonic() - started_at[task])
+                        if len(tasks) > 1:
+                            increment("llm.hedge.won" if task is not primary else "llm.hedge.lost")
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回对冲器的当前状态，用于监控。"""
+        delay = self.hedge_delay()
+        return {
+            "hedge_delay": round(delay, 3) if delay is not None else None,
+            "samples": len(self._latencies),
+            "budget_tokens": round(self._tokens, 3),
+        }
+
+
+# 创建一个全局共享的对冲器，所有启用对冲的大模型调用共用延迟样本和预算
+llm_hedger = RequestHedger(
+    percentile=settings.llm_hedge_percentile,
+    budget_ratio=settings.llm_hedge_budget,
+)
@@ -0,0 +1,179 @@
+# app/clients/retry_policy.py
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from ..config.settings import settings
+from ..monitoring.translation_metrics import increment
+
+# 获取一个日志记录器实例
+logger = logging.getLogger(__name__)
+
+# 可以重试的HTTP状态码：请求超时、限流以及上游的临时故障
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 `Retry-After` 响应头，返回需要等待的秒数。
+
+    支持秒数和HTTP日期两种格式，无法解析时返回None。
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    可复用的重试策略：指数退避 + 全抖动 (full jitter)，并遵循上游的 `Retry-After`。
+
+    全抖动让并发失败的请求在 `[0, 退避上限]` 内随机分散地重试，
+    避免大量分片在同一时刻再次冲击网关。
+    """
+    max_attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    multiplier: float = 2.0
+
+    @staticmethod
+    def is_retryable_status(status_code: int) -> bool:
+        """判断一个HTTP状态码是否值得重试。其余的4xx (如参数错误、鉴权失败) 重试也不会成功。"""
+        return status_code in RETRYABLE_STATUS_CODES
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        计算第 `attempt` 次 (从0开始) 失败后的等待时间 (秒)。
+
+        上游给出 `Retry-After` 时，等待时间不短于该值。
+        """
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** attempt)
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态时快速失败抛出的异常。"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"熔断器 {name} 已打开，{retry_in:.1f} 秒后再尝试调用上游服务")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    单个上游端点的熔断器。
+
+    - closed：正常放行。连续失败达到 `failure_threshold` 次后进入 open；
+    - open：直接拒绝调用 (抛出 CircuitOpenError)，`recovery_timeout` 秒后进入 half_open；
+    - half_open：只放行一个探测调用，成功则恢复 closed，失败则重新 open。
+      探测调用超过 `recovery_timeout` 仍未返回结果 (如被取消) 时允许发起新的探测。
+
+    只有上游故障 (网络错误、超时、429/5xx) 计为失败，响应解析错误等不影响熔断状态。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def before_call(self) -> None:
+        """在调用上游前检查熔断状态，不允许调用时抛出 CircuitOpenError。"""
+        now = time.monotonic()
+        if self._state == self.OPEN:
+            retry_in = self._opened_at + self._recovery_timeout - now
+            if retry_in > 0:
+                increment("llm.circuit_breaker.rejected")
+                raise CircuitOpenError(self.name, retry_in)
+            self._transition(self.HALF_OPEN)
+        if self._state == self.HALF_OPEN:
+            if self._probe_started_at is not None and now - self._probe_started_at < self._recovery_timeout:
+                increment("llm.circuit_breaker.rejected")
+                raise CircuitOpenError(self.name, self._probe_started_at + self._recovery_timeout - now)
+            self._probe_started_at = now
+
+    def record_success(self) -> None:
+        """记录一次成功的调用。"""
+        self._consecutive_failures = 0
+        if self._state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        """记录一次上游故障。"""
+        self._consecutive_failures += 1
+        if self._state == self.HALF_OPEN or (
+            self._state == self.CLOSED and self._consecutive_failures >= self._failure_threshold
+        ):
+            self._opened_at = time.monotonic()
+            self._transition(self.OPEN)
+
+    def _transition(self, state: str) -> None:
+        logger.warning(f"熔断器 {self.name}: {self._state} -> {state} (连续失败 {self._consecutive_failures} 次)")
+        self._state = state
+        self._probe_started_at = None
+        increment(f"llm.circuit_breaker.{state}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回熔断器的当前状态，用于监控。"""
+        return {"state": self._state, "consecutive_failures": self._consecutive_failures}
+
+
+# 按上游端点划分的熔断器
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(endpoint: str) -> CircuitBreaker:
+    """返回指定端点的熔断器，不存在时创建。"""
+    breaker = _circuit_breakers.get(endpoint)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            name=endpoint,
+            failure_threshold=settings.llm_circuit_failure_threshold,
+            recovery_timeout=settings.llm_circuit_recovery_timeout,
+        )
+        _circuit_breakers[endpoint] = breaker
+    return breaker
+
+
+def get_circuit_breaker_states() -> Dict[str, Dict[str, Any]]:
+    """返回所有端点熔断器的状态。"""
+    return {endpoint: breaker.snapshot() for endpoint, breaker in _circuit_breakers.items()}
+
+
+# 大模型调用默认使用的重试策略
+llm_retry_policy = RetryPolicy(
+    max_attempts=settings.llm_retry_max_attempts,
+    base_delay=settings.llm_retry_base_delay,
+    max_delay=settings.llm_retry_max_delay,
+)
@@ -3,6 +3,7 @@ import os
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 import logging
+from typing import Any, Dict, List
 
 # --- 新的多环境配置加载逻辑 ---
 # 1. 首先，加载项目根目录下的 .env 文件（如果存在）。
@@ -41,6 +42,58 @@ class Settings(BaseSettings):
     # 移除这里的默认值，让它完全从 .env.* 文件中读取，更符合预期
     chunk_size: int
     max_concurrency: int
+    # 每个分片的预估token预算，分片按此预算打包，chunk_size 作为条目数上限
+    chunk_token_budget: int = 1500
+
+    # --- 大模型调用的自适应并发控制 (AIMD) ---
+    llm_concurrency_initial: int = 20
+    llm_concurrency_min: int = 2
+    llm_concurrency_max: int = 80
+    # 单次调用的目标延迟 (秒)，超过时不再增加并发
+    llm_latency_target: float = 30.0
+    # 最近调用的目标错误率，超过时减小并发
+    llm_error_rate_target: float = 0.1
+    # 智能体端点 (LLM_API_URL_AGENT) 使用独立的限制器: 智能体调用输出很长，延迟远高于翻译调用
+    agent_concurrency_initial: int = 10
+    agent_concurrency_max: int = 40
+    agent_latency_target: float = 180.0
+
+    # --- 进程级大模型调用调度 ---
+    # 各流水线的并发上限 (translate 流水线沿用 max_concurrency)
+    llm_pipeline_limits: Dict[str, int] = {"translate_job": 10, "data_labeling": 10, "etl": 4}
+    # 各流水线的优先级，数值越小越优先
+    llm_pipeline_priorities: Dict[str, int] = {"translate": 0, "data_labeling": 1, "translate_job": 2, "etl": 2}
+    # 排队每超过该秒数优先级提升一级，避免低优先级调用被饿死
+    llm_priority_aging_seconds: float = 10.0
+
+    # --- 大模型调用的重试和熔断 ---
+    # 每个分片的最大尝试次数，以及指数退避的初始/最大等待时间 (秒)
+    llm_retry_max_attempts: int = 3
+    llm_retry_base_delay: float = 1.0
+    llm_retry_max_delay: float = 30.0
+    # 连续失败多少次后熔断，以及熔断后多久 (秒) 放行探测调用
+    llm_circuit_failure_threshold: int = 5
+    llm_circuit_recovery_timeout: float = 30.0
+
+    # --- 对冲请求 (降低长尾延迟) ---
+    llm_hedging_enabled: bool = False
+    # 请求超过最近延迟的该分位数仍未返回时发送对冲请求
+    llm_hedge_percentile: float = 0.9
+    # 对冲请求占原始请求的比例上限
+    llm_hedge_budget: float = 0.05
+
+    # --- 模型路由 ---
+    # 按难度将分片发送到不同的模型层级，容易的条目 (如 "是"、"否") 交给更小更快的模型。
+    # 每个层级: {"name", "model", "max_difficulty", "api_url" (可选), "api_key" (可选，默认 llm_api_key),
+    # "temperature" (可选), "cost_per_1k_tokens" (可选)}，
+    # 难度不超过 max_difficulty 的分片发送到该层级。所有层级之上总有 llm_model_name 作为默认层级兜底
+    llm_model_tiers: List[Dict[str, Any]] = []
+    # 默认层级 (llm_model_name) 每1000个token的费用，用于按层级统计成本
+    llm_cost_per_1k_tokens: float = 0.0
+
+    # --- 流式接收模型输出 ---
+    # 启用后翻译请求使用 stream=True，译文边生成边解析，输出格式错误或条目数超出时立即中止
+    llm_stream_enabled: bool = False
 
     # --- 从 .env 加载提示词 ---
     # 移除默认值，强制要求这些配置必须在 .env.* 文件中提供。
@@ -48,6 +101,70 @@ class Settings(BaseSettings):
     translation_user_prompt: str
     translation_system_prompt: str
 
+    # --- 翻译缓存 ---
+    # 磁盘缓存文件路径，同一主机上的所有 worker 共享该文件
+    translation_cache_path: str = "data/translation_cache.db"
+    # 进程内热缓存的最大条目数
+    translation_cache_memory_size: int = 5000
+    # 默认缓存有效期 (秒)
+    translation_cache_ttl: int = 7 * 24 * 3600
+    # 按语言对覆盖缓存有效期，JSON格式，例如 {"ZH:EN": 2592000}
+    translation_cache_pair_ttls: Dict[str, int] = {}
+    # 清理磁盘缓存中过期条目的间隔 (秒)
+    translation_cache_purge_interval: int = 3600
+
+    # --- 微批处理 ---
+    # 是否将多个请求中不足一个分片的条目合并后再发送
+    translation_batch_enabled: bool = True
+    # 批次从第一项入队起的最长等待时间 (毫秒)
+    translation_batch_max_wait_ms: int = 50
+
+    # --- 翻译记忆 ---
+    # 是否启用翻译记忆 (模板复用 + 相似译文参考)
+    translation_memory_enabled: bool = True
+    # 每个语言对最多保存的记忆条目数
+    translation_memory_max_entries: int = 50000
+    # 作为参考译文的最低相似度 (0-1)
+    translation_memory_min_similarity: float = 0.6
+    # 每次调用最多附带的参考译文条数
+    translation_memory_max_examples: int = 5
+
+    # --- 数据标注 ---
+    # 是否在少数几次调用中为所有目标表与所有源表打分，再在本地根据置信度矩阵分配源表
+    data_labeling_batch_tables: bool = True
+    # 每次表匹配调用包含的目标表数量
+    data_labeling_table_batch_size: int = 10
+    # 是否在一次调用中映射一个表的多个目标字段 (解析失败的字段再逐个调用)
+    data_labeling_batch_fields: bool = True
+    # 每次批量字段映射调用中目标字段描述的预估token预算，以及字段数上限
+    data_labeling_field_batch_tokens: int = 3000
+    data_labeling_field_batch_size: int = 50
+    # 是否用本地字符n-gram索引预先匹配字段：名称完全一致或高度相似的字段不再调用大模型，其余字段只发送前k个候选
+    data_labeling_prerank_enabled: bool = True
+    data_labeling_prerank_top_k: int = 8
+    # 本地直接采用的最低名称相似度，以及最高分领先第二名的最小差值
+    data_labeling_prerank_accept_score: float = 0.9
+    data_labeling_prerank_accept_margin: float = 0.1
+    # 本地匹配结果中同时交给大模型复核的比例，用于估算本地匹配的准确率
+    data_labeling_prerank_audit_rate: float = 0.05
+    # 是否持久化保存表和字段的映射结果：目标定义和源表字段签名不变时直接复用，不再调用大模型
+    data_labeling_memo_enabled: bool = True
+    data_labeling_memo_path: str = "data/schema_mapping_memo.db"
+    # 计算源表字段值统计 (类型、空值率、不同值比例、格式、高频值) 时最多使用的行数，超出时均匀抽样，0表示使用全部行
+    data_labeling_profile_max_rows: int = 50000
+
+    # --- 批量翻译任务 ---
+    translation_job_db_path: str = "data/translation_jobs.db"
+    # 同时执行的任务数
+    translation_job_max_running: int = 2
+    # 有条目失败时最多重试的轮数
+    translation_job_max_attempts: int = 3
+    # 已结束的任务保留多久 (秒)，默认7天
+    translation_job_retention: int = 7 * 24 * 3600
+    # 执行任务的进程持有任务的租约时长 (秒)，执行期间定期续约。多个进程共用同一个数据库时，
+    # 只有取得租约的进程执行任务；进程异常退出后租约过期，任务由其他进程接管
+    translation_job_lease_seconds: int = 60
+
     class Config:
         # Pydantic-settings会自动从环境变量中读取配置，
         # 由于我们已经用 load_dotenv 加载了 .env 文件，这里的配置会自动映射。
@@ -19,6 +19,10 @@ class LLMCallTrace:
     duration: float = 0.0
     success: bool = False
     error_message: str = None
+    # 分片规划阶段预估的token数，以及接口返回的实际token数
+    planned_tokens: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
     
     def end(self, success: bool, error_message: str = None):
         """标记调用结束，并计算持续时间"""
@@ -65,6 +69,8 @@ def get_llm_stats() -> Dict[str, Any]:
             "failed_calls": 0,
             "success_rate": 0,
             "average_duration": 0,
+            "average_planned_tokens": 0,
+            "average_actual_tokens": 0,
             "recent_traces": []
         }
 
@@ -77,6 +83,15 @@ def get_llm_stats() -> Dict[str, Any]:
     successful_durations = [t.duration for t in current_traces if t.success]
     average_duration = sum(successful_durations) / len(successful_durations) if successful_durations else 0
 
+    # 统计带有token信息的调用，对比规划时的预估值与实际消耗
+    token_traces = [t for t in current_traces if t.planned_tokens and (t.prompt_tokens or t.completion_tokens)]
+    average_planned_tokens = (
+        sum(t.planned_tokens for t in token_traces) / len(token_traces) if token_traces else 0
+    )
+    average_actual_tokens = (
+        sum(t.prompt_tokens + t.completion_tokens for t in token_traces) / len(token_traces) if token_traces else 0
+    )
+
     # 格式化traces以便于JSON序列化
     formatted_traces = [
         {
@@ -84,7 +99,10 @@ def get_llm_stats() -> Dict[str, Any]:
             "end_time": t.end_time.isoformat() if t.end_time else None,
             "duration": t.duration,
             "success": t.success,
-            "error_message": t.error_message
+            "error_message": t.error_message,
+            "planned_tokens": t.planned_tokens,
+            "prompt_tokens": t.prompt_tokens,
+            "completion_tokens": t.completion_tokens
         }
         for t in reversed(current_traces) # 返回最近的调用在前面
     ]
@@ -95,5 +113,7 @@ def get_llm_stats() -> Dict[str, Any]:
         "failed_calls": failed_calls,
         "success_rate": success_rate,
         "average_duration": average_duration,
+        "average_planned_tokens": average_planned_tokens,
+        "average_actual_tokens": average_actual_tokens,
         "recent_traces": formatted_traces
     }
\ No newline at end of file
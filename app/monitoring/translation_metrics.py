@@ -0,0 +1,40 @@
+# app/monitoring/translation_metrics.py
+import threading
+from collections import defaultdict
+from typing import Any, Dict
+
+# 使用线程锁来确保在多线程环境下的数据一致性
+_lock = threading.Lock()
+
+# 翻译流水线各阶段的累计计数器，键为指标名称，例如 "bypass.identifier"
+_counters: Dict[str, int] = defaultdict(int)
+
+
+def increment(name: str, value: int = 1) -> None:
+    """累加一个计数器。"""
+    if not value:
+        return
+    with _lock:
+        _counters[name] += value
+
+
+def get_translation_metrics() -> Dict[str, Any]:
+    """
+    返回所有计数器的快照，以及由计数器派生的比率指标。
+    """
+    with _lock:
+        counters = dict(_counters)
+
+    items_total = counters.get("items_total", 0)
+    bypass_total = counters.get("bypass_total", 0)
+    cache_lookups = counters.get("cache.lookups", 0)
+    return {
+        "counters": counters,
+        "bypass_rate": bypass_total / items_total if items_total else 0,
+        "cache_hit_rate_before_normalization": (
+            counters.get("cache.hits_before_normalization", 0) / cache_lookups if cache_lookups else 0
+        ),
+        "cache_hit_rate_after_normalization": (
+            counters.get("cache.hits_after_normalization", 0) / cache_lookups if cache_lookups else 0
+        ),
+    }
@@ -18,6 +18,10 @@ class TranslationRequest(BaseModel):
     target_lang: str = Field(..., alias="to", description="目标语言代码 (例如 'EN')")
     # 定义输入数据为一个待翻译字符串的列表
     items: List[str] = Field(..., description="需要翻译的文本内容列表")
+    allow_partial: bool = Field(
+        False,
+        description="部分成功模式：部分条目失败时仍返回已得到的译文，并附带每个条目的处理状态",
+    )
 
     class Config:
         # 允许使用 'from' 这样的Python保留关键字作为字段名
@@ -40,6 +44,12 @@ class TranslationResponse(BaseModel):
     """
     # 输出数据依然是一个map，key是原文，value是译文
     translated_map: Dict[str, str]
+    # 以下字段仅在部分成功模式 (allow_partial) 下返回
+    item_status: Optional[Dict[str, str]] = Field(
+        None, description="每个原文的处理状态: translated / cached / memory / bypassed / failed"
+    )
+    failed_items: Optional[List[str]] = Field(None, description="未得到译文的原文列表，可只重试这些条目")
+    complete: Optional[bool] = Field(None, description="是否所有条目都得到了译文")
 
     class Config:
         json_schema_extra = {
@@ -51,6 +61,84 @@ class TranslationResponse(BaseModel):
             }
         }
 
+class MultiTranslationRequest(BaseModel):
+    """
+    多目标语言翻译请求体模型
+    """
+    source_lang: str = Field(..., alias="from", description="源语言代码 (例如 'ZH')")
+    target_langs: List[str] = Field(..., alias="to", min_length=1, description="目标语言代码列表 (例如 ['EN', 'JA'])")
+    items: List[str] = Field(..., description="需要翻译的文本内容列表")
+    allow_partial: bool = Field(
+        False,
+        description="部分成功模式：部分条目失败时仍返回已得到的译文，并附带每个条目的处理状态",
+    )
+
+    class Config:
+        populate_by_name = True
+        json_schema_extra = {
+            "example": {
+                "from": "ZH",
+                "to": ["EN", "JA"],
+                "items": [
+                    "你好世界",
+                    "这是一个测试"
+                ]
+            }
+        }
+
+class MultiTranslationResponse(BaseModel):
+    """
+    多目标语言翻译响应体模型
+    """
+    # 目标语言 -> 该语言的翻译结果
+    translations: Dict[str, TranslationResponse]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "translations": {
+                    "EN": {"translated_map": {"你好世界": "Hello World"}},
+                    "JA": {"translated_map": {"你好世界": "こんにちは世界"}}
+                }
+            }
+        }
+
+class DocumentTranslationRequest(BaseModel):
+    """
+    JSON文档翻译请求体模型
+    """
+    source_lang: str = Field(..., alias="from", description="源语言代码 (例如 'ZH')")
+    target_lang: str = Field(..., alias="to", description="目标语言代码 (例如 'EN')")
+    document: Any = Field(..., description="需要翻译的JSON文档")
+    selector: str = Field(
+        "$..*",
+        description="JSONPath风格的选择器，只翻译匹配到的字符串叶子节点 (默认翻译所有字符串)",
+    )
+
+    class Config:
+        populate_by_name = True
+        json_schema_extra = {
+            "example": {
+                "from": "ZH",
+                "to": "EN",
+                "selector": "$.meta[*].relativeFieldAlias.*",
+                "document": {
+                    "meta": [
+                        {"id": "input_mh", "relativeFieldAlias": {"SUBJID": "受试者", "MHTERM": "病史名称"}}
+                    ]
+                }
+            }
+        }
+
+class DocumentTranslationResponse(BaseModel):
+    """
+    JSON文档翻译响应体模型
+    """
+    # 译文写回后的文档，未匹配的部分保持不变
+    document: Any
+    matched_leaves: int = Field(..., description="选择器匹配到的字符串叶子节点数")
+    unique_items: int = Field(..., description="去重后实际翻译的内容数")
+
 class ErrorDetail(BaseModel):
     """
     标准错误响应体模型
@@ -66,6 +154,39 @@ class ErrorDetail(BaseModel):
             }
         }
 
+class TranslationJobStatus(BaseModel):
+    """
+    批量翻译任务的状态
+    """
+    job_id: str = Field(..., description="任务ID")
+    source_lang: str = Field(..., description="源语言代码")
+    target_lang: str = Field(..., description="目标语言代码")
+    status: str = Field(..., description="任务状态: queued / running / completed / failed / cancelled")
+    total_items: int = Field(..., description="任务中的条目总数")
+    done_items: int = Field(..., description="已完成的条目数")
+    attempts: int = Field(..., description="因部分条目失败而重试的轮数")
+    error: Optional[str] = Field(None, description="最近一次失败的原因")
+    created_at: float = Field(..., description="创建时间 (Unix时间戳)")
+    updated_at: float = Field(..., description="最近更新时间 (Unix时间戳)")
+
+class TranslationJobResultItem(BaseModel):
+    """
+    批量翻译任务中的单个条目
+    """
+    index: int = Field(..., description="条目在提交的列表中的位置")
+    content: str = Field(..., description="原文")
+    translation: Optional[str] = Field(None, description="译文，尚未完成时为空")
+
+class TranslationJobResultsPage(BaseModel):
+    """
+    批量翻译任务结果的一页
+    """
+    job_id: str = Field(..., description="任务ID")
+    status: str = Field(..., description="任务状态")
+    total_items: int = Field(..., description="任务中的条目总数")
+    items: List[TranslationJobResultItem] = Field(..., description="本页的条目，按提交时的顺序排列")
+    next_offset: Optional[int] = Field(None, description="下一页的起始位置，没有更多结果时为空")
+
 # Data schema mapping models
 class FieldConfig(BaseModel):
     """
@@ -174,6 +295,9 @@ class SchemaMappingResponse(BaseModel):
     standardVersion: Dict[str, Any] = Field(..., description="标准版本信息，包含使用的CDASH标准版本详情")
     tableMappings: List[TableMapping] = Field(..., description="表格映射结果列表，包含所有表的映射关系")
     statistics: Dict[str, Any] = Field(..., description="映射统计信息，包含映射成功率等统计数据")
+    tableScores: Optional[Dict[str, Dict[str, float]]] = Field(
+        None, description="表匹配阶段的置信度矩阵，key为目标表，value为候选源表及其置信度"
+    )
 
     class Config:
         json_schema_extra = {
@@ -0,0 +1,76 @@
+# app/services/chunk_planner.py
+import math
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+from ..schemas import TranslationItem
+
+# 中日韩文字 (汉字、假名、谚文) 以及全角符号，这些字符通常每个字符就对应约一个token
+_CJK_PATTERN = re.compile(
+    r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]"
+)
+# 拉丁字母、数字等其他字符平均约4个字符对应一个token
+_CHARS_PER_TOKEN = 4
+# 每个条目在提示词中的列表前缀、换行以及输出JSON中的引号、冒号、逗号等固定开销
+_ITEM_OVERHEAD_TOKENS = 6
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算一段文本的token数，对中日韩文字按字符计数，其他字符按长度折算。"""
+    if not text:
+        return 0
+    cjk_chars = len(_CJK_PATTERN.findall(text))
+    other_chars = len(text) - cjk_chars
+    return cjk_chars + math.ceil(other_chars / _CHARS_PER_TOKEN)
+
+
+def estimate_item_tokens(text: str) -> int:
+    """
+    估算一个条目在一次翻译调用中消耗的token数。
+
+    原文会出现在输入列表中和输出JSON的键中，译文长度与原文相当，
+    因此按原文token数的3倍加上固定开销计算。
+    """
+    return 3 * estimate_tokens(text) + _ITEM_OVERHEAD_TOKENS
+
+
+@dataclass
+class PlannedChunk:
+    """分片规划的结果：一个分片包含的条目以及预估的token数。"""
+    items: List[TranslationItem] = field(default_factory=list)
+    estimated_tokens: int = 0
+
+
+def plan_chunks(items: List[TranslationItem], token_budget: int, max_items: int) -> List[PlannedChunk]:
+    """
+    按token预算而不是固定条数将条目打包成分片。
+
+    条目先按预估token数从大到小排序，再依次装入当前分片，
+    当前分片的token数或条目数达到上限时开启新分片 (next-fit decreasing)。
+    单个条目超过预算时独占一个分片。
+
+    Returns:
+        分片列表，按预估token数从大到小排列，调用方按此顺序派发即可让最重的分片最先开始。
+    """
+    weighted = sorted(
+        ((estimate_item_tokens(item.content), item) for item in items),
+        key=lambda pair: pair[0],
+        reverse=True,
+    )
+
+    chunks: List[PlannedChunk] = []
+    current = PlannedChunk()
+    for tokens, item in weighted:
+        if current.items and (
+            current.estimated_tokens + tokens > token_budget or len(current.items) >= max_items
+        ):
+            chunks.append(current)
+            current = PlannedChunk()
+        current.items.append(item)
+        current.estimated_tokens += tokens
+    if current.items:
+        chunks.append(current)
+
+    chunks.sort(key=lambda chunk: chunk.estimated_tokens, reverse=True)
+    return chunks
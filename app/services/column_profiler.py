@@ -0,0 +1,251 @@
+import operator
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Inferred column types
+TYPE_EMPTY = "empty"
+TYPE_BOOLEAN = "boolean"
+TYPE_INTEGER = "integer"
+TYPE_NUMBER = "number"
+TYPE_DATE = "date"
+TYPE_DATETIME = "datetime"
+TYPE_STRING = "string"
+
+# Share of non-null values that must fit a type for the column to get that type
+_TYPE_MIN_SHARE = 0.95
+# Pattern shapes are computed on at most this many distinct values, evenly spread over the sorted values
+_SHAPE_SAMPLE_SIZE = 2000
+_TOP_VALUES = 3
+_TOP_SHAPES = 3
+# Top values and shapes longer than this are truncated in the profile
+_MAX_VALUE_CHARS = 30
+
+_BOOLEAN_VALUES = {"true", "false", "yes", "no", "y", "n", "t", "f", "是", "否"}
+_DATE_SHAPES = {"9999-99-99", "9999/99/99", "9999.99.99", "99/99/9999", "99-99-9999", "9999-9-9", "9999/9/9", "99999999"}
+_DATETIME_SEPARATORS = (" ", "T")
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+@dataclass
+class ColumnProfile:
+    """Compact statistics of one column of a source table."""
+    name: str
+    inferred_type: str = TYPE_EMPTY
+    row_count: int = 0
+    null_rate: float = 1.0
+    # Distinct non-null values divided by non-null values
+    distinct_ratio: float = 0.0
+    # (value, share of non-null values), most frequent first
+    top_values: List[Tuple[str, float]] = field(default_factory=list)
+    # (shape, share of sampled distinct values); digits become 9, letters A/a, other characters are kept
+    shapes: List[Tuple[str, float]] = field(default_factory=list)
+    # Smallest and largest value, for numeric and date columns
+    value_range: Optional[Tuple[str, str]] = None
+
+    def describe(self) -> str:
+        """One-line summary of the profile for LLM prompts."""
+        if self.inferred_type == TYPE_EMPTY:
+            return f"type={TYPE_EMPTY}"
+        parts = [
+            f"type={self.inferred_type}",
+            f"nulls={self.null_rate:.0%}",
+            f"distinct={self.distinct_ratio:.0%}",
+        ]
+        if self.value_range:
+            parts.append(f"range={self.value_range[0]}..{self.value_range[1]}")
+        if self.shapes:
+            parts.append("shapes=" + ", ".join(f"{shape}({share:.0%})" for shape, share in self.shapes))
+        if self.top_values:
+            parts.append("top=" + ", ".join(f"{value}({share:.0%})" for value, share in self.top_values))
+        return " ".join(parts)
+
+
+def _truncate(value: str) -> str:
+    return value if len(value) <= _MAX_VALUE_CHARS else value[:_MAX_VALUE_CHARS - 3] + "..."
+
+
+def _column_matrix(rows: List[Dict[str, Any]], names: List[str]) -> np.ndarray:
+    """Build a (rows x columns) object array of the values of the given columns.
+
+    Rows are unpacked with a C-level itemgetter; only when some row lacks a column does this fall back
+    to dict.get, which fills the gap with None.
+    """
+    if not names or not rows:
+        return np.empty((len(rows), len(names)), dtype=object)
+    matrix = np.empty((len(rows), len(names)), dtype=object)
+    getter = operator.itemgetter(*names)
+    try:
+        values = list(map(getter, rows))
+    except KeyError:
+        values = [tuple(row.get(name) for name in names) for row in rows]
+    if len(names) == 1:
+        matrix[:, 0] = values
+    else:
+        matrix[:] = values
+    return matrix
+
+
+def _shapes(values: np.ndarray) -> np.ndarray:
+    """Map every value to its shape: digits to 9, lower-case letters to a, upper-case letters to A."""
+    shapes = values
+    for digit in "012345678":
+        shapes = np.strings.replace(shapes, digit, "9")
+    for letter in _LETTERS:
+        shapes = np.strings.replace(shapes, letter, "a")
+        shapes = np.strings.replace(shapes, letter.upper(), "A")
+    return shapes
+
+
+def _numeric_mask(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (is a number, is an integer) masks for an array of stripped strings."""
+    unsigned = np.strings.lstrip(values, "+-")
+    integer = np.strings.isdecimal(unsigned)
+    without_point = np.strings.replace(unsigned, ".", "", 1)
+    number = np.strings.isdecimal(without_point) & (np.strings.str_len(without_point) > 0)
+    return number, integer
+
+
+def _profile_numeric_column(profile: ColumnProfile, values: np.ndarray, numbers: np.ndarray) -> ColumnProfile:
+    """Fill a profile from the values of a column that holds JSON numbers rather than strings.
+
+    Statistics are computed on the float values, but top values, shapes and the range are taken from the
+    original values, so large integer IDs keep all their digits and integer columns keep integer shapes.
+    """
+    valid = ~np.isnan(numbers)
+    values, numbers = values[valid], numbers[valid]
+    non_null = len(numbers)
+    profile.null_rate = 1 - non_null / profile.row_count
+    if non_null == 0:
+        return profile
+
+    integral = bool(np.all(numbers == np.round(numbers)))
+    keys = numbers
+    if integral:
+        # Integers beyond 2**53 are not exact as floats; count distinct values on int64 when they fit
+        try:
+            keys = values.astype(np.int64)
+        except (OverflowError, TypeError, ValueError):
+            pass
+    uniques, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    # One original value per distinct number, in sorted order
+    originals = [str(value) for value in values[first].tolist()]
+    profile.distinct_ratio = len(uniques) / non_null
+    top = np.argsort(-counts, kind="stable")[:_TOP_VALUES]
+    profile.top_values = [(_truncate(originals[i]), counts[i] / non_null) for i in top]
+
+    sample = np.array(originals)
+    if len(uniques) > _SHAPE_SAMPLE_SIZE:
+        sample = sample[np.linspace(0, len(uniques) - 1, _SHAPE_SAMPLE_SIZE).astype(int)]
+    sample_shapes, shape_counts = np.unique(_shapes(sample), return_counts=True)
+    top = np.argsort(-shape_counts, kind="stable")[:_TOP_SHAPES]
+    profile.shapes = [(_truncate(str(sample_shapes[i])), shape_counts[i] / len(sample)) for i in top]
+
+    profile.inferred_type = TYPE_INTEGER if integral else TYPE_NUMBER
+    profile.value_range = (originals[0], originals[-1])
+    return profile
+
+
+def _profile_column(name: str, column: np.ndarray) -> ColumnProfile:
+    profile = ColumnProfile(name=name, row_count=len(column))
+    if len(column) == 0:
+        return profile
+
+    # None and blank strings count as nulls
+    present = column[column != None]  # noqa: E711 - elementwise comparison on an object array
+    if len(present) and type(present[0]) in (int, float):
+        # Columns of JSON numbers skip the slow conversion of every value to a string
+        try:
+            numbers = present.astype(float)
+        except (TypeError, ValueError):
+            pass
+        else:
+            profile.null_rate = 1 - len(present) / len(column)
+            return _profile_numeric_column(profile, present, numbers)
+    texts = np.strings.strip(present.astype(str))
+    texts = texts[np.strings.str_len(texts) > 0]
+    non_null = len(texts)
+    profile.null_rate = 1 - non_null / len(column)
+    if non_null == 0:
+        return profile
+
+    uniques, counts = np.unique(texts, return_counts=True)
+    profile.distinct_ratio = len(uniques) / non_null
+    top = np.argsort(-counts, kind="stable")[:_TOP_VALUES]
+    profile.top_values = [(_truncate(str(uniques[i])), counts[i] / non_null) for i in top]
+
+    sample = uniques
+    if len(uniques) > _SHAPE_SAMPLE_SIZE:
+        sample = uniques[np.linspace(0, len(uniques) - 1, _SHAPE_SAMPLE_SIZE).astype(int)]
+    sample_shapes, shape_counts = np.unique(_shapes(sample), return_counts=True)
+    top = np.argsort(-shape_counts, kind="stable")[:_TOP_SHAPES]
+    profile.shapes = [(_truncate(str(sample_shapes[i])), shape_counts[i] / len(sample)) for i in top]
+
+    # Types are decided on value occurrences, so a few odd distinct values do not change the type
+    number, integer = _numeric_mask(uniques)
+    number_share = counts[number].sum() / non_null
+    date_shape_share = sum(
+        share for shape, share in zip(sample_shapes, shape_counts / len(sample)) if str(shape) in _DATE_SHAPES
+    )
+    datetime_shape_share = sum(
+        share for shape, share in zip(sample_shapes, shape_counts / len(sample))
+        if any(str(shape)[:10] in _DATE_SHAPES and str(shape)[10:11] == separator for separator in _DATETIME_SEPARATORS)
+    )
+    lowered = set(np.strings.lower(uniques).tolist()) if len(uniques) <= len(_BOOLEAN_VALUES) else None
+
+    if lowered is not None and len(uniques) <= 2 and lowered <= _BOOLEAN_VALUES:
+        profile.inferred_type = TYPE_BOOLEAN
+    elif date_shape_share >= _TYPE_MIN_SHARE:
+        profile.inferred_type = TYPE_DATE
+    elif datetime_shape_share >= _TYPE_MIN_SHARE:
+        profile.inferred_type = TYPE_DATETIME
+    elif number_share >= _TYPE_MIN_SHARE:
+        profile.inferred_type = TYPE_INTEGER if counts[integer].sum() / non_null >= _TYPE_MIN_SHARE else TYPE_NUMBER
+    else:
+        profile.inferred_type = TYPE_STRING
+
+    if profile.inferred_type in (TYPE_INTEGER, TYPE_NUMBER):
+        # Report the original strings of the extremes, so long IDs keep all their digits
+        texts = uniques[number]
+        numbers = texts.astype(float)
+        profile.value_range = (_truncate(str(texts[numbers.argmin()])), _truncate(str(texts[numbers.argmax()])))
+    elif profile.inferred_type in (TYPE_DATE, TYPE_DATETIME):
+        # Sorted distinct values, so the ends are the extremes for year-first formats
+        profile.value_range = (str(uniques[0]), str(uniques[-1]))
+    return profile
+
+
+def profile_table(table: Dict[str, Any], max_rows: int = 0) -> Dict[str, ColumnProfile]:
+    """Profile every declared field of a source table from its detailData.
+
+    Args:
+        table: Source table with "fields" and "detailData".
+        max_rows: When positive and the table has more rows, profile an evenly spaced sample of about
+            this many rows instead of every row.
+
+    Returns:
+        Dict of field name -> ColumnProfile.
+    """
+    names = [str(source_field['fieldName']) for source_field in table['fields']]
+    rows = table.get('detailData') or []
+    if max_rows > 0 and len(rows) > max_rows:
+        rows = rows[::-(-len(rows) // max_rows)]
+    matrix = _column_matrix(rows, names)
+    return {name: _profile_column(name, matrix[:, index]) for index, name in enumerate(names)}
+
+
+# How well a declared target field type fits an inferred source column type:
+# 1 when they agree, -1 when they clearly conflict, 0 when the profile says nothing either way
+_TYPE_COMPATIBILITY = {
+    "date": {TYPE_DATE: 1, TYPE_DATETIME: 1, TYPE_BOOLEAN: -1, TYPE_INTEGER: -1, TYPE_NUMBER: -1},
+    "datetime": {TYPE_DATE: 1, TYPE_DATETIME: 1, TYPE_BOOLEAN: -1, TYPE_INTEGER: -1, TYPE_NUMBER: -1},
+    "boolean": {TYPE_BOOLEAN: 1, TYPE_DATE: -1, TYPE_DATETIME: -1, TYPE_NUMBER: -1},
+    "integer": {TYPE_INTEGER: 1, TYPE_NUMBER: 1, TYPE_DATE: -1, TYPE_DATETIME: -1},
+    "number": {TYPE_INTEGER: 1, TYPE_NUMBER: 1, TYPE_DATE: -1, TYPE_DATETIME: -1},
+}
+
+
+def type_compatibility(target_type: str, inferred_type: str) -> int:
+    """Return 1, 0 or -1 for how well a target field type fits an inferred column type."""
+    return _TYPE_COMPATIBILITY.get(str(target_type).lower(), {}).get(inferred_type, 0)
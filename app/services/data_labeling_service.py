@@ -1,8 +1,19 @@
 from ..agents.data_agent import DataAnnotationAgent as DataAgent
+from ..clients.llm_scheduler import llm_call_context
+from ..config.settings import settings
+from ..monitoring.translation_metrics import increment
+from .chunk_planner import estimate_tokens
+from .column_profiler import ColumnProfile, profile_table
+from .field_ranker import FieldCandidateIndex, TIER_EXACT, TIER_LEXICAL, TIER_LLM
+from .mapping_memo import (
+    KIND_FIELD, KIND_TABLE, field_decision_key, schema_mapping_memo, source_table_signature, table_decision_key
+)
 import asyncio
 import json
 import os
-from typing import Dict, Any, List, Tuple
+import zlib
+from typing import Dict, Any, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
 from app.config.logging import configure_logging
 import logging
 
@@ -10,24 +21,291 @@ import logging
 configure_logging()
 logger = logging.getLogger(__name__)
 
-def format_source_table_desc(table):
-    """Format a single source table description for LLM prompting."""
+def format_source_table_desc(table, profiles: Optional[Dict[str, ColumnProfile]] = None):
+    """Format a single source table description for LLM prompting.
+
+    Each field is followed by compact statistics of its values (see column_profiler) instead of raw
+    example rows. Profiles are computed from the table's detailData when not given.
+    """
+    if profiles is None:
+        profiles = profile_table(table, settings.data_labeling_profile_max_rows)
     table_desc = f"Table: {table['tableName']}\n"
     table_desc += "Structure and Data:\n"
     # Create a header row
     headers = "  ".join(field['fieldName'] for field in table['fields'])
     table_desc += f"  {headers}\n"
-    # Add field descriptions
+    # Add field descriptions with the profile of their values
     for field in table['fields']:
         table_desc += f"  {field['fieldName']} ({field['fieldType']}): {field['fieldLabel']}\n"
-    # Add example data
-    table_desc += "Example Rows:\n"
-    for row in table['detailData'][:2]:
-        values = "  ".join(str(row.get(field['fieldName'], '')) for field in table['fields'])
-        table_desc += f"  {values}\n"
+        profile = profiles.get(str(field['fieldName']))
+        if profile is not None:
+            table_desc += f"    values: {profile.describe()}\n"
     table_desc += "\n"
     return table_desc
 
+def format_target_table_desc(target_table):
+    """Format a single target table description for LLM prompting."""
+    target_table_info = f"Table: {target_table['name']}\n"
+    target_table_info += "Fields:\n"
+    for field in target_table['fields']:
+        target_table_info += f"  - {field['name']} ({field.get('type', 'unknown')}): {field.get('description', 'No description provided')}\n"
+    return target_table_info
+
+def assign_tables(matrix: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, Any]]:
+    """Pick the best source table for each target table from a confidence matrix.
+
+    Applies the same rule as DataAnnotationAgent.map_table: a best match below 0.7 confidence is
+    reported as "Nothing Compatible". Target tables without any candidate are omitted.
+    """
+    assignments = {}
+    for target, row in matrix.items():
+        if not row:
+            continue
+        source_table, confidence = max(row.items(), key=lambda candidate: candidate[1])
+        if confidence < 0.7:
+            assignments[target] = {"source_table": "Nothing Compatible", "confidence": confidence}
+        else:
+            assignments[target] = {"source_table": source_table, "confidence": confidence}
+    return assignments
+
+async def match_tables(
+    data_agent: DataAgent, target_tables: List[Dict[str, Any]], source_tables_desc: str, source_table_names: List[str]
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, float]]]:
+    """Match every target table to a source table.
+
+    In batched mode the target tables are scored against all source tables in a few calls, each
+    sending the source descriptions once for a slice of target tables, and the assignment is made
+    locally from the resulting confidence matrix. Target tables the batched calls did not score are
+    mapped individually with map_table.
+
+    Returns:
+        (target table name -> {"source_table", "confidence"}, confidence matrix)
+    """
+    matrix: Dict[str, Dict[str, float]] = {}
+    if settings.data_labeling_batch_tables:
+        batch_size = max(1, settings.data_labeling_table_batch_size)
+        batches = [target_tables[i:i + batch_size] for i in range(0, len(target_tables), batch_size)]
+        batch_results = await asyncio.gather(*[
+            data_agent.score_tables(
+                target_tables_desc=[
+                    {"name": table['name'], "description": format_target_table_desc(table)} for table in batch
+                ],
+                source_data_description=source_tables_desc,
+            )
+            for batch in batches
+        ])
+        # Scores for source table names the model made up are dropped; target tables left
+        # without any known candidate fall back to map_table below
+        known = set(source_table_names)
+        for batch_result in batch_results:
+            for target, row in batch_result.items():
+                row = {source: confidence for source, confidence in row.items() if source in known}
+                if row:
+                    matrix[target] = row
+        increment("data_labeling.table_batch_calls", len(batches))
+
+    logger.debug(f"Table confidence matrix: {matrix}")
+    table_results = assign_tables(matrix)
+
+    # Fall back to one call per target table for anything the batched calls did not score
+    remaining = [table for table in target_tables if table['name'] not in table_results]
+    if remaining:
+        if settings.data_labeling_batch_tables:
+            logger.warning(f"Batched table matching returned no usable score for {len(remaining)} tables, mapping them individually")
+        increment("data_labeling.table_single_calls", len(remaining))
+        single_results = await asyncio.gather(*[
+            data_agent.map_table(
+                target_table_desc=format_target_table_desc(table),
+                source_data_description=source_tables_desc,
+            )
+            for table in remaining
+        ])
+        for table, table_result in zip(remaining, single_results):
+            table_results[table['name']] = table_result
+    return table_results, matrix
+
+def plan_field_batches(target_fields: List[Dict[str, Any]], token_budget: int, max_fields: int) -> List[List[Dict[str, Any]]]:
+    """Split a table's target fields into slices that fit one batched field-mapping prompt.
+
+    Fields are kept in their original order; a new slice starts when adding a field would exceed
+    the token budget for target field descriptions or the field count limit.
+    """
+    batches: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    current_tokens = 0
+    for field in target_fields:
+        tokens = estimate_tokens(f"- {field['name']}: {field.get('description') or ''}") + 1
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_fields):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(field)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def restrict_source_table(source_table: Dict[str, Any], field_names) -> Dict[str, Any]:
+    """Return a copy of a source table that only describes the given fields, in table order."""
+    keep = set(field_names)
+    return {**source_table, "fields": [field for field in source_table['fields'] if field['fieldName'] in keep]}
+
+async def map_table_fields(
+    data_agent: DataAgent,
+    target_fields: List[Dict[str, Any]],
+    source_table: Dict[str, Any],
+    shortlists: Dict[str, List[str]] = None,
+    profiles: Optional[Dict[str, ColumnProfile]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Map every target field of a table against one source table with the LLM.
+
+    In batched mode the fields are sent in token-budgeted slices, each in a single call, so the source
+    description is sent once per slice instead of once per field. Fields whose entries are missing, fail
+    to parse or name a source field that was not in the prompt are mapped individually with map_field.
+
+    When shortlists are given (target field name -> candidate source field names), each prompt only
+    describes the candidates of the fields it contains instead of the whole source table.
+
+    Returns:
+        Dict of target field name -> {"source_field", "confidence"}.
+    """
+    def candidate_table(fields: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if not shortlists:
+            return source_table
+        candidates = set()
+        for field in fields:
+            candidates.update(shortlists.get(field['name'], []))
+        return restrict_source_table(source_table, candidates)
+
+    def describe(fields: List[Dict[str, Any]]) -> str:
+        return format_source_table_desc(candidate_table(fields), profiles)
+
+    async def map_batch(batch: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        table = candidate_table(batch)
+        return await data_agent.map_fields(
+            target_fields=[
+                {"name": field['name'], "description": field.get('description', 'No description provided')}
+                for field in batch
+            ],
+            source_data_description=format_source_table_desc(table, profiles),
+            source_field_names=[str(field['fieldName']) for field in table['fields']],
+        )
+
+    field_results: Dict[str, Dict[str, Any]] = {}
+    if settings.data_labeling_batch_fields:
+        batches = plan_field_batches(
+            target_fields, settings.data_labeling_field_batch_tokens, settings.data_labeling_field_batch_size
+        )
+        batch_results = await asyncio.gather(*[map_batch(batch) for batch in batches])
+        for batch_result in batch_results:
+            field_results.update(batch_result)
+        increment("data_labeling.field_batch_calls", len(batches))
+
+    # Fall back to one call per field for anything the batched calls did not return
+    remaining = [field for field in target_fields if field['name'] not in field_results]
+    if remaining:
+        if settings.data_labeling_batch_fields:
+            logger.warning(f"Batched field mapping returned no usable entry for {len(remaining)} fields, mapping them individually")
+        increment("data_labeling.field_single_calls", len(remaining))
+        single_results = await asyncio.gather(*[
+            data_agent.map_field(
+                target_field_name=field['name'],
+                target_field_desc=field.get('description', 'No description provided'),
+                source_data_description=describe([field]),
+            )
+            for field in remaining
+        ])
+        for field, field_result in zip(remaining, single_results):
+            field_results[field['name']] = field_result
+    return field_results
+
+def _audit_sampled(target_table_name: str, field_name: str, rate: float) -> bool:
+    """Deterministically pick the locally resolved fields that are also sent to the LLM as an audit."""
+    return zlib.crc32(f"{target_table_name}.{field_name}".encode("utf-8")) % 10000 < rate * 10000
+
+async def resolve_table_fields(
+    data_agent: DataAgent,
+    target_table: Dict[str, Any],
+    source_table: Dict[str, Any],
+    profiles: Optional[Dict[str, ColumnProfile]] = None,
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+    """Map the fields of a target table, resolving exact and near-exact name matches locally.
+
+    A character n-gram index over the source fields resolves target fields whose names match a source
+    field exactly or with a high, unambiguous similarity without any LLM call; every other field is sent
+    to the LLM with only its top-k candidates. A deterministic sample of the locally resolved fields is
+    also mapped by the LLM, and the agreement rate serves as a precision estimate for local resolution.
+    Column profiles of the source table, when given, are used both for ranking and in the prompts.
+
+    Returns:
+        (target field name -> {"source_field", "confidence"}, resolution counts by tier plus
+        "audited" and "auditAgreed")
+    """
+    target_fields = target_table['fields']
+    resolution = {TIER_EXACT: 0, TIER_LEXICAL: 0, TIER_LLM: 0, "audited": 0, "auditAgreed": 0}
+    if not settings.data_labeling_prerank_enabled:
+        resolution[TIER_LLM] = len(target_fields)
+        return await map_table_fields(data_agent, target_fields, source_table, profiles=profiles), resolution
+
+    rankings = FieldCandidateIndex(source_table['fields'], profiles).rank(
+        target_fields,
+        top_k=settings.data_labeling_prerank_top_k,
+        accept_score=settings.data_labeling_prerank_accept_score,
+        accept_margin=settings.data_labeling_prerank_accept_margin,
+    )
+    field_results: Dict[str, Dict[str, Any]] = {}
+    llm_fields = []
+    audited = set()
+    for field in target_fields:
+        ranking = rankings[field['name']]
+        resolution[ranking.tier] += 1
+        if ranking.tier == TIER_LLM:
+            llm_fields.append(field)
+            continue
+        field_results[field['name']] = {"source_field": ranking.source_field, "confidence": ranking.confidence}
+        if _audit_sampled(target_table['name'], field['name'], settings.data_labeling_prerank_audit_rate):
+            audited.add(field['name'])
+            llm_fields.append(field)
+    for tier in (TIER_EXACT, TIER_LEXICAL, TIER_LLM):
+        increment(f"data_labeling.prerank.{tier}", resolution[tier])
+
+    if llm_fields:
+        # Audited fields get the full candidate list so the check does not depend on the ranking
+        shortlists = {
+            field['name']: (
+                [source_field['fieldName'] for source_field in source_table['fields']]
+                if field['name'] in audited
+                else [name for name, _ in rankings[field['name']].candidates]
+            )
+            for field in llm_fields
+        }
+        llm_results = await map_table_fields(data_agent, llm_fields, source_table, shortlists, profiles)
+        for name, llm_result in llm_results.items():
+            if name not in audited:
+                field_results[name] = llm_result
+                continue
+            resolution["audited"] += 1
+            if llm_result['source_field'] == field_results[name]['source_field']:
+                resolution["auditAgreed"] += 1
+            else:
+                logger.info(
+                    f"Prerank audit disagreement on {target_table['name']}.{name}: "
+                    f"local {field_results[name]['source_field']}, LLM {llm_result['source_field']}"
+                )
+        increment("data_labeling.prerank.audited", resolution["audited"])
+        increment("data_labeling.prerank.audit_agreed", resolution["auditAgreed"])
+    return field_results, resolution
+
+def _memoizable(decisions: Dict[str, Dict[str, Any]], keys: Dict[str, str], match_key: str) -> Dict[str, Dict[str, Any]]:
+    """Select the decisions to store in the memo, keyed by memo key.
+
+    Failed agent calls come back as "Nothing Compatible" with 0.0 confidence; those are not stored so
+    that the next request maps them again.
+    """
+    return {
+        keys[name]: decision for name, decision in decisions.items()
+        if name in keys and not (decision[match_key] == "Nothing Compatible" and decision['confidence'] == 0.0)
+    }
+
 async def map_data_schemas(source_data: Dict[str, Any]) -> Dict[str, Any]:
     """Map source data tables and fields to target schema using semantic analysis.
     
@@ -49,11 +327,18 @@ async def map_data_schemas(source_data: Dict[str, Any]) -> Dict[str, Any]:
     if not source_data:
         raise ValueError("source_data is required and cannot be empty")
     
+    # Profile the values of every source table once; the profiles are used in all prompts and for local matching.
+    # Profiling is CPU-bound, so it runs in the thread pool instead of blocking the event loop
+    source_profiles = {}
+    for table in source_data['originalData']['tables']:
+        source_profiles[table['tableName']] = await run_in_threadpool(
+            profile_table, table, settings.data_labeling_profile_max_rows
+        )
+    
     # Extract descriptions for all source tables
     source_tables_desc = ""
     for table in source_data['originalData']['tables']:
-        # Use the existing format_source_table_desc function which already includes one detail data row
-        source_tables_desc += format_source_table_desc(table)
+        source_tables_desc += format_source_table_desc(table, source_profiles[table['tableName']])
     
     # Result structure
     result = {
@@ -79,25 +364,23 @@ async def map_data_schemas(source_data: Dict[str, Any]) -> Dict[str, Any]:
     mapped_tables = 0
     total_fields = 0
     mapped_fields = 0
+    field_resolution = {TIER_EXACT: 0, TIER_LEXICAL: 0, TIER_LLM: 0, "audited": 0, "auditAgreed": 0, "memo": 0}
+    
+    # Stored decisions are reused when the target definitions and source field signatures are unchanged
+    version_id = target_schema.get('versionId', 'unknown')
+    memo_enabled = settings.data_labeling_memo_enabled
+    source_signatures = {
+        table['tableName']: source_table_signature(table) for table in source_data['originalData']['tables']
+    }
     
     # Count all target fields from all target tables first
     for target_table in target_schema['tables']:
         total_fields += len(target_table['fields'])
     
-    async def process_table(target_table):
+    async def process_table(target_table, table_result):
         nonlocal total_tables, mapped_tables, mapped_fields
         total_tables += 1
         logger.info(f"Processing target table: {target_table['name']}")
-        target_table_info = f"Table: {target_table['name']}\n"
-        target_table_info += "Fields:\n"
-        for field in target_table['fields']:
-            target_table_info += f"  - {field['name']} ({field.get('type', 'unknown')}): {field.get('description', 'No description provided')}\n"
-        
-        # Map table
-        table_result = await data_agent.map_table(
-            target_table_desc=target_table_info,
-            source_data_description=source_tables_desc
-        )
         
         # Check table compatibility with >= 0.86 confidence threshold
         if table_result['source_table'] == "Nothing Compatible" or table_result['confidence'] < 0.86:
@@ -126,47 +409,44 @@ async def map_data_schemas(source_data: Dict[str, Any]) -> Dict[str, Any]:
                 "description": "Source table not found"
             }
         
-        # Format description for just this source table
-        single_source_desc = format_source_table_desc(source_table)
-        
         # Initialize mappings for this table
         field_mappings = {}
         
-        # Create async function for field mapping within this table
-        async def map_single_field(target_field):
-            logger.debug(f"Mapping field: {target_field['name']} in table: {target_table['name']}")
-            field_result = await data_agent.map_field(
-                target_field_name=target_field['name'],
-                target_field_desc=target_field.get('description', 'No description provided'),
-                source_data_description=single_source_desc
-            )
-            
-            # Check field compatibility with >= 0.8 confidence threshold
-            if field_result['source_field'] == "Nothing Compatible" or field_result['confidence'] < 0.8:
-                return None
-            else:
-                nonlocal mapped_fields
-                mapped_fields += 1
-                return (target_field['name'], field_result['source_field'])
-        
-        # Create tasks for all fields in this table
-        field_tasks = [map_single_field(target_field) for target_field in target_table['fields']]
-        
-        # Process fields with semaphore to limit concurrency and respect model limits
-        field_sem = asyncio.Semaphore(6)  # Limit to 5 concurrent field mappings per table
-        
-        async def limited_field_task(task):
-            async with field_sem:
-                return await task
+        # Reuse stored field decisions against this source table, and only map the remaining fields
+        field_keys = {}
+        memo_fields = {}
+        if memo_enabled:
+            field_keys = {
+                field['name']: field_decision_key(field, source_signatures[source_table_name])
+                for field in target_table['fields']
+            }
+            stored = await run_in_threadpool(schema_mapping_memo.get_many, version_id, KIND_FIELD, field_keys.values())
+            memo_fields = {name: stored[key] for name, key in field_keys.items() if key in stored}
+            field_resolution["memo"] += len(memo_fields)
+        pending_table = {
+            **target_table, "fields": [field for field in target_table['fields'] if field['name'] not in memo_fields]
+        }
         
-        # Apply concurrency limit to field tasks
-        limited_field_tasks = [limited_field_task(task) for task in field_tasks]
-        field_results = await asyncio.gather(*limited_field_tasks)
+        # Map all fields of this table; concurrency is bounded by the shared LLM scheduler
+        field_results, table_resolution = await resolve_table_fields(
+            data_agent, pending_table, source_table, source_profiles[source_table_name]
+        )
+        for key, count in table_resolution.items():
+            field_resolution[key] += count
+        if memo_enabled:
+            await run_in_threadpool(
+                schema_mapping_memo.set_many, version_id, KIND_FIELD, _memoizable(field_results, field_keys, 'source_field')
+            )
+        field_results.update(memo_fields)
         
         # Process the results and build the field mappings dictionary
-        for result in field_results:
-            if result is not None:
-                field_mappings[result[0]] = result[1]
+        for target_field in target_table['fields']:
+            field_result = field_results[target_field['name']]
+            # Check field compatibility with >= 0.8 confidence threshold
+            if field_result['source_field'] == "Nothing Compatible" or field_result['confidence'] < 0.8:
+                continue
+            mapped_fields += 1
+            field_mappings[target_field['name']] = field_result['source_field']
         
         # Return table mapping to be added to results
         return {
@@ -177,19 +457,41 @@ async def map_data_schemas(source_data: Dict[str, Any]) -> Dict[str, Any]:
             "description": f"Mapped table with confidence: {table_result['confidence']:.3f}"
         }
     
-    # Create tasks for all target tables
-    table_tasks = [process_table(target_table) for target_table in target_schema['tables']]
-    
-    # Process tables with semaphore to limit concurrency and respect model limits
-    sem = asyncio.Semaphore(5)  # Limit to 3 concurrent table mappings
-    
-    async def limited_task(task):
-        async with sem:
-            return await task
-    
-    # Apply concurrency limit to table tasks
-    limited_table_tasks = [limited_task(task) for task in table_tasks]
-    table_mappings = await asyncio.gather(*limited_table_tasks)
+    # All agent calls made by this request are scheduled under the data_labeling pipeline budget,
+    # queued fairly against other requests instead of per-request semaphores
+    with llm_call_context("data_labeling"):
+        # Reuse stored table decisions, and match the remaining target tables against the source tables
+        table_keys = {}
+        memo_tables = {}
+        if memo_enabled:
+            table_keys = {
+                target_table['name']: table_decision_key(target_table, source_signatures.values())
+                for target_table in target_schema['tables']
+            }
+            stored = await run_in_threadpool(schema_mapping_memo.get_many, version_id, KIND_TABLE, table_keys.values())
+            memo_tables = {name: stored[key] for name, key in table_keys.items() if key in stored}
+        pending_tables = [table for table in target_schema['tables'] if table['name'] not in memo_tables]
+        table_results, table_scores = {}, {}
+        if pending_tables:
+            table_results, table_scores = await match_tables(
+                data_agent,
+                pending_tables,
+                source_tables_desc,
+                [table['tableName'] for table in source_data['originalData']['tables']],
+            )
+        if memo_enabled:
+            await run_in_threadpool(
+                schema_mapping_memo.set_many, version_id, KIND_TABLE, _memoizable(table_results, table_keys, 'source_table')
+            )
+        table_results.update(memo_tables)
+        
+        # Then map the fields of each table
+        table_tasks = [
+            process_table(target_table, table_results[target_table['name']])
+            for target_table in target_schema['tables']
+        ]
+        table_mappings = await asyncio.gather(*table_tasks)
+    result["tableScores"] = table_scores
     
     # Add all table mappings to results
     for table_mapping in table_mappings:
@@ -202,5 +504,18 @@ async def map_data_schemas(source_data: Dict[str, Any]) -> Dict[str, Any]:
     result["statistics"]["mappedFields"] = mapped_fields
     result["statistics"]["unmappedFields"] = total_fields - mapped_fields
     result["statistics"]["mappingSuccessRate"] = mapped_fields / total_fields if total_fields > 0 else 0.0
+    # How target fields of matched tables were resolved, and the share of audited local resolutions
+    # the LLM agreed with (None when nothing was audited)
+    result["statistics"]["memoTables"] = len(memo_tables)
+    result["statistics"]["fieldResolution"] = {
+        "exact": field_resolution[TIER_EXACT],
+        "lexical": field_resolution[TIER_LEXICAL],
+        "llm": field_resolution[TIER_LLM],
+        "memo": field_resolution["memo"],
+        "audited": field_resolution["audited"],
+        "localPrecision": (
+            field_resolution["auditAgreed"] / field_resolution["audited"] if field_resolution["audited"] else None
+        ),
+    }
     
     return result
\ No newline at end of file
@@ -0,0 +1,195 @@
+# app/services/document_translation.py
+import logging
+import re
+from typing import Any, Dict, List, Tuple, Union
+
+import httpx
+
+from .llm_service import translate_list_to_map
+
+# 获取一个日志记录器实例
+logger = logging.getLogger(__name__)
+
+# 文档中一个节点的路径：由对象的键和数组的下标组成
+JsonPath = Tuple[Union[str, int], ...]
+
+# 选择器中的一个步骤: (类型, 参数)
+# - ("child", 键名) / ("index", 下标) / ("wildcard", None)：匹配直接子节点；
+# - ("descend", 键名或None)：递归匹配任意深度的子孙节点，None表示所有子孙节点
+Step = Tuple[str, Any]
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    \.\.(?P<descend>\*|[^.\[\]]+)          # ..name / ..*
+    | \.(?P<child>\*|[^.\[\]]+)            # .name / .*
+    | \[\s*(?P<index>-?\d+)\s*\]           # [0] / [-1]
+    | \[\s*\*\s*\](?P<wildcard>)           # [*]
+    | \[\s*'(?P<squoted>(?:[^'\\]|\\.)*)'\s*\]   # ['name']
+    | \[\s*"(?P<dquoted>(?:[^"\\]|\\.)*)"\s*\]   # ["name"]
+    """,
+    re.VERBOSE,
+)
+
+
+class SelectorError(ValueError):
+    """选择器语法错误时抛出的异常。"""
+
+
+def compile_selector(selector: str) -> List[Step]:
+    """
+    将JSONPath风格的选择器解析为步骤列表。
+
+    支持的语法 (JSONPath的子集)：`$` 根节点、`.name` / `['name']` 子节点、`[0]` / `[-1]` 数组下标、
+    `.*` / `[*]` 所有子节点、`..name` / `..*` 递归匹配任意深度的子孙节点。
+    例如 `$.meta[*].relativeFieldAlias.*` 或 `$..relativeFieldAlias.*`。
+    """
+    selector = selector.strip()
+    if not selector.startswith("$"):
+        raise SelectorError(f"选择器必须以 '$' 开头: {selector!r}")
+
+    steps: List[Step] = []
+    position = 1
+    while position < len(selector):
+        match = _TOKEN_PATTERN.match(selector, position)
+        if match is None:
+            raise SelectorError(f"选择器在第 {position} 个字符处无法解析: {selector!r}")
+        if match.group("descend") is not None:
+            name = match.group("descend")
+            steps.append(("descend", None if name == "*" else name))
+        elif match.group("child") is not None:
+            name = match.group("child")
+            steps.append(("wildcard", None) if name == "*" else ("child", name))
+        elif match.group("index") is not None:
+            steps.append(("index", int(match.group("index"))))
+        elif match.group("wildcard") is not None:
+            steps.append(("wildcard", None))
+        else:
+            quoted = match.group("squoted") if match.group("squoted") is not None else match.group("dquoted")
+            steps.append(("child", re.sub(r"\\(.)", r"\1", quoted)))
+        position = match.end()
+    return steps
+
+
+def _children(node: Any) -> List[Tuple[Union[str, int], Any]]:
+    """返回一个容器节点的 (键或下标, 子节点) 列表，标量返回空列表。"""
+    if isinstance(node, dict):
+        return list(node.items())
+    if isinstance(node, list):
+        return list(enumerate(node))
+    return []
+
+
+def extract_leaf_strings(document: Any, steps: List[Step]) -> Dict[JsonPath, str]:
+    """
+    一次遍历文档，返回选择器匹配到的所有字符串叶子节点。
+
+    匹配到的对象、数组、数字等非字符串节点会被忽略。
+
+    Returns:
+        路径 -> 字符串，按文档顺序排列。同一节点被多个分支匹配时只出现一次。
+    """
+    matches: Dict[JsonPath, str] = {}
+
+    def walk(node: Any, step_index: int, path: JsonPath) -> None:
+        if step_index == len(steps):
+            if isinstance(node, str):
+                matches.setdefault(path, node)
+            return
+
+        kind, argument = steps[step_index]
+        if kind == "child":
+            if isinstance(node, dict) and argument in node:
+                walk(node[argument], step_index + 1, path + (argument,))
+        elif kind == "index":
+            if isinstance(node, list) and -len(node) <= argument < len(node):
+                index = argument % len(node)
+                walk(node[index], step_index + 1, path + (index,))
+        elif kind == "wildcard":
+            for key, child in _children(node):
+                walk(child, step_index + 1, path + (key,))
+        else:
+            # 递归下降: 在当前节点的每一层子孙节点上尝试匹配
+            for key, child in _children(node):
+                if argument is None or key == argument:
+                    walk(child, step_index + 1, path + (key,))
+                walk(child, step_index, path + (key,))
+
+    walk(document, 0, ())
+    return matches
+
+
+def apply_translations(document: Any, replacements: Dict[JsonPath, str]) -> Any:
+    """
+    将译文写回文档，返回新的文档。
+
+    只复制从根节点到被替换叶子节点路径上的容器，其余子树直接与原文档共享，不做深拷贝。
+    原文档不会被修改。
+    """
+    if not replacements:
+        return document
+
+    # 将路径组织成前缀树，每个容器节点只复制一次
+    trie: Dict[Any, Any] = {}
+    for path, value in replacements.items():
+        if not path:
+            return value
+        node = trie
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = _Leaf(value)
+
+    def rebuild(node: Any, subtree: Dict[Any, Any]) -> Any:
+        copied = dict(node) if isinstance(node, dict) else list(node)
+        for key, child in subtree.items():
+            copied[key] = child.value if isinstance(child, _Leaf) else rebuild(node[key], child)
+        return copied
+
+    return rebuild(document, trie)
+
+
+class _Leaf:
+    """前缀树中的叶子节点，保存要写回的译文。"""
+    __slots__ = ("value",)
+
+    def __init__(self, value: str):
+        self.value = value
+
+
+async def translate_document(
+    source_lang: str,
+    target_lang: str,
+    document: Any,
+    selector: str,
+    client: httpx.AsyncClient,
+) -> Tuple[Any, Dict[str, int]]:
+    """
+    (异步) 翻译一个JSON文档中被选择器匹配到的字符串叶子节点。
+
+    叶子节点在一次遍历中提取并去重后，经过 `translate_list_to_map` 的完整流水线
+    (本地快速通道、缓存、翻译记忆、分片并发) 翻译，再写回文档。未被匹配的子树与原文档共享。
+
+    Returns:
+        (翻译后的文档, 统计信息)。统计信息包含匹配到的叶子节点数 `matched_leaves`
+        和去重后的内容数 `unique_items`。
+
+    Raises:
+        SelectorError: 选择器语法错误。
+    """
+    steps = compile_selector(selector)
+    leaves = extract_leaf_strings(document, steps)
+    unique_contents = list(dict.fromkeys(leaves.values()))
+    logger.info(
+        f"文档翻译: 选择器 {selector!r} 匹配到 {len(leaves)} 个字符串叶子节点，"
+        f"去重后为 {len(unique_contents)} 个独立内容。"
+    )
+    stats = {"matched_leaves": len(leaves), "unique_items": len(unique_contents)}
+    if not unique_contents:
+        return document, stats
+
+    translated_map = await translate_list_to_map(source_lang, target_lang, unique_contents, client)
+    replacements = {
+        path: translated_map[content]
+        for path, content in leaves.items()
+        if translated_map.get(content, content) != content
+    }
+    return apply_translations(document, replacements), stats
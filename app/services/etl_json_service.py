@@ -15,6 +15,7 @@ from typing import Any, Dict, Optional
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.agents.etl_team import get_team
+from app.clients.llm_scheduler import llm_call_context
 from app.config.logging import configure_logging
 
 # 配置日志
@@ -112,9 +113,10 @@ async def generate_etl_json(task_description: Any) -> Dict[str, Any]:
             else str(task_description)
         )
         
-        # 使用直接运行模式
+        # 使用直接运行模式，团队中的智能体调用按 etl 流水线的预算和优先级调度
         try:
-            result = await team.run(task=task_str)
+            with llm_call_context("etl"):
+                result = await team.run(task=task_str)
         finally:
             # 无论成功或失败，都将团队实例返回连接池
             await _return_team(team)
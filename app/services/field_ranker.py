@@ -0,0 +1,182 @@
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .column_profiler import ColumnProfile, type_compatibility
+
+# Number of hashed character n-gram buckets per vector
+_HASH_DIM = 1 << 12
+_NGRAM_SIZES = (2, 3, 4)
+# Weight of the name-to-name similarity in the shortlist score; the rest comes from the
+# similarity of the full text (name plus label or description)
+_NAME_WEIGHT = 0.7
+# Added to (or taken from) the shortlist score when the target field type agrees (or conflicts)
+# with the type inferred from the source column's values
+_TYPE_WEIGHT = 0.1
+_NON_WORD = re.compile(r"[\W_]+")
+
+# Resolution tiers, in the order they are tried
+TIER_EXACT = "exact"
+TIER_LEXICAL = "lexical"
+TIER_LLM = "llm"
+
+
+def normalize_field_name(name: str) -> str:
+    """Lower-case a field name and drop separators, so that "Site_ID" and "SITEID" compare equal."""
+    return _NON_WORD.sub("", str(name).lower())
+
+
+def _ngram_buckets(text: str) -> List[int]:
+    """Hash the character n-grams of each word of `text` into bucket indexes."""
+    buckets = []
+    for word in _NON_WORD.split(str(text).lower()):
+        if not word:
+            continue
+        padded = f"#{word}#"
+        for size in _NGRAM_SIZES:
+            for start in range(len(padded) - size + 1):
+                buckets.append(zlib.crc32(padded[start:start + size].encode("utf-8")) % _HASH_DIM)
+    return buckets
+
+
+def _count_matrix(texts: List[str]) -> np.ndarray:
+    """Build the (texts x buckets) matrix of n-gram counts."""
+    counts = np.zeros((len(texts), _HASH_DIM), dtype=np.float32)
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        buckets = _ngram_buckets(text)
+        rows.extend([row] * len(buckets))
+        cols.extend(buckets)
+    if rows:
+        np.add.at(counts, (np.asarray(rows), np.asarray(cols)), 1.0)
+    return counts
+
+
+def _tfidf(counts: np.ndarray, idf: np.ndarray) -> np.ndarray:
+    """Weight counts with sublinear tf and idf, then L2-normalize each row."""
+    weighted = np.log1p(counts) * idf
+    norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+    return weighted / np.where(norms == 0, 1.0, norms)
+
+
+@dataclass
+class FieldRanking:
+    """Candidate source fields for one target field, and how the target field was resolved."""
+    target: str
+    # (source field name, score) pairs, best first
+    candidates: List[Tuple[str, float]] = field(default_factory=list)
+    tier: str = TIER_LLM
+    # Set when the field was resolved locally (tier exact or lexical)
+    source_field: Optional[str] = None
+    confidence: float = 0.0
+
+
+class FieldCandidateIndex:
+    """Character n-gram TF-IDF index over the fields of one source table.
+
+    Each source field is indexed twice: by its name alone, and by its name plus label. Target fields
+    are scored against both views in one matrix product. A target field whose normalized name equals
+    exactly one source field name is resolved in the exact tier; one whose best name similarity is high
+    and clearly ahead of the runner-up is resolved in the lexical tier; everything else is left to the
+    LLM together with its top-k candidates.
+
+    When column profiles are given, the type inferred from each source column's values is compared with
+    the declared type of the target field: agreement raises a candidate in the shortlist, a conflict
+    lowers it and keeps the field from being resolved in the lexical tier.
+    """
+
+    def __init__(self, source_fields: List[Dict[str, Any]], profiles: Optional[Dict[str, ColumnProfile]] = None):
+        self._names = [str(source_field['fieldName']) for source_field in source_fields]
+        self._inferred_types = [
+            profiles[name].inferred_type if profiles and name in profiles else None for name in self._names
+        ]
+        self._normalized: Dict[str, List[str]] = {}
+        for name in self._names:
+            self._normalized.setdefault(normalize_field_name(name), []).append(name)
+
+        name_counts = _count_matrix(self._names)
+        text_counts = _count_matrix([
+            f"{source_field['fieldName']} {source_field.get('fieldLabel') or ''}" for source_field in source_fields
+        ])
+        # Document frequencies over both views, smoothed so unseen buckets keep a finite weight
+        document_frequency = (name_counts > 0).sum(axis=0) + (text_counts > 0).sum(axis=0)
+        document_count = 2 * len(self._names)
+        self._idf = (np.log((1 + document_count) / (1 + document_frequency)) + 1).astype(np.float32)
+        self._name_vectors = _tfidf(name_counts, self._idf)
+        self._text_vectors = _tfidf(text_counts, self._idf)
+
+    def _type_compatibility(self, target_fields: List[Dict[str, Any]]) -> np.ndarray:
+        """Return the (targets x sources) matrix of type compatibility (1, 0 or -1)."""
+        compatibility = np.zeros((len(target_fields), len(self._names)), dtype=np.float32)
+        target_types = sorted({str(target.get('type') or '') for target in target_fields})
+        for target_type in target_types:
+            row = np.array(
+                [type_compatibility(target_type, inferred) if inferred else 0 for inferred in self._inferred_types],
+                dtype=np.float32,
+            )
+            mask = np.array([str(target.get('type') or '') == target_type for target in target_fields])
+            compatibility[mask] = row
+        return compatibility
+
+    def score(self, target_fields: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the (targets x sources) name similarity, combined shortlist score and type compatibility matrices."""
+        name_vectors = _tfidf(_count_matrix([str(target['name']) for target in target_fields]), self._idf)
+        text_vectors = _tfidf(_count_matrix([
+            f"{target['name']} {target.get('description') or ''}" for target in target_fields
+        ]), self._idf)
+        name_similarity = name_vectors @ self._name_vectors.T
+        combined = _NAME_WEIGHT * name_similarity + (1 - _NAME_WEIGHT) * (text_vectors @ self._text_vectors.T)
+        compatibility = self._type_compatibility(target_fields)
+        return name_similarity, combined + _TYPE_WEIGHT * compatibility, compatibility
+
+    def rank(
+        self, target_fields: List[Dict[str, Any]], top_k: int, accept_score: float, accept_margin: float
+    ) -> Dict[str, FieldRanking]:
+        """Rank the source fields for every target field and resolve the unambiguous ones.
+
+        Args:
+            target_fields: Target field definitions with "name" and optional "description".
+            top_k: Number of candidates kept for fields left to the LLM.
+            accept_score: Minimum name similarity to resolve a field in the lexical tier.
+            accept_margin: Minimum lead of the best name similarity over the second best.
+
+        Returns:
+            Dict of target field name -> FieldRanking.
+        """
+        if not target_fields:
+            return {}
+        if not self._names:
+            return {target['name']: FieldRanking(target=target['name']) for target in target_fields}
+
+        name_similarity, combined, compatibility = self.score(target_fields)
+        keep = min(max(1, top_k), len(self._names))
+        order = np.argsort(-combined, axis=1, kind="stable")[:, :keep]
+        # Best and second best name similarity per target field
+        if len(self._names) > 1:
+            best_two = -np.sort(-name_similarity, axis=1)[:, :2]
+        else:
+            best_two = np.column_stack([name_similarity[:, 0], np.zeros(len(target_fields))])
+        best_name = name_similarity.argmax(axis=1)
+
+        rankings = {}
+        for row, target in enumerate(target_fields):
+            ranking = FieldRanking(
+                target=target['name'],
+                candidates=[(self._names[column], float(combined[row, column])) for column in order[row]],
+            )
+            exact = self._normalized.get(normalize_field_name(target['name']), [])
+            if len(exact) == 1:
+                ranking.tier, ranking.source_field, ranking.confidence = TIER_EXACT, exact[0], 1.0
+            elif (
+                best_two[row, 0] >= accept_score
+                and best_two[row, 0] - best_two[row, 1] >= accept_margin
+                and compatibility[row, best_name[row]] >= 0
+            ):
+                ranking.tier = TIER_LEXICAL
+                ranking.source_field = self._names[best_name[row]]
+                ranking.confidence = float(best_two[row, 0])
+            rankings[target['name']] = ranking
+        return rankings
@@ -0,0 +1,43 @@
+# app/services/identifier_rules.py
+import re
+from typing import List
+
+# 受保护的标识符：同时包含字母和数字的代码 (S011, CT-100, D-14-D-1, AE2)，
+# 以及带小数点的版本号/数值 (2.0, 1.5.3)。这些内容在译文中必须原样保留。
+_IDENTIFIER_PATTERN = re.compile(
+    r"(?<![A-Za-z0-9])"
+    r"(?:"
+    r"(?=[A-Za-z0-9_-]*[A-Za-z])(?=[A-Za-z0-9_-]*\d)[A-Za-z0-9]+(?:[-_][A-Za-z0-9]+)*"
+    r"|\d+(?:\.\d+)+"
+    r")"
+    r"(?![A-Za-z0-9])"
+)
+
+
+def extract_identifiers(text: str) -> List[str]:
+    """提取文本中所有受保护的标识符，按出现顺序返回。"""
+    if not text:
+        return []
+    return _IDENTIFIER_PATTERN.findall(text)
+
+
+def preserves_identifiers(source: str, translation: str) -> bool:
+    """检查译文是否完整保留了原文中的所有受保护标识符 (包括出现次数)。"""
+    for identifier in set(extract_identifiers(source)):
+        if translation.count(identifier) < source.count(identifier):
+            return False
+    return True
+
+
+def is_valid_translation(source: str, translation) -> bool:
+    """
+    在本地校验单条译文是否可用：
+    - 必须是字符串；
+    - 原文非空时译文不能为空；
+    - 受保护的标识符必须原样保留。
+    """
+    if not isinstance(translation, str):
+        return False
+    if source.strip() and not translation.strip():
+        return False
+    return preserves_identifiers(source, translation)
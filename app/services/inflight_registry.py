@@ -0,0 +1,98 @@
+# app/services/inflight_registry.py
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+from ..clients.llm_client import LLMAPIError
+from .translation_cache import make_cache_key
+
+# 获取一个日志记录器实例
+logger = logging.getLogger(__name__)
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    """读取一次Future的异常，避免没有等待者时出现 'exception was never retrieved' 警告。"""
+    if not future.cancelled():
+        future.exception()
+
+
+class InflightAbandonedError(LLMAPIError):
+    """负责翻译条目的请求提前结束 (如被取消或客户端断开)，没有给出结果。等待方应自行重新登记并翻译。"""
+
+
+class InflightRegistry:
+    """
+    正在翻译中的条目登记表 (single-flight)。
+
+    以 `源语言:目标语言:原文` 为键，为每个正在发送给大模型的条目保存一个 Future。
+    后到的请求如果包含相同的条目，直接等待这个 Future，而不会把它放进新的分片重复翻译。
+
+    注意：登记表是进程内的，只能对同一个 worker 内的并发请求去重。
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def claim(
+        self, source_lang: str, target_lang: str, contents: Iterable[str]
+    ) -> Tuple[Dict[str, asyncio.Future], Dict[str, asyncio.Future]]:
+        """
+        为一组条目登记翻译任务。
+
+        Returns:
+            一个二元组：
+            - 由当前调用方负责翻译的 `原文 -> Future` 映射 (调用方结束时需交给 `release`)；
+            - 已经有其他请求在翻译的 `原文 -> Future` 映射，调用方只需等待。
+        """
+        owned: Dict[str, asyncio.Future] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        loop = asyncio.get_running_loop()
+        for content in contents:
+            key = make_cache_key(source_lang, target_lang, content)
+            future = self._pending.get(key)
+            if future is not None and not future.done():
+                waiting[content] = future
+            else:
+                future = loop.create_future()
+                future.add_done_callback(_consume_exception)
+                self._pending[key] = future
+                owned[content] = future
+        return owned, waiting
+
+    def resolve(self, source_lang: str, target_lang: str, translations: Dict[str, str]) -> None:
+        """将翻译结果交给所有等待这些条目的请求，并注销它们。"""
+        for content, translated_text in translations.items():
+            future = self._pending.pop(make_cache_key(source_lang, target_lang, content), None)
+            if future is not None and not future.done():
+                future.set_result(translated_text)
+
+    def fail(self, source_lang: str, target_lang: str, contents: Iterable[str], exc: BaseException) -> None:
+        """将异常传递给所有等待这些条目的请求，并注销它们。"""
+        for content in contents:
+            future = self._pending.pop(make_cache_key(source_lang, target_lang, content), None)
+            if future is not None and not future.done():
+                future.set_exception(exc)
+
+    def release(self, source_lang: str, target_lang: str, owned: Dict[str, asyncio.Future]) -> None:
+        """
+        注销调用方负责的条目。仍未得到结果的条目以 `InflightAbandonedError` 结束，
+        保证等待者不会因为负责方异常退出 (如请求被取消) 而永远挂起；等待者收到后自行接手翻译这些条目。
+        """
+        unresolved = 0
+        for content, future in owned.items():
+            if future.done():
+                continue
+            key = make_cache_key(source_lang, target_lang, content)
+            if self._pending.get(key) is future:
+                del self._pending[key]
+            future.set_exception(InflightAbandonedError("负责翻译该条目的请求未返回结果"))
+            unresolved += 1
+        if unresolved:
+            logger.warning(f"{unresolved} 个进行中的翻译条目未得到结果，已通知等待方接手。")
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+# 创建一个全局共享的进行中条目登记表
+inflight_registry = InflightRegistry()
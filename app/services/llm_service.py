@@ -3,157 +3,698 @@ import httpx
 import logging
 import time
 import asyncio
-from typing import List, Dict
-from cachetools import TTLCache
+import itertools
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 from ..config.settings import settings
 from ..schemas import TranslationItem
 from ..clients.llm_client import LLMClient, LLMAPIError
 from ..monitoring.llm_monitoring import record_llm_call
+from ..monitoring.translation_metrics import increment
+from .translation_cache import translation_cache
+from .inflight_registry import InflightAbandonedError, inflight_registry
+from .translation_batcher import TranslationBatcher
+from .chunk_planner import PlannedChunk, estimate_item_tokens, plan_chunks
+from .translation_bypass import classify_for_targets
+from .text_normalizer import group_by_canonical
+from .translation_memory import translation_memory
+from .model_router import model_router
 
 # 获取一个日志记录器实例
 logger = logging.getLogger(__name__)
 
-# 创建一个内存缓存
-translation_cache = TTLCache(maxsize=5000, ttl=600)
+# 部分成功模式下每个条目的处理状态
+ITEM_TRANSLATED = "translated"
+ITEM_CACHED = "cached"
+ITEM_MEMORY = "memory"
+ITEM_BYPASSED = "bypassed"
+ITEM_FAILED = "failed"
+
+# 微批处理批次分片的编号生成器 (仅用于日志)
+_batch_chunk_ids = itertools.count(1)
+
+def _fail_inflight(chunk: List[TranslationItem], exc: BaseException) -> None:
+    """将分片的失败通知给等待其中条目的其他请求。"""
+    for item in chunk:
+        inflight_registry.fail(item.source_lang, item.target_lang, [item.content], exc)
+
+def _memory_examples(chunk: List[TranslationItem]) -> Dict[str, str]:
+    """从翻译记忆中为分片查找相似的历史译文，作为少样本参考。"""
+    if not settings.translation_memory_enabled or not chunk:
+        return {}
+    return translation_memory.similar_examples(
+        chunk[0].source_lang,
+        chunk[0].target_lang,
+        [item.content for item in chunk],
+        settings.translation_memory_max_examples,
+    )
 
 async def _translate_chunk(
     llm_client: LLMClient,
     chunk: List[TranslationItem],
-    semaphore: asyncio.Semaphore,
-    chunk_id: int
+    chunk_id: int,
+    on_partial: Optional[Callable[[Dict[str, str]], None]] = None,
 ) -> Dict[str, str]:
     """
     (异步) 使用LLMClient翻译单个分片，并将结果逐项存入缓存。
-    使用Semaphore来限制并发。
+    并发由LLMClient内部的全局调度器控制。
+
+    译文一通过校验就写入缓存并唤醒等待方 (流式模式下逐项进行)，同时回调 `on_partial`。
     """
     logger.info(f"分片 {chunk_id}: 开始处理 (包含 {len(chunk)} 项)...")
-    async with semaphore:
-        if not chunk:
-            return {}
-
-        # 调用LLMClient执行翻译
-        # 使用我们新的监控上下文管理器来包裹LLM调用
-        with record_llm_call() as trace:
-            try:
-                translated_map = await llm_client.translate(chunk, chunk_id)
-                # 如果调用成功，手动标记trace为成功
-                trace.end(success=True)
-            except LLMAPIError as e:
-                # 如果发生特定的LLM API错误，记录错误信息并重新抛出
-                trace.end(success=False, error_message=str(e))
-                raise  # 确保异常继续向上传播
-            except Exception as e:
-                # 捕获任何其他意外错误
-                trace.end(success=False, error_message=f"An unexpected error occurred: {e}")
-                raise
+    if not chunk:
+        return {}
 
-        # --- 缓存逻辑 ---
-        # 将成功的结果逐项存入缓存，并根据每项的实际语言对生成缓存键
-        content_to_item_map = {item.content: item for item in chunk}
+    content_to_item_map = {item.content: item for item in chunk}
 
-        for original_text, translated_text in translated_map.items():
+    def store(translations: Dict[str, str]) -> None:
+        # --- 缓存逻辑 ---
+        # 按每项的实际语言对分组，然后批量写入缓存
+        entries_by_pair: Dict[tuple, Dict[str, str]] = defaultdict(dict)
+        for original_text, translated_text in translations.items():
             item = content_to_item_map.get(original_text)
             if item:
-                cache_key = f"{item.source_lang}:{item.target_lang}:{original_text}"
-                translation_cache[cache_key] = translated_text
+                entries_by_pair[(item.source_lang, item.target_lang)][original_text] = translated_text
             else:
                 # 这种情况理论上不应发生，因为返回的map的key应该来自于输入的chunk
                 logger.warning(
                     f"翻译结果中的原文 '{original_text}' 在原始分片数据中未找到，无法为其生成缓存。"
                 )
-        
-        return translated_map
 
-async def translate_list_to_map(
-    source_lang: str, target_lang: str, items: List[str], client: httpx.AsyncClient
+        for (source_lang, target_lang), entries in entries_by_pair.items():
+            translation_cache.set_many(source_lang, target_lang, entries)
+            if settings.translation_memory_enabled:
+                translation_memory.add_many(source_lang, target_lang, entries)
+            # 唤醒其他正在等待这些条目的请求
+            inflight_registry.resolve(source_lang, target_lang, entries)
+        if on_partial is not None:
+            on_partial(translations)
+
+    # 调用LLMClient执行翻译
+    # 使用我们新的监控上下文管理器来包裹LLM调用
+    with record_llm_call() as trace:
+        # 记录规划阶段预估的token数，并收集接口返回的实际token数，便于对比
+        trace.planned_tokens = sum(estimate_item_tokens(item.content) for item in chunk)
+        usage: Dict[str, int] = {}
+        examples = _memory_examples(chunk)
+        try:
+            # 经模型路由层按难度选择模型层级，失败的条目回退到更大的模型
+            translated_map = await model_router.translate(
+                llm_client, chunk, chunk_id, usage=usage, examples=examples, on_result=store
+            )
+            # 如果调用成功，手动标记trace为成功
+            trace.end(success=True)
+        except LLMAPIError as e:
+            # 如果发生特定的LLM API错误，记录错误信息并重新抛出
+            trace.end(success=False, error_message=str(e))
+            _fail_inflight(chunk, e)
+            raise  # 确保异常继续向上传播
+        except Exception as e:
+            # 捕获任何其他意外错误
+            trace.end(success=False, error_message=f"An unexpected error occurred: {e}")
+            _fail_inflight(chunk, e)
+            raise
+        finally:
+            trace.prompt_tokens = usage.get("prompt_tokens", 0)
+            trace.completion_tokens = usage.get("completion_tokens", 0)
+
+    logger.info(
+        f"分片 {chunk_id}: 预估 {trace.planned_tokens} tokens，"
+        f"实际 {trace.prompt_tokens} (输入) + {trace.completion_tokens} (输出) tokens。"
+    )
+
+    return translated_map
+
+async def _dispatch_batch(llm_client: LLMClient, items: List[TranslationItem]) -> Dict[str, str]:
+    """(异步) 将微批处理合并出的批次作为一个普通分片翻译。"""
+    return await _translate_chunk(llm_client, items, next(_batch_chunk_ids))
+
+# 创建一个全局共享的微批处理调度器
+translation_batcher = TranslationBatcher(
+    dispatch=_dispatch_batch,
+    max_items=settings.chunk_size,
+    max_tokens=settings.chunk_token_budget,
+    max_wait=settings.translation_batch_max_wait_ms / 1000,
+)
+
+def _expand_variants(
+    final_map: Dict[str, str], variants: Dict[str, List[str]], statuses: Optional[Dict[str, str]] = None
 ) -> Dict[str, str]:
     """
-    (异步) 将一个字符串列表翻译成一个map，并支持自动分片和并发处理。
-    如果任何分片处理失败，将抛出异常。
-    此函数会处理输入列表中的重复项，并优先从缓存中获取结果。
+    将按规范形式得到的译文映射回请求中的每一种原文写法。
+
+    传入 `statuses` 时，经本地快速通道原样返回的条目映射为每种原文写法本身，而不是规范形式。
     """
-    if not items:
-        return {}
+    return {
+        original: original if statuses and statuses.get(canonical) == ITEM_BYPASSED else final_map[canonical]
+        for canonical, originals in variants.items()
+        if canonical in final_map
+        for original in originals
+    }
+
+def _record_cache_hits(looked_up: List[str], cached: Dict[str, str], variants: Dict[str, List[str]]) -> None:
+    """
+    按原文写法统计规范化前后的缓存命中情况。
+
+    规范化前只有与规范形式完全相同的写法才可能命中，规范化后同一规范形式的所有写法都会命中。
+    """
+    raw_total = sum(len(variants[canonical]) for canonical in looked_up)
+    hits_after = sum(len(variants[canonical]) for canonical in cached)
+    hits_before = sum(1 for canonical in cached if canonical in variants[canonical])
+    increment("cache.lookups", raw_total)
+    increment("cache.hits_before_normalization", hits_before)
+    increment("cache.hits_after_normalization", hits_after)
+    if hits_after > hits_before:
+        logger.info(f"规范化额外带来了 {hits_after - hits_before} 次缓存命中。")
 
-    # --- 内部数据结构转换 & 去重 ---
-    # 将输入的字符串列表转换为内部使用的 TranslationItem 对象列表，同时去重
-    unique_items_map = {
-        content: TranslationItem(**{"from": source_lang, "to": target_lang, "content": content})
-        for content in items
+async def _labelled(
+    event_type: str, target_lang: str, chunk_id: Optional[int], coro: Awaitable[Dict[str, str]]
+) -> Tuple:
+    """(异步) 执行一个分片任务，返回 (事件类型, 目标语言, 分片编号, 结果或异常)，便于按完成顺序处理。"""
+    try:
+        return event_type, target_lang, chunk_id, await coro
+    except Exception as e:
+        return event_type, target_lang, chunk_id, e
+
+async def _await_inflight(
+    waiting: Dict[str, asyncio.Future],
+    take_over: Callable[[List[str]], Awaitable[Tuple[Dict[str, str], Dict[str, asyncio.Future]]]],
+) -> Dict[str, str]:
+    """
+    (异步) 等待由其他请求翻译的条目。
+
+    Future 由所有等待同一条目的请求共享，因此用 `asyncio.shield` 包裹：
+    当前请求被取消时只取消自己的等待，不会取消共享的 Future、连带其他请求失败。
+    负责方提前结束 (`InflightAbandonedError`) 的条目交给 `take_over` 重新登记，由当前请求自己翻译，
+    它返回 (自己翻译得到的译文, 仍由其他请求负责、需要继续等待的条目)。
+
+    Raises:
+        LLMAPIError: 有条目翻译失败，`translated_map` 中附带已经得到的译文。
+    """
+    translated_map: Dict[str, str] = {}
+    while waiting:
+        results = await asyncio.gather(
+            *(asyncio.shield(future) for future in waiting.values()), return_exceptions=True
+        )
+        abandoned: List[str] = []
+        error: Optional[BaseException] = None
+        for content, result in zip(waiting.keys(), results):
+            if isinstance(result, InflightAbandonedError):
+                abandoned.append(content)
+            elif isinstance(result, BaseException):
+                logger.error(f"等待其他请求翻译 '{content}' 时失败: {result}")
+                if error is None:
+                    error = LLMAPIError(f"条目 '{content}' 翻译失败: {result}")
+                    error.__cause__ = result
+            else:
+                translated_map[content] = result
+        if error is not None:
+            error.translated_map = translated_map
+            raise error
+        waiting = {}
+        if abandoned:
+            logger.info(f"{len(abandoned)} 个条目的负责请求已提前结束，由当前请求接手翻译。")
+            taken, waiting = await take_over(abandoned)
+            translated_map.update(taken)
+    return translated_map
+
+def _summary_event(
+    items: List[str],
+    variants: Dict[str, List[str]],
+    final_map: Dict[str, str],
+    local_count: int,
+    chunk_count: int,
+    start_time: float,
+    statuses: Optional[Dict[str, str]] = None,
+    error: Optional[BaseException] = None,
+) -> Dict[str, Any]:
+    """
+    构建流式翻译的汇总事件。
+
+    `failed_items` 为未得到译文的独立内容数，`complete` 表示是否所有内容都得到了译文。
+    传入 `statuses` (部分成功模式) 时，额外附带每个原始写法的处理状态和第一个错误。
+    """
+    failed_count = len(variants) - len(final_map)
+    summary: Dict[str, Any] = {
+        "type": "summary",
+        "total_items": len(items),
+        "unique_items": len(variants),
+        "translated_items": len(final_map),
+        "failed_items": failed_count,
+        "complete": failed_count == 0,
+        "local_items": local_count,
+        "chunks": chunk_count,
+        "duration": round(time.time() - start_time, 3),
     }
-    unique_items = list(unique_items_map.values())
+    if statuses is not None:
+        summary["item_status"] = {
+            original: statuses.get(content, ITEM_FAILED)
+            for content, originals in variants.items()
+            for original in originals
+        }
+        if error is not None:
+            summary["error"] = str(error)
+    return summary
+
+@dataclass
+class _TargetState:
+    """多目标语言翻译中单个目标语言的处理状态。"""
+    target_lang: str
+    # 规范形式 -> 译文
+    final_map: Dict[str, str] = field(default_factory=dict)
+    # 规范形式 -> 处理状态
+    statuses: Dict[str, str] = field(default_factory=dict)
+    local_count: int = 0
+    owned: Dict[str, asyncio.Future] = field(default_factory=dict)
+    waiting: Dict[str, asyncio.Future] = field(default_factory=dict)
+    task_count: int = 0
+    successful_chunks: int = 0
+    first_error: Optional[Tuple[Optional[int], BaseException]] = None
+
+async def _iter_pipeline_events(
+    source_lang: str,
+    target_langs: List[str],
+    items: List[str],
+    client: httpx.AsyncClient,
+    pipeline: str,
+    allow_partial: bool,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    (异步生成器) 将一个字符串列表翻译成一个或多个目标语言，事件格式见 `iter_translation_events`，
+    每个事件额外带有 `target_lang`。
+
+    规范化、去重和与目标语言无关的本地快速通道规则只执行一次，
+    所有目标语言的缓存在一轮查询中完成，所有目标语言的分片合并为一个计划按预估token数从大到小派发。
+    每个目标语言各有一个 `summary` 事件，在所有结果产出后依次产出。
+    """
+    start_time = time.time()
+
+    # --- 规范化 & 去重 ---
+    # 全角/半角、多余空白等不同写法先归并到同一个规范形式，只翻译规范形式，最后再映射回每种写法
+    variants = group_by_canonical(items)
+    raw_unique_count = sum(len(originals) for originals in variants.values())
+    contents = list(variants)
     
-    logger.info(f"收到了 {len(items)} 个翻译请求，其中包含 {len(unique_items)} 个独立内容。")
+    logger.info(
+        f"收到了 {len(items)} 个翻译请求 (目标语言: {', '.join(target_langs)})，其中包含 {raw_unique_count} 种不同写法，"
+        f"规范化后为 {len(contents)} 个独立内容。"
+    )
+
+    states = {target_lang: _TargetState(target_lang) for target_lang in target_langs}
+    for _ in target_langs:
+        increment("items_total", len(contents))
+        increment("normalization.raw_unique", raw_unique_count)
+        increment("normalization.canonical_unique", len(contents))
+
+    # --- 本地快速通道 ---
+    # 空值、纯数字、标识符、版本号以及已经是目标语言的条目直接原样返回，无需调用大模型
+    for content in contents:
+        for target_lang, rule in classify_for_targets(content, source_lang, target_langs).items():
+            if rule is not None:
+                states[target_lang].final_map[content] = content
+                states[target_lang].statuses[content] = ITEM_BYPASSED
+                increment(f"bypass.{rule}")
+    for state in states.values():
+        bypassed_count = len(state.final_map)
+        if bypassed_count > 0:
+            increment("bypass_total", bypassed_count)
+            logger.info(f"本地快速通道 ({state.target_lang}): {bypassed_count} / {len(contents)} 项无需翻译。")
 
     # --- 缓存查找逻辑 ---
-    final_map = {}
-    items_to_translate = []
-    for item in unique_items:
-        cache_key = f"{item.source_lang}:{item.target_lang}:{item.content}"
-        cached_result = translation_cache.get(cache_key)
-        if cached_result:
-            final_map[item.content] = cached_result
-        else:
-            items_to_translate.append(item)
-    
-    cached_count = len(final_map)
-    if cached_count > 0:
-        logger.info(f"缓存命中: {cached_count} / {len(unique_items)} 项。")
+    # 一次批量查询所有目标语言的整个列表，而不是逐项、逐语言查询
+    looked_up = {
+        target_lang: [content for content in contents if content not in state.final_map]
+        for target_lang, state in states.items()
+    }
+    cached_by_target = await translation_cache.aget_many_targets(source_lang, looked_up)
+    for target_lang, state in states.items():
+        cached = cached_by_target.get(target_lang, {})
+        state.final_map.update(cached)
+        state.statuses.update(dict.fromkeys(cached, ITEM_CACHED))
+        _record_cache_hits(looked_up[target_lang], cached, variants)
+        if cached:
+            logger.info(f"缓存命中 ({target_lang}): {len(cached)} / {len(contents)} 项。")
 
-    # 如果所有内容都在缓存中，则直接返回
-    if not items_to_translate:
-        logger.info("所有翻译结果均从缓存中获取。")
-        return final_map
+        # --- 翻译记忆: 模板复用 ---
+        # 与历史条目仅标识符或数字不同的条目 (如不同的访视编号)，直接替换历史译文中的标识符
+        if settings.translation_memory_enabled:
+            translation_memory.add_many(source_lang, target_lang, cached)
+            reused = translation_memory.reuse_templates(
+                source_lang, target_lang, [content for content in contents if content not in state.final_map]
+            )
+            if reused:
+                state.final_map.update(reused)
+                state.statuses.update(dict.fromkeys(reused, ITEM_MEMORY))
+                translation_cache.set_many(source_lang, target_lang, reused)
+                increment("memory.template_hits", len(reused))
+                logger.info(f"翻译记忆 ({target_lang}): {len(reused)} 项通过模板替换直接复用历史译文。")
 
-    logger.info(f"需要通过API翻译 {len(items_to_translate)} 项。")
-    
-    # --- 分片和并发翻译 ---
-    chunk_size = settings.chunk_size
-    chunks = [items_to_translate[i:i + chunk_size] for i in range(0, len(items_to_translate), chunk_size)]
+        state.local_count = len(state.final_map)
+        if state.final_map:
+            yield {
+                "type": "local",
+                "target_lang": target_lang,
+                "translated_map": _expand_variants(state.final_map, variants, state.statuses),
+            }
 
-    semaphore = asyncio.Semaphore(settings.max_concurrency)
-    
-    # 实例化我们新的LLMClient
-    llm_client = LLMClient(client)
+    # 如果所有内容都已在本地得到结果，则直接结束
+    if all(state.local_count == len(contents) for state in states.values()):
+        logger.info("所有翻译结果均从本地快速通道、缓存或翻译记忆中获取。")
+        for state in states.values():
+            yield _target_summary(items, variants, state, start_time, allow_partial)
+        return
 
-    start_time = time.time()
+    tasks: List[asyncio.Task] = []
+    try:
+        # --- 进行中去重 (single-flight) ---
+        # 已经有其他请求在翻译的条目只需等待其结果，不再放入新的分片
+        planned: List[Tuple[str, PlannedChunk]] = []
+        for target_lang, state in states.items():
+            state.owned, state.waiting = inflight_registry.claim(
+                source_lang, target_lang, [content for content in contents if content not in state.final_map]
+            )
+            if state.waiting:
+                logger.info(f"进行中去重 ({target_lang}): {len(state.waiting)} 项正由其他请求翻译，将等待其结果。")
+            items_to_translate = [
+                TranslationItem(**{"from": source_lang, "to": target_lang, "content": content})
+                for content in state.owned
+            ]
+            logger.info(f"需要通过API翻译 {len(items_to_translate)} 项 ({target_lang})。")
+
+            # --- 分片 ---
+            # 先按模型层级划分条目，再按token预算打包分片。分片只能包含同一个语言对、同一个层级的条目
+            for _, tier_items in model_router.partition(items_to_translate):
+                planned.extend(
+                    (target_lang, chunk)
+                    for chunk in plan_chunks(tier_items, settings.chunk_token_budget, settings.chunk_size)
+                )
+
+        # 所有目标语言的分片合并为一个计划，按预估token数从大到小排列，最重的分片最先派发
+        planned.sort(key=lambda entry: entry[1].estimated_tokens, reverse=True)
+        if planned:
+            logger.info(
+                f"分片规划: {len(planned)} 个分片，预估token数 "
+                f"{[chunk.estimated_tokens for _, chunk in planned]}"
+            )
+
+        # 实例化我们新的LLMClient，每个请求作为调度器中的一个独立调用方公平排队
+        llm_client = LLMClient(client, pipeline=pipeline)
+
+        # 每个目标语言中最轻且明显未装满的分片交给微批处理调度器，与其他并发请求的条目合并后再发送
+        batched_tails: Dict[str, PlannedChunk] = {}
+        if settings.translation_batch_enabled:
+            for target_lang, chunk in reversed(planned):
+                if target_lang in batched_tails:
+                    continue
+                if (
+                    len(chunk.items) < settings.chunk_size
+                    and chunk.estimated_tokens < settings.chunk_token_budget / 2
+                ):
+                    batched_tails[target_lang] = chunk
+                else:
+                    # 该目标语言最轻的分片已经足够大，不再参与微批处理
+                    batched_tails[target_lang] = None
+        batched_tails = {target_lang: chunk for target_lang, chunk in batched_tails.items() if chunk is not None}
 
-    tasks = [
-        _translate_chunk(llm_client, chunk, semaphore, i + 1) for i, chunk in enumerate(chunks)
-    ]
-
-    # 使用 asyncio.gather 并行执行所有分片的翻译任务
-    # return_exceptions=True 使得gather会等待所有任务完成，即使其中一些任务抛出异常
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    successful_chunks = 0
-    for i, result in enumerate(results):
-        if isinstance(result, BaseException):
-            # 如果任务返回的是一个异常，记录错误并重新抛出，中断整个流程
-            # 这里我们选择立即失败的策略。也可以修改为收集错误，继续处理。
-            logger.error(f"处理分片 {i + 1} 时发生致命错误: {result}")
-            # 将底层的LLMAPIError包装或直接抛出
-            if isinstance(result, LLMAPIError):
-                raise ConnectionError(f"分片 {i + 1} 翻译失败: {result}") from result
+        # 分片完成和流式模式下逐项到达的译文都放入同一个队列，按到达顺序处理
+        updates: asyncio.Queue = asyncio.Queue()
+        # 分片编号 -> 已经通过 `partial` 事件产出的条目
+        streamed: Dict[int, set] = defaultdict(set)
+
+        def partial_sink(target_lang: str, chunk_id: int) -> Callable[[Dict[str, str]], None]:
+            return lambda translations: updates.put_nowait(("partial", target_lang, chunk_id, translations))
+
+        for chunk_id, (target_lang, chunk) in enumerate(planned, start=1):
+            if batched_tails.get(target_lang) is chunk:
+                coro = translation_batcher.submit(llm_client, chunk.items, chunk_id)
             else:
-                raise result # 抛出其他意外异常
-        else:
-            # 如果任务成功，更新最终的结果map
-            final_map.update(result)
-            successful_chunks += 1
+                on_partial = partial_sink(target_lang, chunk_id) if llm_client.streaming else None
+                coro = _translate_chunk(llm_client, chunk.items, chunk_id, on_partial)
+            tasks.append(asyncio.create_task(_labelled("chunk", target_lang, chunk_id, coro)))
+            states[target_lang].task_count += 1
+        takeover_chunk_ids = itertools.count(len(planned) + 1)
+
+        def take_over(target_lang: str):
+            async def translate_abandoned(contents: List[str]) -> Tuple[Dict[str, str], Dict[str, asyncio.Future]]:
+                # 重新登记负责方提前结束的条目；仍被其他请求登记的条目继续等待
+                owned, waiting = inflight_registry.claim(source_lang, target_lang, contents)
+                states[target_lang].owned.update(owned)
+                items_to_translate = [
+                    TranslationItem(**{"from": source_lang, "to": target_lang, "content": content})
+                    for content in owned
+                ]
+                translated: Dict[str, str] = {}
+                for chunk in plan_chunks(items_to_translate, settings.chunk_token_budget, settings.chunk_size):
+                    translated.update(await _translate_chunk(llm_client, chunk.items, next(takeover_chunk_ids)))
+                return translated, waiting
+            return translate_abandoned
+
+        for target_lang, state in states.items():
+            if state.waiting:
+                tasks.append(asyncio.create_task(
+                    _labelled("inflight", target_lang, None, _await_inflight(state.waiting, take_over(target_lang)))
+                ))
+                state.task_count += 1
+        for task in tasks:
+            task.add_done_callback(lambda task: updates.put_nowait(("done", task)))
+
+        # 按完成顺序产出每个分片的结果。某个分片失败时继续等待其余分片，
+        # 让它们的结果照常产出并写入缓存，最后再抛出第一个错误。
+        remaining = len(tasks)
+        while remaining:
+            update = await updates.get()
+            if update[0] == "partial":
+                _, target_lang, chunk_id, result = update
+                state = states[target_lang]
+                state.final_map.update(result)
+                state.statuses.update(dict.fromkeys(result, ITEM_TRANSLATED))
+                streamed[chunk_id].update(result)
+                yield {
+                    "type": "partial",
+                    "target_lang": target_lang,
+                    "chunk_id": chunk_id,
+                    "translated_map": _expand_variants(result, variants),
+                }
+                continue
 
-    end_time = time.time()
-    total_duration = end_time - start_time
-    logger.info(f"所有 {successful_chunks} 个分片处理成功。总耗时: {total_duration:.2f} 秒。")
+            remaining -= 1
+            event_type, target_lang, chunk_id, result = update[1].result()
+            state = states[target_lang]
+            if isinstance(result, BaseException):
+                if event_type == "chunk":
+                    logger.error(f"处理分片 {chunk_id} ({target_lang}) 时发生致命错误: {result}")
+                if state.first_error is None:
+                    state.first_error = (chunk_id, result)
+                # 出错之前已经通过校验 (并写入缓存) 的条目照常产出，只有真正缺失的条目记为失败
+                result = getattr(result, "translated_map", None)
+                if not result:
+                    continue
+            elif event_type == "chunk":
+                state.successful_chunks += 1
+            state.final_map.update(result)
+            state.statuses.update(dict.fromkeys(result, ITEM_TRANSLATED))
+            if event_type == "chunk":
+                # 已经通过 `partial` 事件产出的条目不再重复产出
+                result = {content: value for content, value in result.items() if content not in streamed[chunk_id]}
+            event: Dict[str, Any] = {"type": event_type, "target_lang": target_lang}
+            if chunk_id is not None:
+                event["chunk_id"] = chunk_id
+            event["translated_map"] = _expand_variants(result, variants)
+            yield event
+    finally:
+        # 请求提前结束 (如客户端断开) 时取消尚未完成的分片
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        # 无论成功与否，都注销本请求负责的条目，避免等待方挂起
+        for target_lang, state in states.items():
+            inflight_registry.release(source_lang, target_lang, state.owned)
 
+    # 默认模式下直接抛出第一个错误；部分成功模式下作为状态报告在汇总事件中
+    if not allow_partial:
+        for state in states.values():
+            if state.first_error is not None:
+                raise _wrap_error(*state.first_error)
+
+    total_duration = time.time() - start_time
+    logger.info(
+        f"{sum(state.successful_chunks for state in states.values())} / {len(tasks)} 个分片处理成功。"
+        f"总耗时: {total_duration:.2f} 秒。"
+    )
+    for state in states.values():
+        yield _target_summary(items, variants, state, start_time, allow_partial)
+
+def _wrap_error(chunk_id: Optional[int], error: BaseException) -> BaseException:
+    """将底层的LLMAPIError包装为ConnectionError，其他异常原样返回。"""
+    if isinstance(error, LLMAPIError):
+        # 等待其他请求的条目没有分片编号，错误信息中已经指明了条目
+        wrapped = ConnectionError(f"分片 {chunk_id} 翻译失败: {error}" if chunk_id is not None else str(error))
+        wrapped.__cause__ = error
+        return wrapped
+    return error
+
+def _target_summary(
+    items: List[str],
+    variants: Dict[str, List[str]],
+    state: _TargetState,
+    start_time: float,
+    allow_partial: bool,
+) -> Dict[str, Any]:
+    """构建单个目标语言的汇总事件，并执行数量一致性检查。"""
     # --- 数量一致性检查 ---
-    # 检查翻译后的结果数量是否与去重后的输入数量一致
-    if len(final_map) != len(unique_items):
+    # 检查翻译后的结果数量是否与去重后的输入数量一致。不一致时作为状态报告在汇总事件中
+    if len(state.final_map) != len(variants):
+        failed_count = len(variants) - len(state.final_map)
+        increment("items_failed", failed_count)
         logger.error(
-            f"翻译结果数量 ({len(final_map)}) 与唯一的输入项数量 ({len(unique_items)}) 不匹配。"
-            "翻译过程中可能丢失了项目。"
+            f"翻译结果数量 ({len(state.final_map)}) 与唯一的输入项数量 ({len(variants)}) 不匹配 "
+            f"({state.target_lang})，{failed_count} 项未得到译文。"
         )
-        # 抛出异常以表示这是一个严重错误
-        raise ValueError("翻译结果与输入不一致，处理中断。")
+    error = _wrap_error(*state.first_error) if state.first_error is not None else None
+    summary = _summary_event(
+        items, variants, state.final_map, state.local_count, state.task_count, start_time,
+        state.statuses if allow_partial else None, error,
+    )
+    summary["target_lang"] = state.target_lang
+    return summary
+
+async def iter_translation_events(
+    source_lang: str,
+    target_lang: str,
+    items: List[str],
+    client: httpx.AsyncClient,
+    pipeline: str = "translate",
+    allow_partial: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    (异步生成器) 翻译一个字符串列表，并在结果可用时逐批产出事件。
+
+    `pipeline` 为大模型调用所属的调度流水线，交互式请求使用默认的 `translate`，
+    后台的批量翻译任务使用优先级更低的流水线。
+
+    事件类型:
+    - `local`: 本地快速通道、缓存和翻译记忆得到的结果，最先产出；
+    - `partial`: 流式模式 (`llm_stream_enabled`) 下，分片中的条目一通过校验就产出 (`chunk_id` 为所属分片)；
+    - `chunk`: 某个分片完成时产出该分片的结果 (`chunk_id` 为分片编号)，已经在 `partial` 中产出的条目不再重复；
+    - `inflight`: 由其他并发请求翻译的条目完成时产出；
+    - `summary`: 所有结果产出后的汇总信息，总是最后一个事件。
+
+    每个结果事件的 `translated_map` 的键为请求中的原始写法。
+    如果任何分片处理失败，会先产出其余分片的结果，然后抛出异常。
+    `allow_partial` 为True (部分成功模式) 时不抛出异常，而是在 `summary` 中报告失败的条目
+    以及每个条目的状态 (translated / cached / memory / bypassed / failed)，调用方只需重试失败的条目。
+    """
+    if not items:
+        return
+
+    async for event in _iter_pipeline_events(
+        source_lang, [target_lang], items, client, pipeline, allow_partial
+    ):
+        event.pop("target_lang")
+        yield event
+
+async def iter_multi_translation_events(
+    source_lang: str,
+    target_langs: List[str],
+    items: List[str],
+    client: httpx.AsyncClient,
+    pipeline: str = "translate",
+    allow_partial: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    (异步生成器) 将一个字符串列表同时翻译成多个目标语言。
+
+    与对每个目标语言分别调用 `iter_translation_events` 的结果相同，但规范化、去重、
+    缓存查询和分片规划只执行一轮。每个事件带有 `target_lang`，每个目标语言各有一个 `summary` 事件。
+    """
+    target_langs = list(dict.fromkeys(target_langs))
+    if not items or not target_langs:
+        return
+
+    async for event in _iter_pipeline_events(
+        source_lang, target_langs, items, client, pipeline, allow_partial
+    ):
+        yield event
+
+async def translate_list_to_map(
+    source_lang: str, target_lang: str, items: List[str], client: httpx.AsyncClient
+) -> Dict[str, str]:
+    """
+    (异步) 将一个字符串列表翻译成一个map，并支持自动分片和并发处理。
+    如果任何分片处理失败，或结果与输入不一致，将抛出异常。
+    此函数会处理输入列表中的重复项，并优先从缓存中获取结果。
+    """
+    final_map: Dict[str, str] = {}
+    async for event in iter_translation_events(source_lang, target_lang, items, client):
+        if event["type"] == "summary" and not event["complete"]:
+            raise ValueError("翻译结果与输入不一致，处理中断。")
+        final_map.update(event.get("translated_map", {}))
+    return final_map
+
+async def translate_list_partial(
+    source_lang: str, target_lang: str, items: List[str], client: httpx.AsyncClient
+) -> Dict[str, Any]:
+    """
+    (异步) 以部分成功模式翻译一个字符串列表。
+
+    部分分片失败时不会丢弃已成功的结果，而是返回已得到的译文以及每个条目的处理状态。
+
+    Returns:
+        包含 `translated_map`、`item_status`、`failed_items` (失败的原始写法列表)
+        和 `complete` 的字典。
+    """
+    final_map: Dict[str, str] = {}
+    summary: Dict[str, Any] = {}
+    async for event in iter_translation_events(source_lang, target_lang, items, client, allow_partial=True):
+        if event["type"] == "summary":
+            summary = event
+        else:
+            final_map.update(event["translated_map"])
+    item_status = summary.get("item_status", {})
+    return {
+        "translated_map": final_map,
+        "item_status": item_status,
+        "failed_items": [item for item, status in item_status.items() if status == ITEM_FAILED],
+        "complete": summary.get("complete", True),
+    }
+
+async def translate_list_multi(
+    source_lang: str,
+    target_langs: List[str],
+    items: List[str],
+    client: httpx.AsyncClient,
+    allow_partial: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    (异步) 将一个字符串列表同时翻译成多个目标语言。
+
+    Returns:
+        目标语言 -> 结果。默认模式下结果只包含 `translated_map`，任何条目失败都会抛出异常；
+        部分成功模式下结果与 `translate_list_partial` 的返回值相同。
+    """
+    final_maps: Dict[str, Dict[str, str]] = defaultdict(dict)
+    summaries: Dict[str, Dict[str, Any]] = {}
+    async for event in iter_multi_translation_events(
+        source_lang, target_langs, items, client, allow_partial=allow_partial
+    ):
+        target_lang = event["target_lang"]
+        if event["type"] == "summary":
+            if not allow_partial and not event["complete"]:
+                raise ValueError(f"翻译结果与输入不一致 ({target_lang})，处理中断。")
+            summaries[target_lang] = event
+        else:
+            final_maps[target_lang].update(event["translated_map"])
 
-    return final_map
\ No newline at end of file
+    results: Dict[str, Dict[str, Any]] = {}
+    for target_lang, summary in summaries.items():
+        result: Dict[str, Any] = {"translated_map": final_maps[target_lang]}
+        if allow_partial:
+            item_status = summary.get("item_status", {})
+            result.update({
+                "item_status": item_status,
+                "failed_items": [item for item, status in item_status.items() if status == ITEM_FAILED],
+                "complete": summary["complete"],
+            })
+        results[target_lang] = result
+    return results
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement, so lookups are split into batches
+_SQLITE_BATCH_SIZE = 500
+
+# Kinds of decisions stored in the memo
+KIND_TABLE = "table"
+KIND_FIELD = "field"
+
+
+def _digest(value: Any) -> str:
+    """Stable SHA-256 hex digest of a JSON-serializable value."""
+    canonical = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def source_table_signature(source_table: Dict[str, Any]) -> str:
+    """Signature of a source table's name and field definitions; detail rows are not part of it."""
+    fields = sorted(source_table['fields'], key=lambda field: str(field.get('fieldName')))
+    return _digest({"tableName": source_table['tableName'], "fields": fields})
+
+
+def table_decision_key(target_table: Dict[str, Any], source_signatures: Iterable[str]) -> str:
+    """Key of a table decision: the target table definition against the set of candidate source tables."""
+    return _digest({"target": target_table, "sources": sorted(source_signatures)})
+
+
+def field_decision_key(target_field: Dict[str, Any], source_signature: str) -> str:
+    """Key of a field decision: the target field definition against one source table."""
+    return _digest({"target": target_field, "source": source_signature})
+
+
+class SchemaMappingMemo:
+    """Durable memo of schema mapping decisions, stored in SQLite (WAL mode).
+
+    Decisions are keyed by label version and by a hash of the definitions they were derived from, so a
+    repeated request returns the stored table and field decisions, while any change to a target
+    definition or to a source table's fields produces new keys and is mapped again. All decisions of a
+    label version can be dropped with `invalidate`.
+    """
+
+    def __init__(self, db_path: str):
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Open the database lazily. Returns None when it cannot be opened, which disables the memo."""
+        if self._conn is not None:
+            return self._conn
+        try:
+            directory = os.path.dirname(self._db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self._db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS mapping_decisions (
+                    version_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    decision_key TEXT NOT NULL,
+                    decision TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (version_id, kind, decision_key)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.commit()
+            self._conn = conn
+            logger.info(f"Schema mapping memo opened: {self._db_path}")
+        except sqlite3.Error as e:
+            logger.error(f"Cannot open schema mapping memo {self._db_path}, mapping without it: {e}")
+        return self._conn
+
+    def get_many(self, version_id: str, kind: str, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the stored decisions for the given keys; keys without a decision are omitted."""
+        keys: List[str] = list(dict.fromkeys(keys))
+        found: Dict[str, Dict[str, Any]] = {}
+        if not keys:
+            return found
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return found
+            try:
+                for i in range(0, len(keys), _SQLITE_BATCH_SIZE):
+                    batch = keys[i:i + _SQLITE_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = conn.execute(
+                        f"SELECT decision_key, decision FROM mapping_decisions "
+                        f"WHERE version_id = ? AND kind = ? AND decision_key IN ({placeholders})",
+                        (version_id, kind, *batch),
+                    ).fetchall()
+                    for decision_key, decision in rows:
+                        found[decision_key] = json.loads(decision)
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning(f"Reading the schema mapping memo failed, mapping without it: {e}")
+        return found
+
+    def set_many(self, version_id: str, kind: str, decisions: Dict[str, Dict[str, Any]]) -> None:
+        """Store decisions by key. Write failures are only logged and do not affect the mapping result."""
+        if not decisions:
+            return
+        now = time.time()
+        rows = [
+            (version_id, kind, key, json.dumps(decision, ensure_ascii=False), now)
+            for key, decision in decisions.items()
+        ]
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO mapping_decisions "
+                    "(version_id, kind, decision_key, decision, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Writing the schema mapping memo failed: {e}")
+
+    def invalidate(self, version_id: str) -> int:
+        """Drop every stored decision of a label version. Returns the number of decisions deleted."""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return 0
+            try:
+                cursor = conn.execute("DELETE FROM mapping_decisions WHERE version_id = ?", (version_id,))
+                conn.commit()
+                return cursor.rowcount
+            except sqlite3.Error as e:
+                logger.warning(f"Invalidating the schema mapping memo for version {version_id} failed: {e}")
+                return 0
+
+    def size(self) -> int:
+        """Return the number of stored decisions."""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return 0
+            try:
+                return conn.execute("SELECT COUNT(*) FROM mapping_decisions").fetchone()[0]
+            except sqlite3.Error:
+                return 0
+
+
+# Shared memo instance
+schema_mapping_memo = SchemaMappingMemo(db_path=settings.data_labeling_memo_path)
@@ -0,0 +1,201 @@
+# app/services/model_router.py
+import logging
+import math
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..clients.llm_client import LLMAPIError, LLMClient
+from ..clients.model_tiers import ModelTier, load_model_tiers
+from ..monitoring.translation_metrics import increment
+from ..schemas import TranslationItem
+from .chunk_planner import estimate_tokens
+from .translation_bypass import detect_scripts
+
+# 获取一个日志记录器实例
+logger = logging.getLogger(__name__)
+
+# 达到该token数的文本视为长文本 (如多句的不良事件描述)，长度得分为1
+_LONG_TEXT_TOKENS = 48
+# 术语: 大写缩写 (AE、ALT、MedDRA)、带单位的剂量/检验值
+_TERM_PATTERN = re.compile(
+    r"\b[A-Z][A-Za-z]*[A-Z][A-Za-z0-9]*\b"
+    r"|\d+(?:\.\d+)?\s*(?:mg|g|kg|ml|mL|L|mmol|μmol|umol|IU|U|mmHg|bpm|%)(?![A-Za-z])"
+)
+# 各项特征在难度中的权重
+_LENGTH_WEIGHT = 0.6
+_SCRIPT_MIX_WEIGHT = 0.15
+_TERM_WEIGHT = 0.25
+
+
+def score_difficulty(text: str) -> float:
+    """
+    估算一个条目的翻译难度，范围为 [0, 1]。
+
+    综合考虑三个特征：
+    - 长度：越长的文本越需要更强的模型保持语义完整；
+    - 文字混排：同时包含多种文字 (如中文夹杂英文缩写) 更容易被小模型误译；
+    - 术语密度：缩写、剂量和检验值越密集，越需要专业的模型。
+    """
+    tokens = estimate_tokens(text)
+    if tokens == 0:
+        return 0.0
+    length_score = min(1.0, tokens / _LONG_TEXT_TOKENS)
+    script_mix_score = 1.0 if len(detect_scripts(text)) >= 2 else 0.0
+    term_score = min(1.0, 4 * len(_TERM_PATTERN.findall(text)) / tokens)
+    return (
+        _LENGTH_WEIGHT * length_score
+        + _SCRIPT_MIX_WEIGHT * script_mix_score
+        + _TERM_WEIGHT * term_score
+    )
+
+
+@dataclass
+class _TierStats:
+    """单个模型层级的累计统计。"""
+    calls: int = 0
+    failed_calls: int = 0
+    items_requested: int = 0
+    items_translated: int = 0
+    # 未能在该层级完成、回退到更大模型的条目数
+    items_escalated: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    busy_seconds: float = 0.0
+
+
+class ModelRouter:
+    """
+    位于 LLMClient 之前的模型路由层。
+
+    每个条目按 `score_difficulty` 估算难度，分配到能处理该难度的最小层级；分片规划前先按层级划分条目，
+    因此一个分片中的条目属于同一层级。小模型只尝试一次，未通过校验或调用失败的条目依次回退到更大的层级，
+    最后一个层级 (默认模型) 按完整的重试策略处理。
+    """
+
+    def __init__(self, tiers: List[ModelTier]):
+        self._tiers = tiers
+        self._stats: Dict[str, _TierStats] = {tier.name: _TierStats() for tier in tiers}
+
+    @property
+    def tiers(self) -> List[ModelTier]:
+        return self._tiers
+
+    def _tier_index(self, text: str) -> int:
+        difficulty = score_difficulty(text)
+        for index, tier in enumerate(self._tiers):
+            if difficulty <= tier.max_difficulty:
+                return index
+        return len(self._tiers) - 1
+
+    def tier_for(self, text: str) -> ModelTier:
+        """返回一个条目应使用的模型层级。"""
+        return self._tiers[self._tier_index(text)]
+
+    def partition(self, items: List[TranslationItem]) -> List[Tuple[ModelTier, List[TranslationItem]]]:
+        """按模型层级划分条目，返回 (层级, 条目列表)，层级从小到大排列，空的层级不返回。"""
+        groups: Dict[int, List[TranslationItem]] = {}
+        for item in items:
+            groups.setdefault(self._tier_index(item.content), []).append(item)
+        return [(self._tiers[index], groups[index]) for index in sorted(groups)]
+
+    async def translate(
+        self,
+        llm_client: LLMClient,
+        chunk: List[TranslationItem],
+        chunk_id: int,
+        usage: Optional[Dict[str, int]] = None,
+        examples: Optional[Dict[str, str]] = None,
+        on_result: Optional[Callable[[Dict[str, str]], None]] = None,
+    ) -> Dict[str, str]:
+        """
+        (异步) 将一个分片发送到其中最难条目对应的层级，失败的条目依次回退到更大的层级。
+
+        参数和返回值与 `LLMClient.translate` 相同。
+
+        Raises:
+            LLMAPIError: 最后一个层级仍然失败。
+        """
+        if not chunk:
+            return {}
+
+        translated: Dict[str, str] = {}
+
+        def collect(translations: Dict[str, str]) -> None:
+            translated.update(translations)
+            if on_result is not None:
+                on_result(translations)
+
+        index = max(self._tier_index(item.content) for item in chunk)
+        pending = chunk
+        while True:
+            tier = self._tiers[index]
+            is_last_tier = index == len(self._tiers) - 1
+            stats = self._stats[tier.name]
+            tier_usage: Dict[str, int] = {}
+            translated_before = len(translated)
+            start_time = time.time()
+            error: Optional[LLMAPIError] = None
+            try:
+                await llm_client.translate(
+                    pending, chunk_id, usage=tier_usage, examples=examples, on_result=collect,
+                    tier=tier, max_attempts=None if is_last_tier else 1,
+                )
+            except LLMAPIError as e:
+                error = e
+            finally:
+                stats.calls += 1
+                stats.items_requested += len(pending)
+                stats.items_translated += len(translated) - translated_before
+                stats.busy_seconds += time.time() - start_time
+                stats.prompt_tokens += tier_usage.get("prompt_tokens", 0)
+                stats.completion_tokens += tier_usage.get("completion_tokens", 0)
+                if usage is not None:
+                    for key, value in tier_usage.items():
+                        usage[key] = usage.get(key, 0) + value
+            increment(f"routing.{tier.name}.items", len(pending))
+
+            if error is None:
+                return translated
+            stats.failed_calls += 1
+            if is_last_tier:
+                # 附带所有层级已经通过校验的译文，而不仅是最后一个层级的
+                error.translated_map = dict(translated)
+                raise error
+
+            pending = [item for item in pending if item.content not in translated]
+            stats.items_escalated += len(pending)
+            increment(f"routing.{tier.name}.escalated", len(pending))
+            index += 1
+            logger.warning(
+                f"分片 {chunk_id}: 模型层级 {tier.name} 未能完成 {len(pending)} 项 ({error})，"
+                f"回退到层级 {self._tiers[index].name}。"
+            )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回每个层级的吞吐量、回退率和成本，用于监控。"""
+        result = {}
+        for tier in self._tiers:
+            stats = self._stats[tier.name]
+            total_tokens = stats.prompt_tokens + stats.completion_tokens
+            result[tier.name] = {
+                "model": tier.model,
+                "max_difficulty": None if math.isinf(tier.max_difficulty) else tier.max_difficulty,
+                "calls": stats.calls,
+                "failed_calls": stats.failed_calls,
+                "items_requested": stats.items_requested,
+                "items_translated": stats.items_translated,
+                "items_escalated": stats.items_escalated,
+                "items_per_second": (
+                    round(stats.items_translated / stats.busy_seconds, 2) if stats.busy_seconds > 0 else None
+                ),
+                "prompt_tokens": stats.prompt_tokens,
+                "completion_tokens": stats.completion_tokens,
+                "cost": round(total_tokens / 1000 * tier.cost_per_1k_tokens, 6),
+            }
+        return result
+
+
+# 创建一个全局共享的模型路由器
+model_router = ModelRouter(load_model_tiers())
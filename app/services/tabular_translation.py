@@ -0,0 +1,249 @@
+# app/services/tabular_translation.py
+import codecs
+import csv
+import logging
+import os
+import tempfile
+from typing import IO, Dict, Iterator, List, Set, Tuple
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from .llm_service import translate_list_to_map
+
+# 获取一个日志记录器实例
+logger = logging.getLogger(__name__)
+
+# 流式返回文件时每次读取的字节数
+_STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class TabularFormatError(ValueError):
+    """上传的表格文件无法解析，或指定的列不存在时抛出的异常。"""
+
+
+def _column_indexes(header: List[str], columns: List[str]) -> List[int]:
+    """根据表头返回要翻译的列的下标，列不存在时抛出 TabularFormatError。"""
+    positions = {name.strip(): index for index, name in enumerate(header)}
+    missing = [column for column in columns if column not in positions]
+    if missing:
+        raise TabularFormatError(f"文件中不存在以下列: {', '.join(missing)}")
+    return [positions[column] for column in columns]
+
+
+# --- CSV ---
+
+def _open_csv_text(raw: IO[bytes], encoding: str) -> Iterator[str]:
+    """将二进制文件流按行增量解码为文本，不一次性读入内存。"""
+    raw.seek(0)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+    pending = ""
+    for block in iter(lambda: raw.read(_STREAM_CHUNK_BYTES), b""):
+        lines = (pending + decoder.decode(block)).split("\n")
+        # 最后一行可能不完整，留到下一块数据再处理
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _collect_csv_values(raw: IO[bytes], columns: List[str], delimiter: str, encoding: str) -> Tuple[Set[str], int]:
+    """第一遍扫描：收集指定列中的所有不同值，返回 (不同值集合, 数据行数)。"""
+    reader = csv.reader(_open_csv_text(raw, encoding), delimiter=delimiter)
+    try:
+        header = next(reader, None)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise TabularFormatError(f"无法解析CSV文件的表头: {e}") from e
+    if header is None:
+        raise TabularFormatError("文件为空")
+    indexes = _column_indexes(header, columns)
+
+    distinct: Set[str] = set()
+    row_count = 0
+    try:
+        for row in reader:
+            row_count += 1
+            for index in indexes:
+                if index < len(row) and row[index]:
+                    distinct.add(row[index])
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise TabularFormatError(f"无法解析CSV文件 (第 {row_count + 1} 行数据): {e}") from e
+    return distinct, row_count
+
+
+def _rewrite_csv(
+    raw: IO[bytes], columns: List[str], delimiter: str, encoding: str, translated_map: Dict[str, str]
+) -> Iterator[bytes]:
+    """第二遍扫描：逐行替换指定列的值，并按块产出重写后的CSV内容 (UTF-8)。"""
+
+    class _LineBuffer:
+        """csv.writer 的写入目标，暂存尚未产出的内容。"""
+        def __init__(self):
+            self.parts: List[str] = []
+            self.size = 0
+
+        def write(self, text: str) -> None:
+            self.parts.append(text)
+            self.size += len(text)
+
+        def drain(self) -> bytes:
+            data = "".join(self.parts).encode("utf-8")
+            self.parts.clear()
+            self.size = 0
+            return data
+
+    reader = csv.reader(_open_csv_text(raw, encoding), delimiter=delimiter)
+    header = next(reader)
+    indexes = _column_indexes(header, columns)
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer, delimiter=delimiter)
+    # 带BOM输出，便于Excel正确识别编码
+    buffer.write("\ufeff")
+    writer.writerow(header)
+
+    for row in reader:
+        for index in indexes:
+            if index < len(row):
+                row[index] = translated_map.get(row[index], row[index])
+        writer.writerow(row)
+        if buffer.size >= _STREAM_CHUNK_BYTES:
+            yield buffer.drain()
+    if buffer.parts:
+        yield buffer.drain()
+
+
+# --- XLSX ---
+
+def _load_openpyxl():
+    """按需导入 openpyxl，未安装时给出明确的错误提示。"""
+    try:
+        import openpyxl
+    except ImportError as e:
+        raise TabularFormatError("处理XLSX文件需要安装 openpyxl") from e
+    return openpyxl
+
+
+def _cell_text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _collect_xlsx_values(raw: IO[bytes], columns: List[str]) -> Tuple[Set[str], int]:
+    """第一遍扫描：以只读流式模式读取第一个工作表，收集指定列中的所有不同字符串值。"""
+    openpyxl = _load_openpyxl()
+    raw.seek(0)
+    try:
+        workbook = openpyxl.load_workbook(raw, read_only=True, data_only=True)
+    except Exception as e:
+        raise TabularFormatError(f"无法解析XLSX文件: {e}") from e
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise TabularFormatError("文件为空")
+        indexes = _column_indexes([_cell_text(value) for value in header], columns)
+
+        distinct: Set[str] = set()
+        row_count = 0
+        for row in rows:
+            row_count += 1
+            for index in indexes:
+                # 只翻译文本单元格，数字、日期等保持原样
+                if index < len(row) and isinstance(row[index], str) and row[index]:
+                    distinct.add(row[index])
+        return distinct, row_count
+    finally:
+        workbook.close()
+
+
+def _rewrite_xlsx(raw: IO[bytes], columns: List[str], translated_map: Dict[str, str]) -> Iterator[bytes]:
+    """
+    第二遍扫描：以只写模式逐行生成新的工作簿，并按块产出文件内容。
+
+    XLSX是zip格式，必须写完才能输出，因此先写入临时文件 (只写模式下行数据不会保留在内存中)，再分块读出。
+    """
+    openpyxl = _load_openpyxl()
+    raw.seek(0)
+    source = openpyxl.load_workbook(raw, read_only=True, data_only=True)
+    fd, temp_path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        try:
+            source_sheet = source.worksheets[0]
+            rows = source_sheet.iter_rows(values_only=True)
+            header = next(rows)
+            indexes = _column_indexes([_cell_text(value) for value in header], columns)
+
+            target = openpyxl.Workbook(write_only=True)
+            target_sheet = target.create_sheet(source_sheet.title)
+            target_sheet.append(header)
+            for row in rows:
+                row = list(row)
+                for index in indexes:
+                    if index < len(row) and isinstance(row[index], str):
+                        row[index] = translated_map.get(row[index], row[index])
+                target_sheet.append(row)
+            target.save(temp_path)
+        finally:
+            source.close()
+
+        with open(temp_path, "rb") as output:
+            yield from iter(lambda: output.read(_STREAM_CHUNK_BYTES), b"")
+    finally:
+        os.remove(temp_path)
+
+
+# --- 对外接口 ---
+
+SUPPORTED_FORMATS = ("csv", "xlsx")
+
+
+def detect_format(filename: str) -> str:
+    """根据文件扩展名判断表格格式。"""
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if extension not in SUPPORTED_FORMATS:
+        raise TabularFormatError(f"不支持的文件格式: {filename!r}，仅支持 CSV 和 XLSX")
+    return extension
+
+
+async def translate_table_columns(
+    source_lang: str,
+    target_lang: str,
+    raw: IO[bytes],
+    file_format: str,
+    columns: List[str],
+    client: httpx.AsyncClient,
+    delimiter: str = ",",
+    encoding: str = "utf-8-sig",
+) -> Tuple[Iterator[bytes], Dict[str, int]]:
+    """
+    (异步) 翻译一个CSV/XLSX文件中指定列的值。
+
+    文件被扫描两遍：第一遍只收集指定列的不同值，经过 `translate_list_to_map` 翻译；
+    第二遍逐行替换后流式产出新文件。内存占用只与不同值的数量有关，与文件行数无关。
+    `raw` 必须支持 `seek` (如上传文件的临时文件)。
+
+    Returns:
+        (重写后文件内容的字节块迭代器, 统计信息)。统计信息包含数据行数 `rows`
+        和不同值的数量 `distinct_values`。
+    """
+    if not columns:
+        raise TabularFormatError("至少需要指定一个要翻译的列")
+
+    # 文件读取和解析是同步操作，放到线程池中执行，避免阻塞事件循环
+    if file_format == "csv":
+        distinct, row_count = await run_in_threadpool(_collect_csv_values, raw, columns, delimiter, encoding)
+    else:
+        distinct, row_count = await run_in_threadpool(_collect_xlsx_values, raw, columns)
+    logger.info(
+        f"表格翻译: {row_count} 行数据的 {len(columns)} 列中共有 {len(distinct)} 个不同值。"
+    )
+
+    translated_map = (
+        await translate_list_to_map(source_lang, target_lang, sorted(distinct), client) if distinct else {}
+    )
+    stats = {"rows": row_count, "distinct_values": len(distinct)}
+    if file_format == "csv":
+        return _rewrite_csv(raw, columns, delimiter, encoding, translated_map), stats
+    return _rewrite_xlsx(raw, columns, translated_map), stats
@@ -0,0 +1,39 @@
+# app/services/text_normalizer.py
+import re
+from typing import Dict, Iterable, List
+
+# 连续的空白字符 (包括全角空格、制表符、换行)
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+# 全角ASCII字符 (U+FF01 - U+FF5E) 到对应半角字符的映射
+_FULLWIDTH_TO_HALFWIDTH = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+
+
+def canonicalize(text: str) -> str:
+    """
+    生成文本的规范形式，用于去重和缓存键。
+
+    - 全角字母、数字和标点 (如 `（`、`，`、`Ａ`) 统一为半角形式；
+    - 去除首尾空白，并将内部连续空白折叠为一个空格。
+
+    不使用 NFKC 规范化：它还会改写上标、罗马数字、单位符号等 (如 `kg/m²` 变为 `kg/m2`)，
+    而规范形式会被发送给大模型并写入缓存，这些字符必须保持原样。
+
+    规范化是幂等的：对规范形式再次调用得到的结果不变。
+    """
+    if not text:
+        return text
+    normalized = text.translate(_FULLWIDTH_TO_HALFWIDTH)
+    return _WHITESPACE_PATTERN.sub(" ", normalized).strip()
+
+
+def group_by_canonical(items: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    按规范形式对原文分组。
+
+    Returns:
+        `规范形式 -> 原文写法列表` 的映射，列表中的原文已去重并保持首次出现的顺序。
+    """
+    groups: Dict[str, List[str]] = {}
+    for item in dict.fromkeys(items):
+        groups.setdefault(canonicalize(item), []).append(item)
+    return groups
@@ -0,0 +1,160 @@
+# app/services/translation_batcher.py
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from ..clients.llm_client import LLMClient, LLMAPIError
+from ..schemas import TranslationItem
+from .chunk_planner import estimate_item_tokens
+from .model_router import model_router
+
+# 获取一个日志记录器实例
+logger = logging.getLogger(__name__)
+
+# 实际执行一个合并后分片的协程函数，由服务层注入
+DispatchFn = Callable[[LLMClient, List[TranslationItem]], Awaitable[Dict[str, str]]]
+
+# 批次错误信息开头的批次自身编号 (如 "分片 7: ")，转交给调用方时替换为调用方的分片编号
+_CHUNK_PREFIX = re.compile(r"^分片 \d+: ")
+
+
+@dataclass
+class _PendingBatch:
+    """某个语言对下正在收集中的批次。"""
+    llm_client: LLMClient
+    items: List[TranslationItem] = field(default_factory=list)
+    futures: Dict[str, asyncio.Future] = field(default_factory=dict)
+    estimated_tokens: int = 0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class TranslationBatcher:
+    """
+    服务级的微批处理调度器。
+
+    多个并发请求中数量不足一个分片的条目会按语言对 (以及调度流水线和模型层级) 汇集到同一个批次中，
+    当批次达到 `max_items` 项或 `max_tokens` 个预估token，或者第一项入队后等待超过 `max_wait` 秒时，
+    批次会作为一个完整分片发送给大模型，结果再按原文分发回各自的请求。
+    """
+
+    def __init__(self, dispatch: DispatchFn, max_items: int, max_tokens: int, max_wait: float):
+        self._dispatch = dispatch
+        self._max_items = max_items
+        self._max_tokens = max_tokens
+        self._max_wait = max_wait
+        self._batches: Dict[Tuple[str, str, str, str], _PendingBatch] = {}
+        # 保存正在执行的批次任务的引用，防止被垃圾回收
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, llm_client: LLMClient, items: List[TranslationItem], chunk_id: int) -> Dict[str, str]:
+        """
+        (异步) 将一组条目加入批次，并等待它们的翻译结果。
+
+        Args:
+            chunk_id: 这组条目在调用方计划中的分片编号，用于错误信息。批次自身的编号对调用方没有意义。
+
+        Returns:
+            这组条目的 `原文 -> 译文` 映射。
+
+        Raises:
+            LLMAPIError: 如果所在批次翻译失败。
+        """
+        futures = {item.content: self._enqueue(llm_client, item) for item in items}
+        # 批次中的Future可能被多个请求共享，用 shield 包裹，当前请求被取消时不会取消共享的Future
+        results = await asyncio.gather(
+            *(asyncio.shield(future) for future in futures.values()), return_exceptions=True
+        )
+
+        translated_map = {}
+        error: Optional[BaseException] = None
+        for content, result in zip(futures.keys(), results):
+            if isinstance(result, asyncio.CancelledError):
+                # 共享的Future被取消时转换为普通的翻译失败，而不是取消当前请求的分片任务
+                error = error or LLMAPIError(f"条目 '{content}' 所在的批次已被取消")
+            elif isinstance(result, BaseException):
+                error = error or result
+            else:
+                translated_map[content] = result
+        if error is not None:
+            # 附带已经得到译文的条目，调用方只把真正缺失的条目视为失败
+            detail = _CHUNK_PREFIX.sub("", str(error))
+            raise LLMAPIError(f"分片 {chunk_id}: {detail}", translated_map=translated_map) from error
+        return translated_map
+
+    def _enqueue(self, llm_client: LLMClient, item: TranslationItem) -> asyncio.Future:
+        """将单个条目加入对应语言对的批次，返回代表其结果的Future。"""
+        # 不同调度流水线的条目不合并，避免后台任务的条目借用交互式请求的优先级 (或反之)；
+        # 不同模型层级的条目也不合并，避免一个难的条目把整个批次带到更大的模型
+        pair = (item.source_lang, item.target_lang, llm_client.pipeline, model_router.tier_for(item.content).name)
+        tokens = estimate_item_tokens(item.content)
+        batch = self._batches.get(pair)
+        # 加入该条目会超出token预算时，先发送当前批次
+        if (
+            batch is not None
+            and item.content not in batch.futures
+            and batch.estimated_tokens + tokens > self._max_tokens
+        ):
+            self._flush(pair)
+            batch = None
+        if batch is None:
+            batch = _PendingBatch(llm_client=llm_client)
+            batch.timer = asyncio.get_running_loop().call_later(self._max_wait, self._flush, pair)
+            self._batches[pair] = batch
+
+        # 同一批次中的相同原文只翻译一次
+        future = batch.futures.get(item.content)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            batch.futures[item.content] = future
+            batch.items.append(item)
+            batch.estimated_tokens += tokens
+
+        if len(batch.items) >= self._max_items or batch.estimated_tokens >= self._max_tokens:
+            self._flush(pair)
+        return future
+
+    def _flush(self, pair: Tuple[str, str, str, str]) -> None:
+        """取出语言对当前的批次并在后台发送。"""
+        batch = self._batches.pop(pair, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+
+        logger.info(f"微批处理: 语言对 {pair[0]}->{pair[1]} 合并了 {len(batch.items)} 项，开始发送。")
+        task = asyncio.create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: _PendingBatch) -> None:
+        """执行一个批次，并将结果或异常分发给每个条目的Future。"""
+        try:
+            translated_map = await self._dispatch(batch.llm_client, batch.items)
+        except asyncio.CancelledError:
+            # 批次任务被取消 (如服务关闭)，通知所有合并进来的请求，而不是让它们永远等待
+            error = LLMAPIError("所在的批次已被取消")
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_exception(error)
+            raise
+        except Exception as e:
+            # 出错之前已经通过校验的条目照常分发，其余条目以该异常失败
+            accepted = getattr(e, "translated_map", {})
+            for content, future in batch.futures.items():
+                if future.done():
+                    continue
+                if content in accepted:
+                    future.set_result(accepted[content])
+                else:
+                    future.set_exception(e)
+            return
+
+        for content, future in batch.futures.items():
+            if future.done():
+                continue
+            if content in translated_map:
+                future.set_result(translated_map[content])
+            else:
+                future.set_exception(LLMAPIError(f"批次翻译结果中缺少条目 '{content}'"))
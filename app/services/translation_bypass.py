@@ -0,0 +1,99 @@
+# app/services/translation_bypass.py
+import re
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+# --- 无需翻译的内容规则 ---
+# 按顺序匹配，命中任意一条规则的条目直接原样返回，不会发送给大模型。
+_PASSTHROUGH_RULES = [
+    # 空字符串或只包含空白
+    ("empty", re.compile(r"\s*")),
+    # 独立的数字，包括负数、小数、千分位和百分比
+    ("number", re.compile(r"\s*[+-]?\d+(?:[.,]\d+)*\s*%?\s*")),
+    # 日期和时间，例如 2024-01-01、2024/1/1 12:30
+    ("date", re.compile(r"\s*\d{4}[-/.]\d{1,2}[-/.]\d{1,2}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?\s*")),
+    # 版本号，例如 2.0、V1.2.3、Version 2.0
+    ("version", re.compile(r"\s*(?:[Vv](?:ersion)?\s*)?\d+(?:\.\d+)+\s*")),
+    # 同时包含字母和数字的标识符，例如 S011、CT-100、D-14-D-1，可以由空白分隔多个
+    ("identifier", re.compile(
+        r"\s*(?:(?=[A-Za-z0-9_-]*[A-Za-z])(?=[A-Za-z0-9_-]*\d)[A-Za-z0-9]+(?:[-_][A-Za-z0-9]+)*\s*)+"
+    )),
+    # 只包含标点符号和其他符号
+    ("symbol", re.compile(r"[^\w]+")),
+]
+
+# --- 文字系统检测 ---
+_SCRIPT_PATTERNS = {
+    "han": re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]"),
+    "kana": re.compile(r"[\u3040-\u30ff\u31f0-\u31ff]"),
+    "hangul": re.compile(r"[\u1100-\u11ff\u3130-\u318f\uac00-\ud7af]"),
+    "latin": re.compile(r"[A-Za-z\u00c0-\u024f]"),
+    "cyrillic": re.compile(r"[\u0400-\u04ff]"),
+}
+
+# 各语言使用的文字系统
+_LANGUAGE_SCRIPTS: Dict[str, FrozenSet[str]] = {
+    "ZH": frozenset({"han"}),
+    "JA": frozenset({"han", "kana"}),
+    "KO": frozenset({"hangul", "han"}),
+    "RU": frozenset({"cyrillic"}),
+    **{lang: frozenset({"latin"}) for lang in ("EN", "FR", "DE", "ES", "IT", "PT", "NL")},
+}
+
+
+def detect_scripts(text: str) -> Set[str]:
+    """检测文本中出现的文字系统 (不包含数字和标点)。"""
+    return {script for script, pattern in _SCRIPT_PATTERNS.items() if pattern.search(text)}
+
+
+def _language_scripts(lang: str) -> Optional[FrozenSet[str]]:
+    """将 'zh-CN'、'ZH' 等语言代码映射到对应的文字系统集合，未知语言返回None。"""
+    return _LANGUAGE_SCRIPTS.get(re.split(r"[-_]", lang.strip())[0].upper())
+
+
+def is_in_target_language(text: str, source_lang: str, target_lang: str) -> bool:
+    """
+    判断条目是否已经是目标语言。
+
+    只有当文本中的文字系统全部属于目标语言，且不能同样被解释为源语言时才返回True。
+    例如 ZH->EN 时，纯拉丁字母的条目视为已是英文；而 ZH->JA 时，纯汉字的条目无法判断，返回False。
+    """
+    return _scripts_in_target_language(detect_scripts(text), source_lang, target_lang)
+
+
+def _scripts_in_target_language(scripts: Set[str], source_lang: str, target_lang: str) -> bool:
+    source_scripts = _language_scripts(source_lang)
+    target_scripts = _language_scripts(target_lang)
+    if source_scripts is None or target_scripts is None:
+        return False
+    return bool(scripts) and scripts <= target_scripts and not scripts <= source_scripts
+
+
+def classify(text: str, source_lang: str, target_lang: str) -> Optional[str]:
+    """
+    判断一个条目是否可以在本地直接返回原文。
+
+    Returns:
+        命中的规则名称 (例如 "identifier"、"target_language")；需要调用大模型时返回None。
+    """
+    for name, pattern in _PASSTHROUGH_RULES:
+        if pattern.fullmatch(text):
+            return name
+    if is_in_target_language(text, source_lang, target_lang):
+        return "target_language"
+    return None
+
+
+def classify_for_targets(text: str, source_lang: str, target_langs: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    对多个目标语言分别判断一个条目是否可以在本地直接返回原文。
+
+    与目标语言无关的规则和文字系统检测只执行一次，结果与对每个目标语言调用 `classify` 相同。
+    """
+    for name, pattern in _PASSTHROUGH_RULES:
+        if pattern.fullmatch(text):
+            return dict.fromkeys(target_langs, name)
+    scripts = detect_scripts(text)
+    return {
+        target_lang: "target_language" if _scripts_in_target_language(scripts, source_lang, target_lang) else None
+        for target_lang in target_langs
+    }
@@ -0,0 +1,286 @@
+# app/services/translation_cache.py
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+from cachetools import TLRUCache
+from starlette.concurrency import run_in_threadpool
+
+from ..config.settings import settings
+from .text_normalizer import canonicalize
+
+# 获取一个日志记录器实例
+logger = logging.getLogger(__name__)
+
+# SQLite 单条语句中允许的绑定参数数量有限，批量查询时按此大小分批
+_SQLITE_BATCH_SIZE = 500
+# 磁盘层条目数的缓存时间 (秒)，避免 /status 每次都执行 COUNT(*)
+_DISK_SIZE_TTL = 60
+
+
+def make_cache_key(source_lang: str, target_lang: str, content: str) -> str:
+    """生成缓存使用的键，格式为 `源语言:目标语言:规范化后的原文`。"""
+    return f"{source_lang}:{target_lang}:{canonicalize(content)}"
+
+
+class TranslationCache:
+    """
+    两级翻译缓存：进程内的 LRU 热缓存 + 磁盘上的 SQLite (WAL 模式) 持久化存储。
+
+    - 内存层 (L1): 每个 worker 独享，按条目的过期时间淘汰，命中时无需任何IO。
+    - 磁盘层 (L2): 同一主机上的所有 worker 共享同一个数据库文件，
+      服务重启后缓存依然有效。
+    - 过期时间可以按语言对单独配置 (`TRANSLATION_CACHE_PAIR_TTLS`)。
+
+    所有读写接口都是批量的 (`get_many` / `set_many`)，一次磁盘往返即可处理整个分片。
+    原文在读写前都会被规范化 (见 `text_normalizer.canonicalize`)，
+    因此同一内容的全角、多余空白等不同写法共享同一个缓存条目。
+
+    磁盘层的读写可能因其他 worker 持有写锁而等待，因此不能在事件循环中直接执行：
+    异步代码应通过 `aget_many_targets` 在线程池中查询；`set_many` 只同步写入内存层，
+    磁盘写入交给一个单线程的后台写入器按顺序执行。
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        memory_size: int,
+        default_ttl: int,
+        pair_ttls: Optional[Dict[str, int]] = None,
+    ):
+        self._db_path = db_path
+        self._default_ttl = default_ttl
+        self._pair_ttls = {key.upper(): ttl for key, ttl in (pair_ttls or {}).items()}
+        # 内存层中存放 (译文, 过期时间戳)，ttu 直接返回该过期时间，保证两级缓存的过期时间一致
+        self._memory: TLRUCache = TLRUCache(
+            maxsize=memory_size,
+            ttu=lambda _key, value, _now: value[1],
+            timer=time.time,
+        )
+        self._lock = threading.Lock()
+        # 内存层会同时被事件循环和线程池访问，TLRUCache 本身不是线程安全的
+        self._memory_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # 磁盘写入按提交顺序在单独的线程中执行
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="translation-cache-writer")
+        # (条目数, 统计时间)
+        self._disk_size: Tuple[int, float] = (0, 0.0)
+
+    # --- 内部工具方法 ---
+
+    def ttl_for(self, source_lang: str, target_lang: str) -> int:
+        """返回指定语言对的缓存有效期 (秒)。"""
+        return self._pair_ttls.get(f"{source_lang}:{target_lang}".upper(), self._default_ttl)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """懒加载数据库连接。连接失败时返回None，缓存降级为纯内存模式。"""
+        if self._conn is not None:
+            return self._conn
+        try:
+            directory = os.path.dirname(self._db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self._db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS translations (
+                    source_lang TEXT NOT NULL,
+                    target_lang TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (source_lang, target_lang, content)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.commit()
+            self._conn = conn
+            logger.info(f"翻译缓存数据库已打开: {self._db_path}")
+        except sqlite3.Error as e:
+            logger.error(f"无法打开翻译缓存数据库 {self._db_path}，仅使用内存缓存: {e}")
+        return self._conn
+
+    # --- 公共接口 ---
+
+    def get_many(self, source_lang: str, target_lang: str, contents: Iterable[str]) -> Dict[str, str]:
+        """
+        批量查询缓存。
+
+        先查内存层，未命中的部分再通过一次 (分批的) SQL 查询从磁盘层获取，
+        磁盘层命中的条目会回填到内存层。
+
+        Returns:
+            一个字典，仅包含命中缓存的 `原文 -> 译文`，键为调用方传入的原始写法。
+        """
+        return self.get_many_targets(source_lang, {target_lang: contents}).get(target_lang, {})
+
+    def get_many_targets(
+        self, source_lang: str, contents_by_target: Dict[str, Iterable[str]]
+    ) -> Dict[str, Dict[str, str]]:
+        """
+        一次查询多个目标语言的缓存，磁盘层对所有目标语言只做一轮 (分批的) SQL 查询。
+
+        Args:
+            contents_by_target: `目标语言 -> 需要查询的原文`。
+
+        Returns:
+            `目标语言 -> {原文: 译文}`，仅包含命中缓存的条目，键为调用方传入的原始写法。
+        """
+        now = time.time()
+        found: Dict[str, Dict[str, str]] = {target_lang: {} for target_lang in contents_by_target}
+        # 规范形式 -> 目标语言 -> 调用方传入的写法
+        missing: Dict[str, Dict[str, list]] = {}
+        for target_lang, contents in contents_by_target.items():
+            for content in dict.fromkeys(contents):
+                with self._memory_lock:
+                    entry = self._memory.get(make_cache_key(source_lang, target_lang, content))
+                if entry is not None:
+                    found[target_lang][content] = entry[0]
+                else:
+                    missing.setdefault(canonicalize(content), {}).setdefault(target_lang, []).append(content)
+
+        if not missing:
+            return found
+
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return found
+            canonical_contents = list(missing)
+            target_langs = list(contents_by_target)
+            target_placeholders = ",".join("?" * len(target_langs))
+            try:
+                for i in range(0, len(canonical_contents), _SQLITE_BATCH_SIZE):
+                    batch = canonical_contents[i:i + _SQLITE_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = conn.execute(
+                        f"SELECT target_lang, content, translation, expires_at FROM translations "
+                        f"WHERE source_lang = ? AND target_lang IN ({target_placeholders}) AND expires_at > ? "
+                        f"AND content IN ({placeholders})",
+                        (source_lang, *target_langs, now, *batch),
+                    ).fetchall()
+                    for target_lang, content, translation, expires_at in rows:
+                        originals = missing[content].get(target_lang)
+                        if not originals:
+                            continue
+                        for original in originals:
+                            found[target_lang][original] = translation
+                        with self._memory_lock:
+                            self._memory[make_cache_key(source_lang, target_lang, content)] = (translation, expires_at)
+            except sqlite3.Error as e:
+                logger.warning(f"读取翻译缓存数据库失败，本次仅使用内存缓存: {e}")
+
+        return found
+
+    async def aget_many_targets(
+        self, source_lang: str, contents_by_target: Dict[str, Iterable[str]]
+    ) -> Dict[str, Dict[str, str]]:
+        """(异步) 在线程池中执行 `get_many_targets`，磁盘层的等待不会阻塞事件循环。"""
+        return await run_in_threadpool(self.get_many_targets, source_lang, contents_by_target)
+
+    def set_many(self, source_lang: str, target_lang: str, translations: Dict[str, str]) -> None:
+        """
+        批量写入缓存。内存层立即写入；磁盘层的写入提交给后台写入器，调用方无需等待。
+        磁盘写入失败只记录日志，不影响翻译结果。
+        """
+        if not translations:
+            return
+
+        expires_at = time.time() + self.ttl_for(source_lang, target_lang)
+        with self._memory_lock:
+            for content, translation in translations.items():
+                self._memory[make_cache_key(source_lang, target_lang, content)] = (translation, expires_at)
+
+        rows: Tuple = tuple(
+            (source_lang, target_lang, canonicalize(content), translation, expires_at)
+            for content, translation in translations.items()
+        )
+        try:
+            self._writer.submit(self._write_rows, rows)
+        except RuntimeError:
+            # 写入器已关闭 (服务正在退出)，直接同步写入
+            self._write_rows(rows)
+
+    def _write_rows(self, rows: Tuple) -> None:
+        """将缓存条目写入磁盘层。"""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO translations "
+                    "(source_lang, target_lang, content, translation, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"写入翻译缓存数据库失败: {e}")
+
+    def purge_expired(self) -> int:
+        """删除磁盘层中已过期的条目，返回删除的条数。"""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return 0
+            try:
+                cursor = conn.execute("DELETE FROM translations WHERE expires_at <= ?", (time.time(),))
+                conn.commit()
+                return cursor.rowcount
+            except sqlite3.Error as e:
+                logger.warning(f"清理过期翻译缓存失败: {e}")
+                return 0
+
+    def disk_size(self) -> int:
+        """
+        返回磁盘层中的条目数 (包含尚未清理的过期条目)。
+
+        结果会缓存一段时间 (`_DISK_SIZE_TTL`)，因此只是近似值。需要查询数据库时可能阻塞，
+        异步代码中应通过线程池调用。
+        """
+        count, counted_at = self._disk_size
+        if time.time() - counted_at < _DISK_SIZE_TTL:
+            return count
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return 0
+            try:
+                count = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            except sqlite3.Error:
+                return count
+        self._disk_size = (count, time.time())
+        return count
+
+    def close(self) -> None:
+        """等待后台写入器写完已提交的条目。"""
+        self._writer.shutdown(wait=True)
+
+    def __len__(self) -> int:
+        """返回内存层中的条目数。"""
+        return len(self._memory)
+
+
+async def purge_expired_periodically(cache: TranslationCache, interval: int) -> None:
+    """(异步) 定期在线程池中清理磁盘层的过期条目，直到任务被取消。启动时先清理一次。"""
+    while True:
+        deleted = await run_in_threadpool(cache.purge_expired)
+        if deleted:
+            logger.info(f"已清理 {deleted} 条过期的翻译缓存。")
+        await asyncio.sleep(interval)
+
+
+# 创建一个全局共享的两级缓存实例
+translation_cache = TranslationCache(
+    db_path=settings.translation_cache_path,
+    memory_size=settings.translation_cache_memory_size,
+    default_ttl=settings.translation_cache_ttl,
+    pair_ttls=settings.translation_cache_pair_ttls,
+)
@@ -0,0 +1,425 @@
+# app/services/translation_jobs.py
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from ..config.settings import settings
+from .llm_service import iter_translation_events
+
+# 获取一个日志记录器实例
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+_ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING)
+_TERMINAL_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+# 每一段交给翻译流水线的独立内容数，分段处理可以控制单次占用的内存和在途分片数
+_SEGMENT_SIZE = 2000
+# 检查点按批写入：累计到这么多条译文，或距上次写入超过这么多秒时写入一次
+_CHECKPOINT_ITEMS = 500
+_CHECKPOINT_SECONDS = 2.0
+
+
+class TranslationJobStore:
+    """
+    批量翻译任务的持久化存储 (SQLite，WAL 模式)。
+
+    - `jobs` 表保存任务的元数据和进度；
+    - `job_items` 表按请求中的顺序保存每个条目及其译文，译文为空表示尚未完成。
+
+    每个分片完成后立即写入译文 (检查点)，服务重启后只需翻译仍为空的条目。
+    多个进程共用同一个数据库时，任务由 `owner`/`lease_until` 记录的租约持有者执行，
+    租约通过条件更新原子地取得，同一个任务不会被两个进程同时执行。
+    """
+
+    def __init__(self, db_path: str):
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """懒加载数据库连接。与翻译缓存不同，任务存储不可用时无法降级，直接抛出异常。"""
+        if self._conn is not None:
+            return self._conn
+        directory = os.path.dirname(self._db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self._db_path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total_items INTEGER NOT NULL,
+                done_items INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                owner TEXT,
+                lease_until REAL
+            );
+            CREATE TABLE IF NOT EXISTS job_items (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                translation TEXT,
+                PRIMARY KEY (job_id, idx)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS job_items_content ON job_items (job_id, content);
+            """
+        )
+        # 旧版本创建的数据库没有租约字段
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        conn.commit()
+        self._conn = conn
+        logger.info(f"批量翻译任务数据库已打开: {self._db_path}")
+        return conn
+
+    def create(self, source_lang: str, target_lang: str, items: List[str], owner: str, lease: float) -> str:
+        """创建一个任务并保存全部条目，任务的租约直接交给创建它的进程，返回任务ID。"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, source_lang, target_lang, status, total_items, created_at, updated_at, "
+                    "owner, lease_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, source_lang, target_lang, JOB_QUEUED, len(items), now, now, owner, now + lease),
+                )
+                conn.executemany(
+                    "INSERT INTO job_items (job_id, idx, content) VALUES (?, ?, ?)",
+                    ((job_id, idx, content) for idx, content in enumerate(items)),
+                )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """返回任务的元数据和进度，任务不存在时返回None。"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT job_id, source_lang, target_lang, status, total_items, done_items, attempts, error, "
+                "created_at, updated_at FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "source_lang", "target_lang", "status", "total_items", "done_items",
+                "attempts", "error", "created_at", "updated_at")
+        return dict(zip(keys, row))
+
+    def list_claimable(self) -> List[str]:
+        """返回尚未结束 (排队中或运行中) 且没有有效租约的任务ID，按创建时间排序。"""
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT job_id FROM jobs WHERE status IN ({','.join('?' * len(_ACTIVE_STATES))}) "
+                "AND (owner IS NULL OR lease_until < ?) ORDER BY created_at",
+                (*_ACTIVE_STATES, time.time()),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        """
+        原子地取得 (或续约) 一个未结束任务的租约。
+
+        任务没有持有者、租约已过期或已由 `owner` 持有时成功，否则说明任务正由其他进程执行，返回False。
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(
+                    f"UPDATE jobs SET owner = ?, lease_until = ? WHERE job_id = ? "
+                    f"AND status IN ({','.join('?' * len(_ACTIVE_STATES))}) "
+                    "AND (owner IS NULL OR owner = ? OR lease_until < ?)",
+                    (owner, now + lease, job_id, *_ACTIVE_STATES, owner, now),
+                )
+        return cursor.rowcount == 1
+
+    def release(self, job_id: str, owner: str) -> None:
+        """释放 `owner` 持有的租约，使其他进程可以立即接管未结束的任务。"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET owner = NULL, lease_until = NULL WHERE job_id = ? AND owner = ?",
+                    (job_id, owner),
+                )
+
+    def pending_contents(self, job_id: str) -> List[str]:
+        """返回任务中尚未完成的不重复条目。"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT DISTINCT content FROM job_items WHERE job_id = ? AND translation IS NULL",
+                (job_id,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def checkpoint(self, job_id: str, translations: Dict[str, str]) -> int:
+        """写入一批译文并更新进度，返回新完成的条目数 (同一内容出现多次时每次都计入)。"""
+        if not translations:
+            return 0
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                cursor = conn.executemany(
+                    "UPDATE job_items SET translation = ? "
+                    "WHERE job_id = ? AND content = ? AND translation IS NULL",
+                    ((translation, job_id, content) for content, translation in translations.items()),
+                )
+                updated = cursor.rowcount
+                conn.execute(
+                    "UPDATE jobs SET done_items = done_items + ?, updated_at = ? WHERE job_id = ?",
+                    (updated, time.time(), job_id),
+                )
+        return updated
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None, new_attempt: bool = False) -> None:
+        """更新任务状态。已取消的任务不会被改回其他状态。"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, attempts = attempts + ?, updated_at = ? "
+                    "WHERE job_id = ? AND status != ?",
+                    (status, error, int(new_attempt), time.time(), job_id, JOB_CANCELLED),
+                )
+
+    def results(self, job_id: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """按请求中的顺序分页返回条目及其译文 (尚未完成的条目译文为None)。"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT idx, content, translation FROM job_items "
+                "WHERE job_id = ? AND idx >= ? ORDER BY idx LIMIT ?",
+                (job_id, offset, limit),
+            ).fetchall()
+        return [{"index": idx, "content": content, "translation": translation} for idx, content, translation in rows]
+
+    def purge_finished(self, older_than: float) -> int:
+        """删除在指定时间之前已经结束的任务，返回删除的任务数。"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                job_ids = [row[0] for row in conn.execute(
+                    f"SELECT job_id FROM jobs WHERE updated_at < ? "
+                    f"AND status IN ({','.join('?' * len(_TERMINAL_STATES))})",
+                    (older_than, *_TERMINAL_STATES),
+                ).fetchall()]
+                for job_id in job_ids:
+                    conn.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+                    conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        return len(job_ids)
+
+
+class TranslationJobManager:
+    """
+    在后台执行批量翻译任务。
+
+    任务通过与同步接口相同的翻译流水线 (`iter_translation_events`) 执行，
+    但使用优先级更低的 `translate_job` 调度流水线，不会挤占交互式请求。
+    单个分片失败不会丢失整个任务：已完成的分片已经写入检查点，
+    其余条目在下一轮中重试，超过最大轮数后任务标记为失败，已完成的结果仍然可以查询。
+
+    多个工作进程共用任务数据库时，每个进程只执行自己取得租约的任务，执行期间定期续约；
+    续约失败 (租约被接管或任务在其他进程中被取消) 时停止执行。每个进程还会定期接管租约已过期的任务。
+    """
+
+    def __init__(
+        self, store: TranslationJobStore, max_running: int, max_attempts: int, retention: int, lease_seconds: float
+    ):
+        self._store = store
+        self._max_attempts = max_attempts
+        self._retention = retention
+        self._lease = lease_seconds
+        # 本进程的租约持有者标识
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._semaphore = asyncio.Semaphore(max_running)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._adopt_task: Optional[asyncio.Task] = None
+
+    @property
+    def store(self) -> TranslationJobStore:
+        return self._store
+
+    async def start(self, client: httpx.AsyncClient) -> None:
+        """
+        (异步) 在应用启动时调用：清理过期的任务，并恢复服务重启前未完成的任务。
+
+        任务数据库由多个进程共享，其他进程写入时可能需要等待锁，因此所有数据库操作都在线程池中执行。
+        """
+        self._client = client
+        purged = await run_in_threadpool(self._store.purge_finished, time.time() - self._retention)
+        if purged:
+            logger.info(f"已清理 {purged} 个过期的批量翻译任务。")
+        await self._adopt_claimable()
+        self._adopt_task = asyncio.create_task(self._adopt_periodically())
+
+    async def shutdown(self) -> None:
+        """在应用关闭时调用：停止正在执行的任务并释放租约，任务保持未完成状态，由下次启动或其他进程恢复。"""
+        if self._adopt_task is not None:
+            self._adopt_task.cancel()
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _adopt_claimable(self) -> None:
+        """(异步) 为没有有效租约的未完成任务安排执行，是否执行由 `_run` 中的原子租约决定。"""
+        for job_id in await run_in_threadpool(self._store.list_claimable):
+            if job_id not in self._tasks:
+                logger.info(f"恢复未完成的批量翻译任务: {job_id}")
+                self._schedule(job_id)
+
+    async def _adopt_periodically(self) -> None:
+        """定期接管租约已过期 (持有进程异常退出) 的任务。"""
+        while True:
+            await asyncio.sleep(self._lease)
+            try:
+                await self._adopt_claimable()
+            except sqlite3.Error as e:
+                logger.warning(f"查询可接管的批量翻译任务失败: {e}")
+
+    async def submit(self, source_lang: str, target_lang: str, items: List[str]) -> str:
+        """(异步) 创建任务并在后台开始执行，返回任务ID。写入全部条目在线程池中进行，不阻塞事件循环。"""
+        job_id = await run_in_threadpool(self._store.create, source_lang, target_lang, items, self._owner, self._lease)
+        logger.info(f"已创建批量翻译任务 {job_id}，共 {len(items)} 项。")
+        self._schedule(job_id)
+        return job_id
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """(异步) 取消一个任务，返回取消后的任务信息，任务不存在时返回None。"""
+        job = await run_in_threadpool(self._store.get, job_id)
+        if job is None:
+            return None
+        if job["status"] in _ACTIVE_STATES:
+            await run_in_threadpool(self._store.set_status, job_id, JOB_CANCELLED)
+            task = self._tasks.get(job_id)
+            if task is not None:
+                task.cancel()
+            logger.info(f"批量翻译任务 {job_id} 已取消。")
+        return await run_in_threadpool(self._store.get, job_id)
+
+    def _schedule(self, job_id: str) -> None:
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, job_id: str) -> None:
+        async with self._semaphore:
+            if not await run_in_threadpool(self._store.claim, job_id, self._owner, self._lease):
+                logger.info(f"批量翻译任务 {job_id} 已结束或正由其他进程执行，跳过。")
+                return
+            keep_lease = asyncio.create_task(self._keep_lease(job_id, asyncio.current_task()))
+            try:
+                job = await run_in_threadpool(self._store.get, job_id)
+                if job is None or job["status"] not in _ACTIVE_STATES:
+                    return
+                await self._execute(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"批量翻译任务 {job_id} 执行失败: {e}", exc_info=e)
+                await run_in_threadpool(self._store.set_status, job_id, JOB_FAILED, error=str(e))
+            finally:
+                keep_lease.cancel()
+                await run_in_threadpool(self._store.release, job_id, self._owner)
+
+    async def _keep_lease(self, job_id: str, task: asyncio.Task) -> None:
+        """在任务执行期间定期续约，续约失败时停止执行该任务。"""
+        while True:
+            await asyncio.sleep(self._lease / 3)
+            try:
+                renewed = await run_in_threadpool(self._store.claim, job_id, self._owner, self._lease)
+            except sqlite3.Error as e:
+                # 暂时无法写入时下次再试，租约在过期前还有两次续约机会
+                logger.warning(f"批量翻译任务 {job_id} 续约失败: {e}")
+                continue
+            if not renewed:
+                logger.warning(f"批量翻译任务 {job_id} 的租约已失效 (被其他进程接管或已取消)，停止执行。")
+                task.cancel()
+                return
+
+    async def _execute(self, job: Dict[str, Any]) -> None:
+        job_id = job["job_id"]
+        # 已经失败过的轮数。服务重启打断的轮次不计入
+        attempts = job["attempts"]
+        await run_in_threadpool(self._store.set_status, job_id, JOB_RUNNING, error=job["error"])
+        while True:
+            pending = await run_in_threadpool(self._store.pending_contents, job_id)
+            if not pending:
+                await run_in_threadpool(self._store.set_status, job_id, JOB_COMPLETED)
+                logger.info(f"批量翻译任务 {job_id} 已完成。")
+                return
+            if attempts >= self._max_attempts:
+                await run_in_threadpool(
+                    self._store.set_status,
+                    job_id, JOB_FAILED, error=f"重试 {attempts} 轮后仍有 {len(pending)} 个条目未完成",
+                )
+                return
+            if attempts > 0:
+                # 给上游 (以及熔断器) 恢复的时间，再重试剩余条目
+                await asyncio.sleep(settings.llm_circuit_recovery_timeout)
+
+            logger.info(f"批量翻译任务 {job_id}: 第 {attempts + 1} 轮，剩余 {len(pending)} 个不重复条目。")
+            round_error: Optional[str] = None
+            for start in range(0, len(pending), _SEGMENT_SIZE):
+                segment = pending[start:start + _SEGMENT_SIZE]
+                # 检查点：分片的译文先累积起来，按条数或时间批量持久化，每段结束时写入剩余部分。
+                # 进程在两次写入之间退出时，未写入的译文已在翻译缓存中，下一轮直接命中缓存
+                unsaved: Dict[str, str] = {}
+                last_saved = time.monotonic()
+                async for event in iter_translation_events(
+                    job["source_lang"], job["target_lang"], segment, self._client,
+                    pipeline="translate_job", allow_partial=True,
+                ):
+                    if event["type"] != "summary":
+                        unsaved.update(event["translated_map"])
+                        if len(unsaved) >= _CHECKPOINT_ITEMS or time.monotonic() - last_saved >= _CHECKPOINT_SECONDS:
+                            await run_in_threadpool(self._store.checkpoint, job_id, unsaved)
+                            unsaved, last_saved = {}, time.monotonic()
+                        continue
+                    if unsaved:
+                        await run_in_threadpool(self._store.checkpoint, job_id, unsaved)
+                        unsaved, last_saved = {}, time.monotonic()
+                    if not event["complete"]:
+                        # 已完成的分片已经写入检查点，未完成的条目留到下一轮
+                        round_error = event.get("error") or f"{event['failed_items']} 个条目未得到译文"
+                        logger.warning(f"批量翻译任务 {job_id}: 部分条目翻译失败，将在下一轮重试: {round_error}")
+
+            if round_error is not None:
+                attempts += 1
+                await run_in_threadpool(
+                    self._store.set_status, job_id, JOB_RUNNING, error=round_error, new_attempt=True
+                )
+
+
+# 创建一个全局共享的任务管理器，在应用生命周期中启动和关闭
+translation_job_manager = TranslationJobManager(
+    store=TranslationJobStore(settings.translation_job_db_path),
+    max_running=settings.translation_job_max_running,
+    max_attempts=settings.translation_job_max_attempts,
+    retention=settings.translation_job_retention,
+    lease_seconds=settings.translation_job_lease_seconds,
+)
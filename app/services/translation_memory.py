@@ -0,0 +1,212 @@
+# app/services/translation_memory.py
+import logging
+import re
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ..config.settings import settings
+from .identifier_rules import is_valid_translation
+
+# 获取一个日志记录器实例
+logger = logging.getLogger(__name__)
+
+# 模板中的可变部分：同时包含字母和数字的标识符 (D-14-D-1、CT-100) 以及独立的数字
+_VARIABLE_PATTERN = re.compile(
+    r"(?<![A-Za-z0-9.])"
+    r"(?:"
+    r"(?=[A-Za-z0-9_-]*[A-Za-z])(?=[A-Za-z0-9_-]*\d)[A-Za-z0-9]+(?:[-_][A-Za-z0-9]+)*"
+    r"|\d+(?:\.\d+)*"
+    r")"
+    r"(?![A-Za-z0-9.])"
+)
+# 纯数字的可变部分 (可能是数量，译文的语法随之变化)
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)*")
+# 模板中可变部分的占位符
+_PLACEHOLDER = "\u0000"
+# 用于模糊匹配的字符 n-gram 长度
+_NGRAM_SIZE = 3
+# 出现在过多条目中的 n-gram 区分度很低，查询时跳过以控制开销
+_MAX_POSTINGS_PER_GRAM = 2000
+
+
+def to_template(text: str) -> Tuple[str, List[str]]:
+    """将文本中的标识符和数字替换为占位符，返回 (模板, 按顺序排列的可变部分)。"""
+    return _VARIABLE_PATTERN.sub(_PLACEHOLDER, text), _VARIABLE_PATTERN.findall(text)
+
+
+def _ngrams(text: str) -> Set[str]:
+    """生成文本的字符 n-gram 集合，过短的文本整体作为一个 n-gram。"""
+    if len(text) <= _NGRAM_SIZE:
+        return {text}
+    return {text[i:i + _NGRAM_SIZE] for i in range(len(text) - _NGRAM_SIZE + 1)}
+
+
+@dataclass
+class _MemoryEntry:
+    """翻译记忆中的一条记录。"""
+    target: str
+    template: str
+    variables: List[str]
+    grams: Set[str]
+
+
+class _PairIndex:
+    """单个语言对的翻译记忆及其索引。"""
+
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self.entries: "OrderedDict[str, _MemoryEntry]" = OrderedDict()
+        self.by_template: Dict[str, Set[str]] = defaultdict(set)
+        self.by_gram: Dict[str, Set[str]] = defaultdict(set)
+
+    def add(self, source: str, target: str) -> None:
+        existing = self.entries.get(source)
+        if existing is not None:
+            # 已有条目被重新翻译或更正时，使用新的译文
+            existing.target = target
+            self.entries.move_to_end(source)
+            return
+        template, variables = to_template(source)
+        entry = _MemoryEntry(target=target, template=template, variables=variables, grams=_ngrams(template))
+        self.entries[source] = entry
+        self.by_template[template].add(source)
+        for gram in entry.grams:
+            self.by_gram[gram].add(source)
+        if len(self.entries) > self._max_entries:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        source, entry = self.entries.popitem(last=False)
+        self.by_template[entry.template].discard(source)
+        if not self.by_template[entry.template]:
+            del self.by_template[entry.template]
+        for gram in entry.grams:
+            postings = self.by_gram[gram]
+            postings.discard(source)
+            if not postings:
+                del self.by_gram[gram]
+
+
+class TranslationMemory:
+    """
+    进程内的翻译记忆 (translation memory)。
+
+    以语言对为单位保存已翻译的 `原文 -> 译文`，并建立两类索引：
+    - 模板索引：将标识符和数字替换为占位符后的模板。例如 `筛选期 (D-14-D-1)` 与
+      `筛选期 (D-28-D-1)` 模板相同，可以直接把译文中的标识符替换后复用，无需调用大模型。
+      纯数字可能是数量，译文的语法会随之变化 (`2片` -> `Take 2 tablets`，`1片` -> `Take 1 tablet`)，
+      因此纯数字必须与历史条目完全相同，只有包含字母的标识符可以替换；
+    - 字符 n-gram 倒排索引：为其他条目查找相似度较高的历史翻译，
+      作为少样本 (few-shot) 参考发送给大模型，保持术语和措辞一致。
+    """
+
+    def __init__(self, max_entries: int, min_similarity: float):
+        self._max_entries = max_entries
+        self._min_similarity = min_similarity
+        self._pairs: Dict[Tuple[str, str], _PairIndex] = {}
+
+    def _index(self, source_lang: str, target_lang: str) -> _PairIndex:
+        pair = (source_lang, target_lang)
+        index = self._pairs.get(pair)
+        if index is None:
+            index = _PairIndex(self._max_entries)
+            self._pairs[pair] = index
+        return index
+
+    def add_many(self, source_lang: str, target_lang: str, translations: Dict[str, str]) -> None:
+        """将一批翻译结果加入记忆。"""
+        index = self._index(source_lang, target_lang)
+        for source, target in translations.items():
+            if source.strip():
+                index.add(source, target)
+
+    def reuse_templates(self, source_lang: str, target_lang: str, contents: Iterable[str]) -> Dict[str, str]:
+        """
+        为与历史条目模板相同、仅标识符或数字不同的条目直接生成译文。
+
+        只有当历史译文中原样包含全部可变部分 (次数一致)、且纯数字的可变部分与历史条目相同时才会进行替换，
+        替换后的译文还需要通过本地校验。
+
+        Returns:
+            可以直接复用的 `原文 -> 译文` 映射。
+        """
+        index = self._pairs.get((source_lang, target_lang))
+        if index is None:
+            return {}
+
+        reused: Dict[str, str] = {}
+        for content in contents:
+            template, variables = to_template(content)
+            if not variables:
+                continue
+            for source in index.by_template.get(template, ()):
+                translation = self._substitute(index.entries[source], variables)
+                if translation is not None and is_valid_translation(content, translation):
+                    reused[content] = translation
+                    break
+        return reused
+
+    @staticmethod
+    def _substitute(entry: _MemoryEntry, variables: List[str]) -> Optional[str]:
+        """将历史译文中的可变部分依次替换为新值，无法确定对应关系时返回None。"""
+        if len(entry.variables) != len(variables):
+            return None
+        if Counter(_VARIABLE_PATTERN.findall(entry.target)) != Counter(entry.variables):
+            return None
+        replacements: Dict[str, str] = {}
+        for old, new in zip(entry.variables, variables):
+            if old != new and (_NUMBER_PATTERN.fullmatch(old) or _NUMBER_PATTERN.fullmatch(new)):
+                # 数字可能是数量，替换后译文的单复数等语法可能不再正确
+                return None
+            if replacements.setdefault(old, new) != new:
+                # 同一个旧值需要替换成不同的新值，无法确定对应关系
+                return None
+        return _VARIABLE_PATTERN.sub(lambda match: replacements[match.group(0)], entry.target)
+
+    def similar_examples(
+        self, source_lang: str, target_lang: str, contents: Iterable[str], limit: int
+    ) -> Dict[str, str]:
+        """
+        为一组条目查找相似度不低于阈值的历史翻译，作为少样本参考。
+
+        相似度为模板字符 n-gram 集合的 Dice 系数。每个条目最多取一条最相似的记录，
+        总数不超过 `limit`。
+        """
+        index = self._pairs.get((source_lang, target_lang))
+        if index is None or limit <= 0:
+            return {}
+
+        examples: Dict[str, str] = {}
+        for content in contents:
+            template, _ = to_template(content)
+            grams = _ngrams(template)
+            overlaps: Counter = Counter()
+            for gram in grams:
+                postings = index.by_gram.get(gram)
+                if postings and len(postings) <= _MAX_POSTINGS_PER_GRAM:
+                    overlaps.update(postings)
+
+            best_source, best_score = None, 0.0
+            for source, overlap in overlaps.items():
+                if source == content or source in examples:
+                    continue
+                score = 2 * overlap / (len(grams) + len(index.entries[source].grams))
+                if score > best_score:
+                    best_source, best_score = source, score
+
+            if best_source is not None and best_score >= self._min_similarity:
+                examples[best_source] = index.entries[best_source].target
+                if len(examples) >= limit:
+                    break
+        return examples
+
+    def __len__(self) -> int:
+        return sum(len(index.entries) for index in self._pairs.values())
+
+
+# 创建一个全局共享的翻译记忆实例
+translation_memory = TranslationMemory(
+    max_entries=settings.translation_memory_max_entries,
+    min_similarity=settings.translation_memory_min_similarity,
+)